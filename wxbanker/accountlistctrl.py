@@ -112,6 +112,7 @@ class AccountListCtrl(wx.Panel):
         Publisher.subscribe(self.onAccountRenamed, "ormobject.updated.Account.Name")
         Publisher.subscribe(self.onTransactionDateChanged, "ormobject.updated.Transaction.Date")
         Publisher.subscribe(self.onAccountMintIdChanged, "ormobject.updated.Account.MintId")
+        Publisher.subscribe(self.onTransactionsBulkUpdated, "ormobject.bulkupdated")
         Publisher.subscribe(self.onAccountRemoved, "account.removed")
         Publisher.subscribe(self.onAccountAdded, "account.created")
         Publisher.subscribe(self.onCurrencyChanged, "currency_changed")
@@ -152,6 +153,10 @@ class AccountListCtrl(wx.Panel):
         
     def onTransactionDateChanged(self, event):
         self._UpdateMintStatuses()
+
+    def onTransactionsBulkUpdated(self, message):
+        if ("Transaction", "Date") in message.data:
+            self._UpdateMintStatuses()
         
     def _UpdateMintStatuses(self):
         for account, mintCtrl in zip(self.accountObjects, self.mintStatuses):
@@ -41,17 +41,22 @@ class MonthlyAnalyzer:
         buckets[bucket] += amount
     
     def GetEarnings(self, transactions):
+        return self.bucketEarnings((t.Date, t.Amount) for t in transactions)
+
+    def GetStoredEarnings(self, store, account=None):
+        """Like GetEarnings, but summed by the store for just the date range, from one account or all of them."""
+        start, end = self.GetDateRange()
+        dailyTotals = store.GetDailyTotals(account, start, end)
+        return self.bucketEarnings((date, total) for date, accountId, total in dailyTotals)
+
+    def bucketEarnings(self, amounts):
+        """Sum (date, amount) pairs into monthly buckets over the date range."""
         start, end = self.GetDateRange()
         # Initialize all buckets to zero, so we always get the desired months on the graph, even empty. (LP: #623055)
         buckets = dict([(self._DateToBucket(start+relativedelta(months=i)), 0) for i in range(self.Months)]) 
         
-        for t in sorted(transactions):
-            date = t.Date
-            if date >= start:
-                if date > end:
-                    break
-                self._AddToBucket(buckets, date, t.Amount)
+        for date, amount in amounts:
+            if start <= date <= end:
+                self._AddToBucket(buckets, date, amount)
             
         return [(key, buckets[key]) for key in sorted(buckets)]
-                
-        
@@ -23,13 +23,13 @@ from wxbanker.lib.pubsub import Publisher
 from wxbanker.bankobjects.ormobject import ORMObject
 from wxbanker.bankobjects.transaction import Transaction
 from wxbanker.bankobjects.recurringtransaction import RecurringTransaction
+from wxbanker.bankobjects.pagedtransactionlist import PagedTransactionList
 from wxbanker import currencies, bankexceptions, debug
 from wxbanker.mint.api import Mint
 
-from wxbanker.currencies import CurrencyList
-from wxbanker.currconvert import CurrencyConverter
+from wxbanker import currconvert
 
-import datetime
+import datetime, weakref
 
 class Account(ORMObject):
     ORM_TABLE = "accounts"
@@ -43,7 +43,10 @@ class Account(ORMObject):
         self._Name = name
         self._Transactions = None
         self._RecurringTransactions = []
-        self._preTransactions = []
+        # The objects handed out for transactions before they are loaded, such as pages and the other halves of
+        # transfers, by ID, so the same object is used for each and when they load. These are weak, so pages
+        # which are no longer in use can go.
+        self._preTransactions = weakref.WeakValueDictionary()
         # Make sure that Currency and Balance are not None (bug #653716)
         self.Currency = currency or 0
         self.Balance = balance or 0.0
@@ -51,7 +54,8 @@ class Account(ORMObject):
         self.ShowCurrencyNick = currNick or False
         self.IsFrozen = False
 
-        Publisher.subscribe(self.onTransactionAmountChanged, "ormobject.updated.Transaction.Amount")
+        Publisher.subscribe(self.onTransactionDateChanged, "ormobject.updated.Transaction.Date")
+        Publisher.subscribe(self.onTransactionsBulkUpdated, "ormobject.bulkupdated")
 
     def ParseAmount(self, strAmount):
         """
@@ -92,27 +96,36 @@ class Account(ORMObject):
 
     def balanceAtCurrency(self, balance, currency):
         if currency:
-            conv = CurrencyConverter()
-            destCurrency = CurrencyList[currency]().GetCurrencyNick()
+            destCurrency = currencies.GetCurrencyNick(currency)
             srcCurrency = self.GetCurrency().GetCurrencyNick()
-            return conv.Convert(balance, srcCurrency, destCurrency)
+            return currconvert.Convert(balance, srcCurrency, destCurrency)
         return balance
 
     def GetBalance(self, currency=None):
         return self.balanceAtCurrency(self.Balance, currency)
 
+    def RoundAmount(self, amount):
+        """Round an amount to the minor units (such as cents) the amounts of this account are stored in."""
+        return self.Store.RoundAmount(amount, self.ID)
+
+    def changeBalance(self, difference):
+        # Every amount is a whole number of minor units, so rounding the sum keeps it exact instead of adding up float errors.
+        self.Balance = self.RoundAmount(self.Balance + difference)
+
     def GetCurrentBalance(self, currency=None):
         """Returns the balance up to and including today, but not transactions in the future."""
-        currentBalance = self.Balance
-        today = datetime.date.today()
-        transactions = self.Transactions[:]
-        transactions.sort()
-        index = len(transactions) - 1
-        while index >= 0 and transactions[index].Date > today:
-            currentBalance -= transactions[index].Amount
-            index -= 1
-
-        return self.balanceAtCurrency(currentBalance, currency)
+        return self.GetBalanceAt(datetime.date.today(), currency)
+
+    def GetBalanceAt(self, date, currency=None):
+        """
+        Return the balance through the end of the date, from the balance index of the transactions
+        if they are loaded, or otherwise summed by the store.
+        """
+        if self._Transactions is not None:
+            balance = self.RoundAmount(self._Transactions.GetBalanceAt(date))
+        else:
+            balance = self.Store.GetBalanceBefore(self, date + datetime.timedelta(days=1))
+        return self.balanceAtCurrency(balance, currency)
         
     def GetRecurringTransactions(self):
         return self._RecurringTransactions
@@ -122,23 +135,26 @@ class Account(ORMObject):
 
     def GetTransactions(self):
         if self._Transactions is None:
+            # Objects already handed out for its transactions (see Account.AddTransaction) are used by the store,
+            # and from now on it is the loaded transactions which are.
             self._Transactions = self.Store.getTransactionsFrom(self)
-            # If transactions were added before this list was pulled,
-            # and then an attribute is changed on one of them (Amount/Description/Date), it won't be
-            # reflected on the new account at run-time because it has a replacement instance for that transaction.
-            # So we need to swap it in.
-            if self._preTransactions:
-                # Iterate over this first (and thus once) since it is probably larger than _pre.
-                for i, newT in enumerate(self._Transactions):
-                    for oldT in self._preTransactions:
-                        # Compare just IDs otherwise TDD is impossible; new attributes not yet stored
-                        # will cause the objects to not be properly replaced and break tests.
-                        if oldT.ID == newT.ID:
-                            self._Transactions[i] = oldT
-                            break
+            self._preTransactions.clear()
 
         return self._Transactions
 
+    def GetTransactionCount(self):
+        """Return the number of transactions, without loading them if they aren't already."""
+        if self._Transactions is None:
+            return self.Store.GetTransactionCount(self)
+        return len(self._Transactions)
+
+    def GetPagedTransactions(self, pageSize=500, maxPages=20):
+        """
+        Return a lazy, read-only sequence of the transactions in date order, which fetches
+        pages from the store as needed instead of loading the whole account.
+        """
+        return PagedTransactionList(self, pageSize, maxPages)
+
     def GetName(self):
         return self._Name
 
@@ -150,13 +166,56 @@ class Account(ORMObject):
         self.Parent.Remove(self.Name)
 
     def AddTransactions(self, transactions, sources=None):
+        """
+        Add many transaction objects at once. They are inserted into the store in bulk,
+        the balance is updated once, and a single "transactions.created" is sent.
+        A transaction with a source is a transfer, whose other half is made in that source.
+        """
+        if not transactions:
+            return
+
         Publisher.sendMessage("batch.start")
         # If we don't have any sources, we want None for each transaction.
         if sources is None:
             sources = [None for i in range(len(transactions))]
-            
+
+        # Group the transfers by source, so each source can make its halves in bulk too.
+        transfers = {}
         for t, source in zip(transactions, sources):
-            self.AddTransaction(transaction=t, source=source)
+            # These are "partial" because their IDs and parents aren't necessarily correct (when moving, for example).
+            t.Parent = self
+            t.ID = None
+            # The amounts are kept in the minor units they are stored in, so they don't change on a reload.
+            t._Amount = self.RoundAmount(t._Amount)
+            if source:
+                transfers.setdefault(source.ID, (source, []))[1].append(t)
+
+        for source, partials in transfers.values():
+            others = [Transaction(None, source, -1 * t.Amount, t._Description, t.Date) for t in partials]
+            source.AddTransactions(others)
+            # These don't have IDs yet, so the links will be stored when they are made.
+            for t, other in zip(partials, others):
+                t.LinkedTransaction = other
+
+        self.Store.MakeTransactions(self, transactions)
+
+        # Now that we have IDs, link the other halves back.
+        for source, partials in transfers.values():
+            for t in partials:
+                t.LinkedTransaction.LinkedTransaction = t
+
+        # Don't append if there aren't transactions loaded yet, they are already in the model and will appear on a load. (LP: 347385).
+        if self._Transactions is not None:
+            self.Transactions.extend(transactions)
+        else:
+            # Remember these, so the same objects are used when transactions are loaded.
+            for t in transactions:
+                self._preTransactions[t.ID] = t
+
+        Publisher.sendMessage("transactions.created", (self, transactions))
+
+        # Update the balance just once.
+        self.changeBalance(sum((t.Amount for t in transactions)))
         Publisher.sendMessage("batch.end")
         
     def AddRecurringTransaction(self, amount, description, date, repeatType, repeatEvery=1, repeatOn=None, endDate=None, source=None):
@@ -193,6 +252,7 @@ class Account(ORMObject):
             # It is "partial" because its ID and parent aren't necessarily correct.
             partialTrans = transaction
             partialTrans.Parent = self
+            partialTrans._Amount = self.RoundAmount(partialTrans._Amount)
         elif amount is not None:
             # No transaction object was given, we need to make one.
             partialTrans = Transaction(None, self, amount, description, date)
@@ -213,13 +273,13 @@ class Account(ORMObject):
         if self._Transactions is not None:
             self.Transactions.append(transaction)
         else:
-            # We will need to do some magic with these later when transactions are loaded.
-            self._preTransactions.append(transaction)
+            # Remember it, so the same object is used when transactions are loaded.
+            self._preTransactions[transaction.ID] = transaction
 
         Publisher.sendMessage("transaction.created", (self, transaction))
 
         # Update the balance.
-        self.Balance += transaction.Amount
+        self.changeBalance(transaction.Amount)
         Publisher.sendMessage("batch.end")
 
         if source:
@@ -236,21 +296,22 @@ class Account(ORMObject):
         However when removeLinkedTransactions is False, only transactions in this account
         will be removed, such as from Account.Purge().
         """
-        Publisher.sendMessage("batch.start")
-        # Return the sources, if any, of the removed transactions, in case we are moving for example.
-        sources = []
-        
-        # Accumulate the difference and update the balance just once. Cuts 33% time of removals.
-        difference = 0
-        
         # Make a copy of the list, to protect against getting passed self.Transactions itself.
         # Otherwise when we remove from self.Transactions, we'd end up iterating over every other transaction! (LP: #605591)
         transactions = transactions[:]
-        
+
+        # Membership is an index lookup, so check them all before changing anything.
         for transaction in transactions:
             if transaction not in self.Transactions:
                 raise bankexceptions.InvalidTransactionException("Transaction does not exist in account '%s'" % self.Name)
 
+        Publisher.sendMessage("batch.start")
+        # Return the sources, if any, of the removed transactions, in case we are moving for example.
+        sources = []
+        # The other halves of transfers to remove, grouped by account: {accountId: (account, links)}.
+        links = {}
+        
+        for transaction in transactions:
             # If this transaction was a transfer, delete the other transaction as well.
             if transaction.LinkedTransaction:
                 link = transaction.LinkedTransaction
@@ -259,18 +320,21 @@ class Account(ORMObject):
                 link.LinkedTransaction = None
                 # Delete the linked transaction from its account as well, if we should.
                 if removeLinkedTransactions:
-                    link.Remove()
+                    links.setdefault(link.Parent.ID, (link.Parent, []))[1].append(link)
             else:
                 sources.append(None)
 
-            # Now remove this transaction.
-            self.Store.RemoveTransaction(transaction)
+        for account, accountLinks in links.values():
+            account.RemoveTransactions(accountLinks)
+
+        # Now remove these transactions, in bulk from both the store and the list.
+        self.Store.RemoveTransactions(transactions)
+        self.Transactions.RemoveMany(transactions)
+        for transaction in transactions:
             transaction.Parent = None
-            self.Transactions.remove(transaction)
-            difference += transaction.Amount
 
-        # Update the balance.
-        self.Balance -= difference
+        # Accumulate the difference and update the balance just once. Cuts 33% time of removals.
+        self.changeBalance(-sum(t.Amount for t in transactions))
         # Send the message for all transactions at once, cuts _97%_ of time! OLV is slow here I guess.
         Publisher.sendMessage("transactions.removed", (self, transactions))
         Publisher.sendMessage("batch.end")
@@ -336,13 +400,25 @@ class Account(ORMObject):
         
         return syncString
 
-    def onTransactionAmountChanged(self, message):
+    def transactionAmountChanged(self, transaction, difference):
+        """Called by a transaction of this account when its amount changes, to apply the difference to the balance."""
+        debug.debug("Updating balance of %s by %s because of %s" % (self.Name, difference, transaction))
+        self.changeBalance(difference)
+        if self._Transactions is not None:
+            self._Transactions.AmountChanged(transaction, difference)
+
+    def onTransactionDateChanged(self, message):
         transaction = message.data
-        if transaction.Parent == self:
-            debug.debug("Updating balance because I am %s: %s" % (self.Name, transaction))
-            self.Balance = sum((t.Amount for t in self.Transactions))
-        else:
-            debug.debug("Ignoring transaction because I am %s: %s" % (self.Name, transaction))
+        # Keep the loaded transactions in order, by moving just this one.
+        if transaction.Parent is self and self._Transactions is not None:
+            self._Transactions.Reposition(transaction)
+
+    def onTransactionsBulkUpdated(self, message):
+        if self._Transactions is None:
+            return
+        redated = [t for t in message.data.get(("Transaction", "Date"), []) if t.Parent is self]
+        if redated:
+            self._Transactions.RepositionMany(redated)
 
     def float2str(self, *args, **kwargs):
         return self.Currency.float2str(withNick=self.ShowCurrencyNick, *args, **kwargs)
@@ -19,7 +19,8 @@
 #    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
 
 from wxbanker.lib.pubsub import Publisher
-from wxbanker import bankexceptions
+from wxbanker import bankexceptions, currencies, currconvert
+import numpy
 
 
 class AccountList(list):
@@ -46,10 +47,21 @@ class AccountList(list):
 
     def GetBalance(self):
         totalCurrency = self.BankModel.GlobalCurrency
-        total = 0
-        for account in self:
-            total = total + account.GetBalance(totalCurrency)
-        return total
+        return sum(self.ConvertAmounts([account.Balance for account in self], self, totalCurrency).tolist())
+
+    def ConvertAmounts(self, amounts, accounts, currency):
+        """
+        Return an array of the amounts, each of the account at the same index, in the currency, as
+        Account.balanceAtCurrency does for one. The conversion is done per currency rather than per amount.
+        """
+        if not currency:
+            return numpy.asarray(amounts, dtype=float)
+        nicks = {}
+        for account in accounts:
+            if account.ID not in nicks:
+                nicks[account.ID] = account.GetCurrency().GetCurrencyNick()
+        originals = [nicks[account.ID] for account in accounts]
+        return currconvert.ConvertMany(amounts, originals, currencies.GetCurrencyNick(currency))
     
     def GetById(self, theId):
         for account in self:
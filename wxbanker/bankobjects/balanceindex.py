@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+#    https://launchpad.net/wxbanker
+#    balanceindex.py: Copyright 2007-2010 Mike Rooney <mrooney@ubuntu.com>
+#
+#    This file is part of wxBanker.
+#
+#    wxBanker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    wxBanker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
+
+class BalanceIndex(object):
+    """
+    The sums of amounts by day, in a Fenwick (binary indexed) tree, so the total through any date
+    can be found, and the sum of any day changed, in O(log d) for the d days covered. The covered
+    days grow to fit the dates added, doubling each time so that growing is rare.
+    """
+    def __init__(self, amounts=()):
+        # The ordinal of the first covered day, and the sum of each covered day.
+        self.start = None
+        self.daily = []
+        self.tree = [0]
+
+        amounts = list(amounts)
+        if amounts:
+            days = [date.toordinal() for date, amount in amounts]
+            self.start = min(days)
+            self.daily = [0] * (max(days) - self.start + 1)
+            for day, (date, amount) in zip(days, amounts):
+                self.daily[day - self.start] += amount
+            self.build()
+
+    def build(self):
+        """Build the tree from the daily sums in O(d), by pushing each node into its parent."""
+        size = len(self.daily)
+        self.tree = [0] + self.daily
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+
+    def grow(self, day):
+        """Cover the day as well, keeping the current sums."""
+        if self.start is None:
+            self.start = day
+        size = max(len(self.daily) * 2, 16)
+        if day < self.start:
+            # Grow backwards, leaving room for even earlier days.
+            newStart = min(day, self.start + len(self.daily) - size)
+            self.daily = [0] * (self.start - newStart) + self.daily
+            self.start = newStart
+        if day - self.start >= len(self.daily):
+            size = max(size, day - self.start + 1)
+        self.daily.extend([0] * (size - len(self.daily)))
+        self.build()
+
+    def Add(self, date, amount):
+        """Add the amount to the sum of the date."""
+        day = date.toordinal()
+        if self.start is None or not 0 <= day - self.start < len(self.daily):
+            self.grow(day)
+
+        offset = day - self.start
+        self.daily[offset] += amount
+        i = offset + 1
+        while i < len(self.tree):
+            self.tree[i] += amount
+            i += i & -i
+
+    def totalThrough(self, day):
+        if self.start is None:
+            return 0
+        i = min(day - self.start + 1, len(self.daily))
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def GetTotalThrough(self, date):
+        """Return the sum of every amount dated on or before the date."""
+        return self.totalThrough(date.toordinal())
+
+    def GetTotalBefore(self, date):
+        """Return the sum of every amount dated before the date."""
+        return self.totalThrough(date.toordinal() - 1)
@@ -21,15 +21,41 @@
 import wx
 from wxbanker.lib.pubsub import Publisher
 import wx.lib.delayedresult as delayedresult
-import re, datetime
+import datetime, heapq
+import numpy
 
 from wxbanker import currencies
 from wxbanker.bankobjects.ormobject import ORMKeyValueObject
 from wxbanker.bankobjects.accountlist import AccountList
+from wxbanker.bankobjects.searchengine import SearchEngine
+from wxbanker.bankobjects.tagindex import TagIndex
 from wxbanker.mint.api import Mint
 
 from wxbanker.currencies import GetCurrencyInt
 
+def sampleDays(start, end, granularity):
+    """Return an array of the day ordinals to sample between start and end for the granularity of GetXTotals."""
+    if granularity == "daily":
+        return numpy.arange(start, end + 1)
+    elif granularity == "weekly":
+        ends = numpy.arange(start + 6, end, 7)
+    elif granularity == "monthly":
+        # The day before the first of each following month.
+        ends = []
+        date = datetime.date.fromordinal(start)
+        year, month = date.year, date.month
+        while True:
+            year, month = year + month // 12, month % 12 + 1
+            first = datetime.date(year, month, 1).toordinal()
+            if first > end:
+                break
+            ends.append(first - 1)
+        ends = numpy.array(ends, dtype=int)
+    else:
+        distance = end - start
+        return start + (distance * numpy.arange(int(granularity) + 1)) // int(granularity)
+    return numpy.append(ends, end)
+
 class BankModel(ORMKeyValueObject):
     ORM_TABLE = "meta"
     ORM_ATTRIBUTES = ["LastAccountId", "MintEnabled", "GlobalCurrency"]
@@ -38,7 +64,10 @@ class BankModel(ORMKeyValueObject):
         ORMKeyValueObject.__init__(self, store)
         self.Store = store
         self.Accounts = AccountList(self, store)
-        self._Tags = {}
+        self.TagIndex = TagIndex(self)
+        # The transactions of every account merged in order, until they change (see GetTransactions).
+        self.mergedTransactions = None
+        self.SearchEngine = SearchEngine(self)
 
         # Handle Mint integration, but send the message in the main thread, otherwise, dead.
         if self.MintEnabled:
@@ -48,8 +77,9 @@ class BankModel(ORMKeyValueObject):
         Publisher.subscribe(self.onAccountCurrencyChanged, "user.account_currency_changed")
         Publisher.subscribe(self.onMintToggled, "user.mint.toggled")
         Publisher.subscribe(self.onAccountChanged, "view.account changed")
-        Publisher.subscribe(self.onTransactionTagged, "transaction.tagged")
-        Publisher.subscribe(self.onTransactionUntagged, "transaction.untagged")
+        for topic in ("transaction.created", "transactions.created", "transactions.removed", "account.removed", "ormobject.updated.Transaction.Date"):
+            Publisher.subscribe(self.onTransactionsChanged, topic)
+        Publisher.subscribe(self.onTransactionsBulkUpdated, "ormobject.bulkupdated")
         
     def GetLastAccount(self):
         return self.Accounts.GetById(self.LastAccountId)
@@ -61,60 +91,71 @@ class BankModel(ORMKeyValueObject):
         return self.Accounts.GetRecurringTransactions()
 
     def GetTransactions(self):
-        transactions = []
-        for account in self.Accounts:
-            transactions.extend(account.Transactions)
+        """
+        Return the transactions of every account, in order by date (and ID). The sorted lists of the
+        accounts are merged once, and then copied until a transaction is created, removed or redated.
+        """
+        if self.mergedTransactions is None:
+            # Load any accounts which haven't been yet in one pass, rather than one account (and link) at a time.
+            self.Store.LoadTransactions(self.Accounts)
+            # Merge by the keys the lists are sorted on, which are unique so the transactions are never compared.
+            keyed = [zip(account.Transactions.keys, account.Transactions) for account in self.Accounts]
+            self.mergedTransactions = [t for key, t in heapq.merge(*keyed)]
+
+        return self.mergedTransactions[:]
+
+    def onTransactionsChanged(self, message):
+        self.mergedTransactions = None
 
-        return transactions
+    def onTransactionsBulkUpdated(self, message):
+        if ("Transaction", "Date") in message.data:
+            self.mergedTransactions = None
     
     def GetDateRange(self):
         """Get the date of the first and last transaction."""
-        transactions = self.GetTransactions()
+        dateRange = self.Store.GetDateRange()
         
         # If there are no transactions, let's go with today.
-        if not transactions:
+        if dateRange is None:
             return datetime.date.today(), datetime.date.today()
         else:
-            # Sorting transactions is very important, otherwise the first and last dates are arbitrary!
-            transactions.sort()
-            return transactions[0].Date, transactions[-1].Date
+            return dateRange
 
-    def GetXTotals(self, account=None, daterange=None):
+    def GetXTotals(self, account=None, daterange=None, granularity="daily"):
         """
-        Get totals every so many days, optionally within a specific account
-        and/or date range. This is particularly useful when we want to
-        graph a summary of account balances.
+        Get the balance at points within a date range (by default from the first transaction
+        until at least today), optionally of a specific account, as a pair of arrays of the day
+        ordinals and the balances at the end of those days. This is particularly useful when we
+        want to graph a summary of account balances.
+
+        The granularity is "daily", "weekly" or "monthly" for the end of each day, week or month
+        (the last cut short by the end of the range), or a number N for the start and the end of
+        each of N equal intervals of the range.
         """
         if account is None:
-            transactions = self.GetTransactions()
+            accounts = self.Accounts
             currency = self.GlobalCurrency
         else:
-            transactions = account.Transactions[:]
+            accounts = [account]
             currency = GetCurrencyInt(account.GetCurrency())
-        transactions.sort()
-        
-        if transactions == []:
-            return []
-        
+
+        # Let the store sum each day within the range, rather than loading and sorting every transaction.
+        startDate, endDate = daterange or (None, None)
+        dailyTotals = self.Store.GetDailyTotals(account, startDate, endDate)
         startingBalance = 0.0
-        # Crop transactions around the date range, if supplied.
         if daterange:
-            startDate, endDate = daterange
-            starti, endi = None, len(transactions)
-            total = 0.0
-            for i, t in enumerate(transactions):
-                if starti is None and t.Date >= startDate:
-                    starti = i
-                    startingBalance = total
-                if t.Date > endDate:
-                    endi = i
-                    break
-                total += t.GetAmount(currency)
-                
-            transactions = transactions[starti:endi]
+            for a in accounts:
+                startingBalance += a.GetBalanceAt(startDate - datetime.timedelta(days=1), currency)
         else:
             # Figure out the actual start and end dates we end up with.
-            startDate, endDate = transactions[0].Date, transactions[-1].Date
+            if dailyTotals:
+                startDate, endDate = dailyTotals[0][0], dailyTotals[-1][0]
+
+        # Without any transactions to plot (in or before the range), there is nothing to graph.
+        if dailyTotals == [] and startingBalance == 0:
+            return numpy.array([], dtype=int), numpy.array([], dtype=float)
+
+        accountsById = dict((a.ID, a) for a in accounts)
         
         # If the last transaction was before today, we still want to graph until today.
         today = datetime.date.today()
@@ -122,21 +163,15 @@ class BankModel(ORMKeyValueObject):
             endDate = daterange[1]
         elif today > endDate:
             endDate = today
-       
-        onedaydelta = datetime.timedelta(days=1)
-        # Generate day totals
-        totals = []
-        currDate = startDate
-        tindex = 0
-        balance = startingBalance
-        while currDate <= endDate:
-            while tindex < len(transactions) and transactions[tindex].Date <= currDate:
-                balance += transactions[tindex].GetAmount(currency)
-                tindex += 1
-            totals.append([currDate, balance])
-            currDate += onedaydelta
-
-        return totals
+
+        # The balance after each day with transactions, preceded by the starting balance.
+        dates = numpy.array([date.toordinal() for date, accountId, total in dailyTotals], dtype=int)
+        amounts = self.Accounts.ConvertAmounts([total for date, accountId, total in dailyTotals], [accountsById[accountId] for date, accountId, total in dailyTotals], currency)
+        balances = numpy.concatenate(([startingBalance], startingBalance + numpy.cumsum(amounts)))
+
+        # The balance at the end of each day is the one after the last day with transactions on or before it.
+        days = sampleDays(startDate.toordinal(), endDate.toordinal(), granularity)
+        return days, balances[numpy.searchsorted(dates, days, side="right")]
 
     def CreateAccount(self, accountName):
         return self.Accounts.Create(accountName)
@@ -150,19 +185,7 @@ class BankModel(ORMKeyValueObject):
         I originally used strings here but passing around and then validating on translated
         strings seems like a bad and fragile idea.
         """
-        # Handle account options.
-        if account is None:
-            potentials = self.GetTransactions()
-        else:
-            potentials = account.Transactions[:]
-
-        # Find all the matches.
-        matches = []
-        for trans in potentials:
-            potentialStr = unicode((trans.Amount, trans.Description, trans.Date)[matchIndex])
-            if re.findall(searchString, potentialStr, flags=re.IGNORECASE):
-                matches.append(trans)
-        return matches
+        return self.SearchEngine.Search(searchString, account, matchIndex)
 
     def Save(self):
         self.Store.Save()
@@ -199,21 +222,6 @@ class BankModel(ORMKeyValueObject):
         else:
             self.LastAccountId = None
             
-    def onTransactionTagged(self, message):
-        tagNames = message.data
-        for tag in tagNames:
-            if tag in self._Tags:
-                self._Tags[tag] += 1
-            else:
-                self._Tags[tag] = 1
-                
-    def onTransactionUntagged(self, message):
-        tagNames = message.data
-        for tag in tagNames:
-            self._Tags[tag] -= 1
-            if self._Tags[tag] == 0:
-                self._Tags.pop(tag)
-                
     def onMintToggled(self, message):
         enabled = message.data
         self.MintEnabled = enabled
@@ -233,7 +241,7 @@ class BankModel(ORMKeyValueObject):
                 print t
                 
     def GetTags(self):
-        return set(self._Tags.keys())
+        return self.TagIndex.GetTags()
 
     Balance = property(GetBalance)
     Tags = property(GetTags)
@@ -18,11 +18,70 @@
 #    You should have received a copy of the GNU General Public License
 #    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
 from wxbanker.lib.pubsub import Publisher
 
+
+class BulkUpdate(object):
+    """
+    The context of ORMObject.Bulk(). Inside it, updates to objects of the class aren't published one
+    by one, but collected and sent at the end as a single "ormobject.bulkupdated", whose data is an
+    OrderedDict of {(classname, attrname): [objects, in the order they were first changed]}.
+    Nesting is fine; only the outermost one of the class publishes. The depth is counted on the class
+    itself (not inherited), so a Bulk() of ORMObject works the same as one of a subclass.
+    """
+    def __init__(self, cls):
+        self.Class = cls
+        # Whether the class had a bulkUpdates of its own (ORMObject's None) to restore after the outermost context.
+        self.hadOwn = False
+
+    def __enter__(self):
+        cls = self.Class
+        depth = cls.__dict__.get("bulkDepth", 0)
+        if not depth:
+            self.hadOwn = "bulkUpdates" in cls.__dict__
+            cls.bulkUpdates = OrderedDict()
+        cls.bulkDepth = depth + 1
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        cls = self.Class
+        cls.bulkDepth -= 1
+        if cls.bulkDepth:
+            return False
+        updates = cls.bulkUpdates
+        if self.hadOwn:
+            cls.bulkUpdates = None
+        else:
+            # Subclasses then see their base class's again, which may be in a bulk context of its own.
+            del cls.bulkUpdates
+        # Even if something went wrong, the changes which were made still need to be published.
+        if updates:
+            Publisher.sendMessage("ormobject.bulkupdated", OrderedDict((key, objects.values()) for key, objects in updates.iteritems()))
+        return False
+
+
 class ORMObject(object):
     ORM_TABLE = None
     ORM_ATTRIBUTES = []
+    # Subclasses without __slots__ of their own still get a __dict__.
+    __slots__ = ("IsFrozen", "ID", "__weakref__")
+    # While in a Bulk() of the class, its unpublished updates: {(classname, attrname): {id(object): object}}.
+    bulkUpdates = None
+
+    @classmethod
+    def Bulk(cls):
+        """
+        Return a context in which updates to objects of this class are published together once it
+        exits, as "ormobject.bulkupdated", instead of as an "ormobject.updated.<Class>.<Attr>" each:
+
+            with Transaction.Bulk():
+                for transaction in transactions:
+                    transaction.Date = date
+
+        Listeners of updates to the class have to handle bulk updates to it as well.
+        """
+        return BulkUpdate(cls)
     
     def __init__(self):
         self.IsFrozen = True
@@ -39,6 +98,9 @@ class ORMObject(object):
     def publishIfAppropriate(self, attrname, val):
         if attrname in self.ORM_ATTRIBUTES:
             classname = self.__class__.__name__
+            if self.bulkUpdates is not None:
+                self.bulkUpdates.setdefault((classname, attrname.strip("_")), OrderedDict())[id(self)] = self
+                return
             Publisher.sendMessage("ormobject.updated.%s.%s" % (classname, attrname.strip("_")), self)
             
     def getAttrValue(self, attrname):
@@ -53,8 +115,9 @@ class ORMObject(object):
         # Description is special in that GetDescription returns a decorated _Description, and should not be stored.
         elif attrname == "Description":
             value = self._Description
-        elif attrname == "Date": # No tests fail if this clause is removed; weird.
-            value = "%s/%s/%s"%(self.Date.year, str(self.Date.month).zfill(2), str(self.Date.day).zfill(2))
+        elif attrname == "Date":
+            # The same format sqlite3 gives dates on insert, so dates in the store compare correctly as strings.
+            value = "%s-%s-%s"%(self.Date.year, str(self.Date.month).zfill(2), str(self.Date.day).zfill(2))
         return value
             
     def toResult(self):
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+#    https://launchpad.net/wxbanker
+#    pagedtransactionlist.py: Copyright 2007-2010 Mike Rooney <mrooney@ubuntu.com>
+#
+#    This file is part of wxBanker.
+#
+#    wxBanker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    wxBanker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from wxbanker.lib.pubsub import Publisher
+
+class PagedTransactionList(object):
+    """
+    A read-only sequence of the transactions of an account in (date, id) order, for accounts too
+    large to load all at once. Fixed-size pages are fetched from the store by their (date, id) key,
+    and only the most recently used pages are kept. Once the account loads its transactions
+    normally, this defers to them so the same objects are always handed out.
+    """
+    def __init__(self, account, pageSize=500, maxPages=20):
+        self.Account = account
+        self.Store = account.Store
+        self.PageSize = pageSize
+        self.MaxPages = maxPages
+        self.Invalidate()
+
+        self.Subscriptions = (
+            (self.onTransactionsChanged, "transaction.created"),
+            (self.onTransactionsChanged, "transactions.created"),
+            (self.onTransactionsChanged, "transactions.removed"),
+            (self.onTransactionDateChanged, "ormobject.updated.Transaction.Date"),
+            (self.onTransactionsBulkUpdated, "ormobject.bulkupdated"),
+        )
+        for callback, topic in self.Subscriptions:
+            Publisher.subscribe(callback, topic)
+
+    def Invalidate(self):
+        """Forget the count and pages, as transactions were added, removed or moved."""
+        self.length = None
+        self.pages = OrderedDict()
+        # Map page numbers to the key of the row just before them; the first page starts at the beginning.
+        self.pageKeys = {0: None}
+
+    def getLoaded(self):
+        """Return the loaded transactions of the account, which are kept in order, or None if they aren't loaded."""
+        return self.Account._Transactions
+
+    def getPageKey(self, page):
+        if page not in self.pageKeys:
+            # Skip ahead from the closest known page, using just the index.
+            known = max(p for p in self.pageKeys if p < page)
+            offset = (page - known) * self.PageSize - 1
+            key = self.Store.getTransactionKeyAfter(self.Account, self.pageKeys[known], offset)
+            self.pageKeys[page] = key and tuple(key)
+        return self.pageKeys[page]
+
+    def getPage(self, page):
+        if page in self.pages:
+            # Mark it as the most recently used.
+            transactions = self.pages.pop(page)
+        else:
+            rows = self.Store.getTransactionRowsAfter(self.Account, self.getPageKey(page), self.PageSize)
+            # Objects already handed out, by an earlier fetch or otherwise, are used instead of new ones.
+            transactions = self.Store.rows2transactions(rows, [self.Account])
+            if len(rows) == self.PageSize:
+                lastRow = rows[-1]
+                self.pageKeys[page+1] = (lastRow[4], lastRow[0])
+            while len(self.pages) >= self.MaxPages:
+                self.pages.popitem(last=False)
+        self.pages[page] = transactions
+        return transactions
+
+    def __len__(self):
+        loaded = self.getLoaded()
+        if loaded is not None:
+            return len(loaded)
+        if self.length is None:
+            self.length = self.Store.GetTransactionCount(self.Account)
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+
+        loaded = self.getLoaded()
+        if loaded is not None:
+            return loaded[index]
+
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("transaction index out of range")
+        page, offset = divmod(index, self.PageSize)
+        return self.getPage(page)[offset]
+
+    def __iter__(self):
+        loaded = self.getLoaded()
+        if loaded is not None:
+            for t in loaded:
+                yield t
+            return
+
+        page = 0
+        while page * self.PageSize < len(self):
+            for t in self.getPage(page):
+                yield t
+            page += 1
+
+    def index(self, transaction):
+        """Return the index of the transaction, found by the store rather than a scan."""
+        loaded = self.getLoaded()
+        if loaded is not None:
+            return loaded.index(transaction)
+        if transaction.Parent is not self.Account or transaction.ID is None:
+            raise ValueError("transaction is not in this account")
+        return self.Store.getTransactionIndex(transaction)
+
+    def GetCached(self):
+        """Return the transactions which are currently in memory, without fetching any."""
+        loaded = self.getLoaded()
+        if loaded is not None:
+            return loaded
+        transactions = []
+        for page in sorted(self.pages):
+            transactions.extend(self.pages[page])
+        return transactions
+
+    def onTransactionsChanged(self, message):
+        account = message.data[0]
+        if account is self.Account:
+            self.Invalidate()
+
+    def onTransactionDateChanged(self, message):
+        transaction = message.data
+        if transaction.Parent is self.Account:
+            self.Invalidate()
+
+    def onTransactionsBulkUpdated(self, message):
+        account = self.Account
+        if any(t.Parent is account for t in message.data.get(("Transaction", "Date"), [])):
+            self.Invalidate()
@@ -36,6 +36,11 @@ class RecurringTransaction(Transaction, ORMObject):
     WEEKLY = 1
     MONTLY = 2
     YEARLY = 3
+    # The attributes the occurrences depend on, so changing one of them discards the cached rule.
+    RULE_ATTRIBUTES = ("RepeatType", "RepeatEvery", "RepeatOn", "Date", "EndDate")
+    # The rule and the attributes it was made from, as (key, rrule), and the due dates as of a day, as ((key, day, LastTransacted), dates).
+    ruleCache = None
+    dueMemo = None
     
     def __init__(self, tID, parent, amount, description, date, repeatType, repeatEvery=1, repeatOn=None, endDate=None, source=None, lastTransacted=None):
         Transaction.__init__(self, tID, parent, amount, description, date)
@@ -55,6 +60,20 @@ class RecurringTransaction(Transaction, ORMObject):
         self.LastTransacted = lastTransacted
         self.IsFrozen = False
         
+    def amountChanged(self, difference):
+        # Only the transactions this makes are part of the balance of the account, not this itself.
+        pass
+
+    def publishIfAppropriate(self, attrname, val):
+        # Updates go through here, so this is where the cached recurrence becomes stale. Properties such as
+        # Date and EndDate store into _Date and _EndDate, so match the names without the underscore.
+        name = attrname.lstrip("_")
+        if name in self.RULE_ATTRIBUTES:
+            self.ruleCache = self.dueMemo = None
+        elif name == "LastTransacted":
+            self.dueMemo = None
+        Transaction.publishIfAppropriate(self, attrname, val)
+
     def IsWeekly(self):
         return self.RepeatType == self.WEEKLY
         
@@ -68,13 +87,27 @@ class RecurringTransaction(Transaction, ORMObject):
         
         self.LastTransacted = datetime.date.today()
         
+    def getRuleKey(self):
+        # Unstored or frozen changes aren't published, and RepeatOn can be changed in place, so the cache is also checked against this.
+        repeatOn = self.RepeatOn
+        return (self.RepeatType, self.RepeatEvery, repeatOn and tuple(repeatOn), self.Date, self.EndDate)
+
     def GetRRule(self):
-        """Generate the dateutils.rrule for this recurring transaction."""
+        """
+        Return the dateutils.rrule for this recurring transaction. It is made once for its current
+        recurrence, and caches the occurrences it expands, so asking it again is cheap.
+        """
+        key = self.getRuleKey()
+        if self.ruleCache is None or self.ruleCache[0] != key:
+            self.ruleCache = (key, self.makeRRule())
+        return self.ruleCache[1]
+
+    def makeRRule(self):
         # Create some mapping lists.
         rruleDays = [rrule.MO, rrule.TU, rrule.WE, rrule.TH, rrule.FR, rrule.SA, rrule.SU]
         rruleTypes = [rrule.DAILY, rrule.WEEKLY, rrule.MONTHLY, rrule.YEARLY]
         
-        func = functools.partial(rrule.rrule, rruleTypes[self.RepeatType], dtstart=self.Date, interval=self.RepeatEvery, wkst=rrule.MO)
+        func = functools.partial(rrule.rrule, rruleTypes[self.RepeatType], dtstart=self.Date, interval=self.RepeatEvery, wkst=rrule.MO, cache=True)
         if self.RepeatType == self.WEEKLY:
             result = func(byweekday=[rruleDays[i] for i, x in enumerate(self.RepeatOn) if x])
         elif self.RepeatType == self.MONTLY:
@@ -91,9 +124,13 @@ class RecurringTransaction(Transaction, ORMObject):
     
     def GetUntransactedDates(self):
         """Get all due transaction dates."""
-        result = self.GetRRule()
         today = datetime.date.today()
-        
+        # These only change with the recurrence, the last transacted date and the day, so are answered from a memo until one does.
+        memoKey = (self.getRuleKey(), today, self.LastTransacted)
+        if self.dueMemo is not None and self.dueMemo[0] == memoKey:
+            return self.dueMemo[1][:]
+
+        result = self.GetRRule()
         # Stop at the end date or today, whichever is earlier.
         if self.EndDate:
             end = min(self.EndDate, today)
@@ -110,8 +147,10 @@ class RecurringTransaction(Transaction, ORMObject):
         start, end = [self.DateToDatetime(d) for d in (start, end)]
         # Calculate the result.
         result = result.between(start, end, inc=True)
-        # Return just the dates, we don't care about datetime.
-        return [dt.date() for dt in list(result)]
+        # Keep just the dates, we don't care about datetime.
+        dates = [dt.date() for dt in result]
+        self.dueMemo = (memoKey, dates)
+        return dates[:]
     
     def GetNext(self):
         """Get the next transaction date that will occur."""
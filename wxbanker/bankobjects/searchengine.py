@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+#
+#    https://launchpad.net/wxbanker
+#    searchengine.py: Copyright 2007-2010 Mike Rooney <mrooney@ubuntu.com>
+#
+#    This file is part of wxBanker.
+#
+#    wxBanker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    wxBanker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
+
+import re, datetime, weakref
+
+from wxbanker.lib.pubsub import Publisher
+from wxbanker.bankobjects.tag import Tag
+
+# Searches without any of these are plain substrings, which don't need a regular expression.
+REGEX_CHARS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+# The attribute of a transaction searched, by match index.
+FIELDS = ("Amount", "Description", "Date")
+
+
+def parseRange(value, convert):
+    """Parse "low..high" (either end optional) or a single value into a (low, high) pair, or None if invalid."""
+    if ".." in value:
+        low, high = value.split("..", 1)
+    else:
+        low = high = value
+    try:
+        low = convert(low) if low else None
+        high = convert(high) if high else None
+    except ValueError:
+        return None
+    if low is None and high is None:
+        return None
+    return low, high
+
+def parseDate(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+def parseFilter(token):
+    """
+    Return the filter for a typed search term, or None if the token is just text:
+      #tag               transactions with the tag
+      amount:low..high   amounts within the range, inclusive, where either end may be left out
+      date:low..high     dates (as YYYY-MM-DD) within the range, likewise; a single value matches exactly
+    """
+    if token.startswith(Tag.TAG_CHAR) and len(token) > 1:
+        return ("tag", Tag(token[1:].lower()))
+    for field, convert in (("amount", float), ("date", parseDate)):
+        prefix = field + ":"
+        if token.lower().startswith(prefix):
+            bounds = parseRange(token[len(prefix):], convert)
+            if bounds is not None:
+                return (field,) + bounds
+    return None
+
+def inRange(value, low, high):
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+class SearchEngine(object):
+    """
+    Searches the transactions of a model. Patterns are compiled once, searches without any regular
+    expression characters are simple substring tests, and each transaction is compared by lowercase
+    keys built once instead of on every search. The results of the last search are kept, so that a
+    search which extends it (as when typing) only has to look through those.
+    """
+    def __init__(self, model):
+        self.Model = model
+        # The lowercase key of each transaction, for each field (amount, description and date). These are
+        # weak, so that searching doesn't keep transactions alive, such as those of a model which was closed.
+        self.keys = (weakref.WeakKeyDictionary(), weakref.WeakKeyDictionary(), weakref.WeakKeyDictionary())
+        self.patterns = {}
+        # The query and results of the last search, while they are still valid.
+        self.last = None
+
+        Publisher.subscribe(self.onTransactionsCreated, "transaction.created")
+        Publisher.subscribe(self.onTransactionsCreated, "transactions.created")
+        Publisher.subscribe(self.onTransactionsRemoved, "transactions.removed")
+        Publisher.subscribe(self.onAccountRemoved, "account.removed")
+        Publisher.subscribe(self.onTransactionUpdated, "ormobject.updated.Transaction")
+        Publisher.subscribe(self.onAccountRenamed, "ormobject.updated.Account.Name")
+        Publisher.subscribe(self.onTransactionsBulkUpdated, "ormobject.bulkupdated")
+
+    def Search(self, searchString, account=None, matchIndex=1):
+        """Return the transactions of the account (or all accounts) matching the search, in the usual order."""
+        text, filters = self.parse(searchString)
+        query = (account and account.ID, matchIndex, text, filters)
+
+        if self.refines(query):
+            potentials = self.last[1]
+        else:
+            tags = [f[1] for f in filters if f[0] == "tag"]
+            dates = [f for f in filters if f[0] == "date"]
+            if tags:
+                # The tag index has the transactions with a tag, so start from those instead of every transaction.
+                potentials = self.Model.TagIndex.GetTransactions(tags[0])
+                if account is not None:
+                    potentials = [t for t in potentials if t.Parent is account]
+            elif dates:
+                # Likewise the transactions within a date range are bisected from the sorted lists of the accounts.
+                potentials = self.Model.Store.GetTransactionsBetween(account, dates[0][1], dates[0][2])
+            elif account is None:
+                potentials = self.Model.GetTransactions()
+            else:
+                potentials = account.Transactions[:]
+            # The store's full-text index can narrow down the candidates for descriptions, if it applies to this search.
+            if matchIndex == 1 and text:
+                candidateIds = self.Model.Store.SearchDescriptions(text)
+                if candidateIds is not None:
+                    potentials = [t for t in potentials if t.ID in candidateIds]
+
+        for f in filters:
+            potentials = [t for t in potentials if self.passes(t, f)]
+        if text:
+            matchesText = self.getMatcher(text)
+            getKey = self.getKey
+            # Look up the keys already made in the weak dictionary's own dict, which is much faster than its get().
+            cached, ref = self.keys[matchIndex].data, weakref.ref
+            potentials = [t for t in potentials if matchesText(cached.get(ref(t)) or getKey(t, matchIndex))]
+        self.last = (query, potentials)
+        # Return a copy, so that changing it doesn't change what the next search may refine.
+        return potentials[:]
+
+    def parse(self, searchString):
+        """Split a search into its text and a frozenset of filters for its typed terms."""
+        tokens = searchString.split()
+        filters = [parseFilter(token) for token in tokens]
+        if not any(filters):
+            return searchString, frozenset()
+        text = " ".join(token for token, f in zip(tokens, filters) if f is None)
+        return text, frozenset(f for f in filters if f is not None)
+
+    def refines(self, query):
+        """Return whether everything matching the query also matched the last search."""
+        if self.last is None:
+            return False
+        accountId, matchIndex, text, filters = query
+        lastAccountId, lastMatchIndex, lastText, lastFilters = self.last[0]
+        if (accountId, matchIndex) != (lastAccountId, lastMatchIndex) or not lastFilters <= filters:
+            return False
+        if text == lastText or not lastText:
+            return True
+        # Only a substring contains any substring of itself; a pattern which is extended may match anything.
+        return not REGEX_CHARS.search(text) and not REGEX_CHARS.search(lastText) and lastText.lower() in text.lower()
+
+    def passes(self, transaction, f):
+        if f[0] == "tag":
+            return f[1] in transaction.Tags
+        return inRange(transaction.Amount if f[0] == "amount" else transaction.Date, f[1], f[2])
+
+    def getMatcher(self, text):
+        """Return a function of whether a (lowercase) key matches the text."""
+        if REGEX_CHARS.search(text):
+            search = self.getPattern(text).search
+            return lambda key: search(key) is not None
+        needle = text.lower()
+        return lambda key: needle in key
+
+    def getKey(self, transaction, matchIndex):
+        keys = self.keys[matchIndex]
+        key = keys.get(transaction)
+        if key is None:
+            key = keys[transaction] = unicode(getattr(transaction, FIELDS[matchIndex])).lower()
+        return key
+
+    def getPattern(self, text):
+        pattern = self.patterns.get(text)
+        if pattern is None:
+            pattern = self.patterns[text] = re.compile(text, flags=re.IGNORECASE)
+        return pattern
+
+    def clearKeys(self):
+        for keys in self.keys:
+            keys.clear()
+
+    def onTransactionsCreated(self, message):
+        self.last = None
+
+    def onTransactionsRemoved(self, message):
+        account, transactions = message.data
+        self.last = None
+        for keys in self.keys:
+            for t in transactions:
+                keys.pop(t, None)
+
+    def onTransactionUpdated(self, message):
+        transaction = message.data
+        self.last = None
+        self.forget([transaction])
+
+    def onTransactionsBulkUpdated(self, message):
+        for (classname, attrname), objects in message.data.iteritems():
+            if classname == "Transaction":
+                self.last = None
+                self.forget(objects)
+
+    def forget(self, transactions):
+        """Discard the keys of the transactions, which changed."""
+        for transaction in transactions:
+            # The description of a transfer also depends on the other half (see Transaction.GetDescription).
+            for t in (transaction, transaction.LinkedTransaction):
+                if t is not None:
+                    for keys in self.keys:
+                        keys.pop(t, None)
+
+    def onAccountRemoved(self, message):
+        self.last = None
+        self.clearKeys()
+
+    def onAccountRenamed(self, message):
+        # Transfers are described by the name of the other account.
+        self.last = None
+        self.clearKeys()
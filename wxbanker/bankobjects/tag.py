@@ -51,4 +51,17 @@ class Tag(object):
         return cmp(self.Name, other.Name)
     
     def __hash__(self):
-        return hash(self.Name)
\ No newline at end of file
+        return hash(self.Name)
+
+
+def parseTags(description):
+    """Return the set of Tags in a description, which are the words starting with the tag character."""
+    tags = set()
+    for word in description.split(" "):
+        if word.startswith(Tag.TAG_CHAR):
+            try:
+                tags.add(Tag(word[1:].lower()))
+            except EmptyTagException:
+                # This is not so good but, we can't argue with the description, it just isn't a tag.
+                continue
+    return tags
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#
+#    https://launchpad.net/wxbanker
+#    tagindex.py: Copyright 2007-2010 Mike Rooney <mrooney@ubuntu.com>
+#
+#    This file is part of wxBanker.
+#
+#    wxBanker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    wxBanker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+from wxbanker.lib.pubsub import Publisher
+
+
+class TagIndex(object):
+    """
+    An inverted index of the tags of the loaded transactions: the IDs of the transactions with each
+    tag, along with a running total for each tag per account and per month. Totals are kept in the
+    currency of each account and only converted when asked for, so currency changes don't affect them.
+    Until every account is loaded, questions are answered by the store instead, without loading them.
+    """
+    def __init__(self, model):
+        self.Model = model
+        # {tag: set of transaction IDs}
+        self.ids = {}
+        # {tag: {accountId: [count, total]}}
+        self.totals = {}
+        # {tag: {(year, month): {accountId: [count, total]}}}
+        self.months = {}
+        # What each transaction contributes, so it can be taken back out: {tid: (transaction, tags, accountId, amount, (year, month))}
+        self.entries = {}
+
+        Publisher.subscribe(self.onTransactionTagsChanged, "transaction.tagged")
+        Publisher.subscribe(self.onTransactionTagsChanged, "transaction.untagged")
+        Publisher.subscribe(self.onTransactionsLoaded, "transactions.tagged")
+        Publisher.subscribe(self.onTransactionCreated, "transaction.created")
+        Publisher.subscribe(self.onTransactionsCreated, "transactions.created")
+        Publisher.subscribe(self.onTransactionsRemoved, "transactions.removed")
+        Publisher.subscribe(self.onTransactionUpdated, "ormobject.updated.Transaction")
+        Publisher.subscribe(self.onTransactionsBulkUpdated, "ormobject.bulkupdated")
+
+    def GetTags(self):
+        """Return the set of tags on any loaded transaction."""
+        return set(self.ids.keys())
+
+    def GetTransactionIds(self, tag):
+        return set(self.ids.get(tag, ()))
+
+    def GetTransactions(self, tag):
+        """Return the transactions with the tag, in order by date (and ID)."""
+        if self.isLoaded():
+            entries = self.entries
+            return sorted(entries[tid][0] for tid in self.ids.get(tag, ()))
+
+        # Ask the store which transactions have the tag, and only fetch those which aren't in memory already.
+        store = self.Model.Store
+        rows = store.GetTaggedTransactionIds(tag)
+        idsByAccount = {}
+        for tid, accountId in rows:
+            idsByAccount.setdefault(accountId, []).append(tid)
+        transactions = {}
+        for account in self.Model.Accounts:
+            if account.ID in idsByAccount:
+                transactions.update(store.GetTransactionsByIds(account, idsByAccount[account.ID]))
+        return [transactions[tid] for tid, accountId in rows]
+
+    def GetCount(self, tag):
+        if self.isLoaded():
+            return len(self.ids.get(tag, ()))
+        return sum(count for count, total in self.Model.Store.GetTagTotals(tag).values())
+
+    def GetTotal(self, tag, currency=None):
+        """Return the sum of the amounts of the transactions with the tag, in the currency if one is given."""
+        if self.isLoaded():
+            accountTotals = self.totals.get(tag, {})
+        else:
+            accountTotals = self.Model.Store.GetTagTotals(tag)
+        return self.sumAccountTotals(accountTotals, currency)
+
+    def GetMonthlyTotals(self, tag, currency=None):
+        """Return a list of (first day of the month, total) for each month with a transaction with the tag, in order."""
+        if self.isLoaded():
+            months = self.months.get(tag, {})
+        else:
+            months = {}
+            for date, accountId, count, total in self.Model.Store.GetTagDailyTotals(tag):
+                self.addAmount(months.setdefault((date.year, date.month), {}), accountId, total, count)
+        return [(datetime.date(year, month, 1), self.sumAccountTotals(months[(year, month)], currency)) for year, month in sorted(months)]
+
+    def isLoaded(self):
+        # Only loaded transactions are indexed, so unless every account is loaded, the store is asked instead.
+        return all(account._Transactions is not None for account in self.Model.Accounts)
+
+    def sumAccountTotals(self, accountTotals, currency):
+        if not accountTotals:
+            return 0.0
+        accounts = dict((account.ID, account) for account in self.Model.Accounts)
+        accountIds = accountTotals.keys()
+        amounts = [accountTotals[aid][1] for aid in accountIds]
+        return sum(self.Model.Accounts.ConvertAmounts(amounts, [accounts[aid] for aid in accountIds], currency).tolist())
+
+    def Add(self, transaction):
+        """Index the transaction (again), by its current tags, account, amount and date."""
+        tid = transaction.ID
+        if tid in self.entries:
+            self.Remove(tid)
+        tags = tuple(transaction._Tags)
+        if not tags:
+            return
+        # This is done for every transaction loaded, so use the attributes rather than the properties.
+        date = transaction._Date
+        accountId, amount, month = transaction.Parent.ID, transaction._Amount, (date.year, date.month)
+        self.entries[tid] = (transaction, tags, accountId, amount, month)
+        for tag in tags:
+            if tag not in self.ids:
+                self.ids[tag], self.totals[tag], self.months[tag] = set(), {}, {}
+            self.ids[tag].add(tid)
+            self.addAmount(self.totals[tag], accountId, amount, 1)
+            self.addAmount(self.months[tag].setdefault(month, {}), accountId, amount, 1)
+
+    def Remove(self, tid):
+        """Take the transaction with the ID out of the index, if it is in it."""
+        entry = self.entries.pop(tid, None)
+        if entry is None:
+            return
+        transaction, tags, accountId, amount, month = entry
+        for tag in tags:
+            ids = self.ids[tag]
+            ids.discard(tid)
+            if not ids:
+                # That was the last transaction with the tag.
+                del self.ids[tag], self.totals[tag], self.months[tag]
+                continue
+            self.addAmount(self.totals[tag], accountId, -amount, -1)
+            months = self.months[tag]
+            self.addAmount(months[month], accountId, -amount, -1)
+            if not months[month]:
+                del months[month]
+
+    def addAmount(self, accountTotals, accountId, amount, count):
+        countTotal = accountTotals.get(accountId)
+        if countTotal is None:
+            countTotal = accountTotals[accountId] = [0, 0.0]
+        countTotal[0] += count
+        countTotal[1] += amount
+        # Drop the totals of accounts without any of the transactions left, so they are empty when nothing is.
+        if not countTotal[0]:
+            del accountTotals[accountId]
+
+    def isIndexable(self, transaction):
+        # Transactions are indexed once they are stored and complete, which is when they have an ID and are not frozen.
+        return transaction.ID is not None and not transaction.IsFrozen and transaction.Parent is not None and self.isOurs(transaction.Parent)
+
+    def isOurs(self, account):
+        # Messages are about the transactions of any model, such as another one loaded from the same store,
+        # or not of a model at all, like the CSV import preview.
+        return getattr(account, "Parent", None) is self.Model.Accounts
+
+    def onTransactionTagsChanged(self, message):
+        transaction, tags = message.data
+        if self.isIndexable(transaction):
+            self.Add(transaction)
+
+    def onTransactionsLoaded(self, message):
+        # The store announces the transactions it loads with tags all at once, instead of each tagging itself.
+        transactions = message.data
+        for transaction in transactions:
+            if self.isOurs(transaction.Parent):
+                self.Add(transaction)
+
+    def onTransactionCreated(self, message):
+        account, transaction = message.data
+        if self.isOurs(account):
+            self.Add(transaction)
+
+    def onTransactionsCreated(self, message):
+        account, transactions = message.data
+        if self.isOurs(account):
+            for transaction in transactions:
+                self.Add(transaction)
+
+    def onTransactionsRemoved(self, message):
+        account, transactions = message.data
+        if self.isOurs(account):
+            for transaction in transactions:
+                self.Remove(transaction.ID)
+
+    def onTransactionUpdated(self, message):
+        transaction = message.data
+        # Amounts and dates change the totals; other changes are harmless to index again.
+        if transaction.ID in self.entries and self.isIndexable(transaction):
+            self.Add(transaction)
+
+    def onTransactionsBulkUpdated(self, message):
+        for (classname, attrname), transactions in message.data.iteritems():
+            if classname == "Transaction":
+                for transaction in transactions:
+                    if transaction.ID in self.entries and self.isIndexable(transaction):
+                        self.Add(transaction)
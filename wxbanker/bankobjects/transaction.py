@@ -23,11 +23,23 @@ import datetime
 import re
 
 from wxbanker.bankobjects.ormobject import ORMObject
-from wxbanker.bankobjects.tag import Tag, EmptyTagException
+from wxbanker.bankobjects.tag import Tag, parseTags
 from wxbanker import debug
 
-from wxbanker.currencies import CurrencyList
-from wxbanker.currconvert import CurrencyConverter
+from wxbanker.currencies import GetCurrencyNick
+from wxbanker import currconvert
+
+def describeTransfer(description, amount, otherAccountName):
+    """Return the description of a transfer with the account on the other side."""
+    if amount > 0:
+        transferString = _("Transfer from %s") % otherAccountName
+    else:
+        transferString = _("Transfer to %s") % otherAccountName
+
+    if description:
+        return transferString + " (%s)"%description
+    return transferString
+
 
 class Transaction(ORMObject):
     """
@@ -38,8 +50,10 @@ class Transaction(ORMObject):
     """
     ORM_TABLE = "transactions"
     ORM_ATTRIBUTES = ["_Amount", "_Description", "_Date", "LinkedTransaction", "RecurringParent"]
+    # There are many transactions, so they don't each have a __dict__. _Total is the running total cached by TransactionOLV (see getTotal).
+    __slots__ = ("Parent", "RecurringParent", "_LinkedTransaction", "_Date", "_Description", "_Amount", "_Tags", "_Total")
     
-    def __init__(self, tID, parent, amount, description, date):
+    def __init__(self, tID, parent, amount, description, date, tags=None):
         ORMObject.__init__(self)
         self.IsFrozen = True
 
@@ -48,12 +62,32 @@ class Transaction(ORMObject):
         self.Parent = parent
         self.Date = date
         self.Tags = set()
-        self.Description = description
+        if tags is None:
+            self.Description = description
+        else:
+            # The tags are known (loaded from the store), so there is no need to parse the description for them.
+            self._Description = unicode(description)
+            self.TagsAdded(tags)
         self.Amount = amount
         self.RecurringParent = None
 
         self.IsFrozen = False
 
+    @classmethod
+    def FromStore(cls, tID, parent, amount, description, date, tags):
+        """
+        Create a transaction loaded from the store, setting the attributes directly rather than through
+        __setattr__ and the properties, since there is nothing to publish, parse or check. This includes
+        the tags, which the store registers for all the transactions of a load at once ("transactions.tagged").
+        """
+        transaction = cls.__new__(cls)
+        setattr = object.__setattr__
+        for attrname, value in (("IsFrozen", False), ("ID", tID), ("_LinkedTransaction", None), ("Parent", parent),
+                                ("_Date", date), ("_Tags", set(tags)), ("_Description", unicode(description)), ("_Amount", amount),
+                                ("RecurringParent", None)):
+            setattr(transaction, attrname, value)
+        return transaction
+
     def GetDate(self):
         return self._Date
 
@@ -75,6 +109,9 @@ class Transaction(ORMObject):
         """
         if date is None:
             return datetime.date.today()
+        # Dates (such as those loaded from the store) need no parsing. A datetime isn't a date for our purposes.
+        if type(date) is datetime.date:
+            return date
         # The maximum number of years you can refer to in the future, using an abbreviation.
         # Ex: If it is 2008 and MAX_FUTURE_ABBR is 10, years 9-18 will become 2009-2018,
         # while 19-99 will become 1919-1999.
@@ -101,51 +138,39 @@ class Transaction(ORMObject):
     def GetDescription(self):
         description = self._Description
         if self.LinkedTransaction:
-            parentName = self.LinkedTransaction.Parent.Name
-            if self.Amount > 0:
-                transferString = _("Transfer from %s") % parentName
-            else:
-                transferString = _("Transfer to %s") % parentName
-                
-            if description:
-                description = transferString + " (%s)"%description
-            else:
-                description = transferString
-            
+            description = describeTransfer(description, self.Amount, self.LinkedTransaction.Parent.Name)
         return description
 
     def SetDescription(self, description, fromLink=False):
         """Update the description, ensuring it is a string."""
         description = unicode(description)
-        self._Description = description
-        # Update the linked transaction if one exists.
-        if not fromLink and self.LinkedTransaction:
-            self.LinkedTransaction.SetDescription(description, fromLink=True)
-            
-        # Parse/update tags.
-        tags = set()
-        for word in description.split(" "):
-            if word.startswith("#"):
-                tagName = word[1:].lower()
-                try:
-                    tag = Tag(tagName)
-                except EmptyTagException:
-                    # This is not so good but, we can't argue with the description, it just isn't a tag.
-                    continue
-                tags.add(tag)
-        
+        if description == getattr(self, "_Description", None):
+            return
+
+        # Update the tags first, so they are current when the description change is published.
+        tags = parseTags(description)
         removedTags = self._Tags.difference(tags)
         addedTags = tags.difference(self._Tags)
         self.TagsRemoved(removedTags)
         self.TagsAdded(addedTags)
+
+        self._Description = description
+        # Update the linked transaction if one exists.
+        if not fromLink and self.LinkedTransaction:
+            self.LinkedTransaction.SetDescription(description, fromLink=True)
         
     def TagsAdded(self, tagNames):
+        # Most transactions have no tags, so don't send a message about none of them.
+        if not tagNames:
+            return
         self.Tags.update(tagNames)
-        Publisher.sendMessage("transaction.tagged", tagNames)
+        Publisher.sendMessage("transaction.tagged", (self, tagNames))
     
     def TagsRemoved(self, tagNames):
+        if not tagNames:
+            return
         self.Tags.difference_update(tagNames)
-        Publisher.sendMessage("transaction.untagged", tagNames)
+        Publisher.sendMessage("transaction.untagged", (self, tagNames))
         
     def AddTag(self, tagName):
         tag = Tag(tagName)
@@ -165,21 +190,33 @@ class Transaction(ORMObject):
 
     def GetAmount(self, currency=None):
         if currency:
-            conv = CurrencyConverter()
-            destCurrency = CurrencyList[currency]().GetCurrencyNick() 
+            destCurrency = GetCurrencyNick(currency)
             srcCurrency = self.Parent.GetCurrency().GetCurrencyNick()
-            return conv.Convert(self._Amount, srcCurrency, destCurrency)
+            return currconvert.Convert(self._Amount, srcCurrency, destCurrency)
         return self._Amount
 
     def SetAmount(self, amount, fromLink=False):
-        """Update the amount, ensuring it is a float."""
+        """Update the amount, ensuring it is a float in the minor units of the account (see Account.RoundAmount)."""
         amount = float(amount)
+        # The parent may not be an account, such as the container of the CSV import preview.
+        roundAmount = getattr(self.Parent, "RoundAmount", None)
+        if roundAmount is not None:
+            amount = roundAmount(amount)
+        difference = amount - getattr(self, "_Amount", 0)
         self._Amount = amount
+        if difference:
+            self.amountChanged(difference)
         
         # Update the linked transaction if one exists.
         if not fromLink and self.LinkedTransaction:
             self.LinkedTransaction.SetAmount(-amount, fromLink=True)
 
+    def amountChanged(self, difference):
+        # Tell just our account, which applies the difference instead of summing every transaction.
+        # Like the ORM update, this is only for stored transactions and not while frozen (loading).
+        if not self.IsFrozen and self.ID is not None and self.Parent is not None:
+            self.Parent.transactionAmountChanged(self, difference)
+
     def GetLinkedTransaction(self):
         return self._LinkedTransaction
 
@@ -206,12 +243,13 @@ class Transaction(ORMObject):
         return "%i/%i/%i: %s -- %.2f" % (self.Date.year, self.Date.month, self.Date.day, self.Description, self.Amount)
 
     def __cmp__(self, other):
-        return cmp(
-            (self.Date, self.ID),
-            (other.Date, other.ID)
-        )
+        # Compare by (date, ID), without building tuples as this is called a lot when sorting.
+        return cmp(self._Date, other._Date) or cmp(self.ID, other.ID)
 
     def __eq__(self, other):
+        # Weak dictionaries keyed on transactions (see SearchEngine.keys) compare a transaction with itself on every lookup.
+        if self is other:
+            return True
         if not isinstance(other, Transaction):
             return False
 
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+#    https://launchpad.net/wxbanker
+#    transactioncolumns.py: Copyright 2007-2010 Mike Rooney <mrooney@ubuntu.com>
+#
+#    This file is part of wxBanker.
+#
+#    wxBanker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    wxBanker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import numpy
+
+class TransactionColumns(object):
+    """
+    Transactions as parallel arrays (in order by date and ID) rather than Transaction objects, for
+    code which only reads them, such as exports. Dates are ordinals, transactions without a link
+    have a LinkIDs of 0, and descriptions are indexes into a table of the distinct descriptions.
+    """
+    def __init__(self, ids, accountIds, dates, amounts, linkIds, descriptionIndexes, descriptions):
+        self.IDs = ids
+        self.AccountIDs = accountIds
+        self.Dates = dates
+        self.Amounts = amounts
+        self.LinkIDs = linkIds
+        self.DescriptionIndexes = descriptionIndexes
+        self.Descriptions = descriptions
+
+    def __len__(self):
+        return len(self.IDs)
+
+    def Select(self, selection):
+        """Return the columns of just the rows selected, by a boolean mask or an array of indexes."""
+        return TransactionColumns(self.IDs[selection], self.AccountIDs[selection], self.Dates[selection], self.Amounts[selection],
+                                  self.LinkIDs[selection], self.DescriptionIndexes[selection], self.Descriptions)
+
+    def ForAccount(self, account):
+        return self.Select(self.AccountIDs == account.ID)
+
+    def GetDescriptions(self):
+        """Return the (undecorated) description of each row."""
+        descriptions = self.Descriptions
+        return [descriptions[i] for i in self.DescriptionIndexes.tolist()]
+
+    def GetDates(self):
+        return [datetime.date.fromordinal(day) for day in self.Dates.tolist()]
+
+    def GetLinkAccountIDs(self, columns=None):
+        """
+        Return the account ID of the other half of each transfer (and 0 for other rows), looked up among
+        the rows of columns (by default these ones). A link which isn't there is also 0.
+        """
+        if columns is None:
+            columns = self
+        result = numpy.zeros(len(self), dtype=self.AccountIDs.dtype)
+        if len(columns) == 0:
+            return result
+
+        order = numpy.argsort(columns.IDs)
+        ids, accountIds = columns.IDs[order], columns.AccountIDs[order]
+        found = numpy.searchsorted(ids, self.LinkIDs).clip(0, len(ids) - 1)
+        present = (self.LinkIDs != 0) & (ids[found] == self.LinkIDs)
+        result[present] = accountIds[found[present]]
+        return result
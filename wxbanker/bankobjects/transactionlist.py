@@ -18,13 +18,248 @@
 #    You should have received a copy of the GNU General Public License
 #    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
 
+from bisect import bisect_left, bisect_right
+from wxbanker.bankobjects.balanceindex import BalanceIndex
+
+def transactionKey(transaction):
+    return (transaction.Date, transaction.ID)
+
 class TransactionList(list):
+    """
+    A list of transactions which is always in (date, id) order, the order they are displayed in.
+    Transactions are inserted in place by bisection so nothing needs to sort it, and one whose
+    date changed is moved with Reposition(). The keys are kept in a parallel list to bisect, as
+    comparing transactions themselves is slow and their dates can change while in the list.
+    An index of IDs to the key each transaction was inserted with makes membership O(1), and
+    finding (so removing) one O(log n). The amounts are also summed by day in a BalanceIndex, for
+    the balance at any date or row in O(log n) rather than summing everything before it.
+    """
+    # Changes to at most 1/IN_PLACE_RATIO of the list are made in place, one (C level) list shift each;
+    # larger ones rebuild the lists in a single pass instead, as that is then cheaper.
+    IN_PLACE_RATIO = 32
+
     def __init__(self, items=None):
         # list does not understand items=None apparently.
         if items is None:
             items = []
 
-        list.__init__(self, items)
+        list.__init__(self, sorted(items, key=transactionKey))
+        self.keys = [transactionKey(t) for t in self]
+        self.byId = {}
+        for t, key in zip(self, self.keys):
+            self.addToIndex(t, key)
+        self.balances = BalanceIndex((key[0], t.Amount) for t, key in zip(self, self.keys))
+
+    def addToIndex(self, transaction, key):
+        # Transactions which aren't stored yet don't have an ID, but they also don't change under the list.
+        if transaction.ID is not None:
+            self.byId[transaction.ID] = (key, transaction)
+
+    def removeFromIndex(self, transaction):
+        entry = self.byId.get(transaction.ID)
+        if entry is not None and entry[1] is transaction:
+            del self.byId[transaction.ID]
+
+    def find(self, transaction, key):
+        """Return the index of the transaction (or one equal to it) among those with the key, or -1."""
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            item = list.__getitem__(self, i)
+            if item is transaction or item == transaction:
+                return i
+            i += 1
+        return -1
+
+    def locate(self, transaction):
+        if transaction.ID is None:
+            return self.find(transaction, transactionKey(transaction))
+        entry = self.byId.get(transaction.ID)
+        if entry is None:
+            return -1
+        # Use the key it was inserted with, in case its date changed and it hasn't been repositioned yet.
+        return self.find(transaction, entry[0])
+
+    def append(self, transaction):
+        key = transactionKey(transaction)
+        i = bisect_right(self.keys, key)
+        list.insert(self, i, transaction)
+        self.keys.insert(i, key)
+        self.addToIndex(transaction, key)
+        self.balances.Add(key[0], transaction.Amount)
+
+    def insert(self, index, transaction):
+        """The position is determined by the transaction, so the index is ignored."""
+        self.append(transaction)
+
+    def extend(self, transactions):
+        transactions = sorted(transactions, key=transactionKey)
+        if not transactions:
+            return
+        if self.isFew(len(transactions)):
+            for t in transactions:
+                self.append(t)
+            return
+
+        keys = [transactionKey(t) for t in transactions]
+        for t, key in zip(transactions, keys):
+            self.addToIndex(t, key)
+            self.balances.Add(key[0], t.Amount)
+        # Usually these are newer than everything, otherwise merge the two sorted runs.
+        if not self.keys or keys[0] >= self.keys[-1]:
+            list.extend(self, transactions)
+            self.keys.extend(keys)
+        else:
+            pairs = sorted(zip(self.keys, self) + zip(keys, transactions), key=lambda pair: pair[0])
+            list.__setitem__(self, slice(None), [t for key, t in pairs])
+            self.keys = [key for key, t in pairs]
+
+    def __iadd__(self, transactions):
+        self.extend(transactions)
+        return self
+
+    def pop(self, index=-1):
+        transaction = list.pop(self, index)
+        key = self.keys.pop(index)
+        self.removeFromIndex(transaction)
+        self.balances.Add(key[0], -transaction.Amount)
+        return transaction
+
+    def remove(self, transaction):
+        i = self.locate(transaction)
+        if i == -1:
+            raise ValueError("TransactionList.remove(x): x not in list")
+        self.pop(i)
+
+    def isFew(self, count):
+        return count * self.IN_PLACE_RATIO <= len(self)
+
+    def RemoveMany(self, transactions):
+        """
+        Remove many transactions at once, each found by its key. A few are deleted in place, by runs of
+        adjacent positions from the end so the earlier positions stay valid, which is O(k log n) plus a
+        shift of the rest of the list per run. Otherwise the list is rebuilt in one O(n) pass, instead of
+        shifting everything after each one.
+        """
+        positions = set()
+        for transaction in transactions:
+            i = self.locate(transaction)
+            if i == -1:
+                raise ValueError("TransactionList.RemoveMany(x): x not in list")
+            positions.add(i)
+            item = list.__getitem__(self, i)
+            self.removeFromIndex(item)
+            self.balances.Add(self.keys[i][0], -item.Amount)
+
+        if self.isFew(len(positions)):
+            positions = sorted(positions, reverse=True)
+            end = None
+            for j, i in enumerate(positions):
+                if end is None:
+                    end = i + 1
+                # Delete each run of adjacent positions once its start is reached.
+                if j + 1 == len(positions) or positions[j + 1] != i - 1:
+                    list.__delslice__(self, i, end)
+                    del self.keys[i:end]
+                    end = None
+            return
+
+        pairs = [pair for i, pair in enumerate(zip(self.keys, self)) if i not in positions]
+        list.__setitem__(self, slice(None), [t for key, t in pairs])
+        self.keys = [key for key, t in pairs]
+
+    def index(self, transaction):
+        i = self.locate(transaction)
+        if i == -1:
+            raise ValueError("TransactionList.index(x): x not in list")
+        return i
+
+    def __contains__(self, transaction):
+        if transaction.ID is None:
+            return self.locate(transaction) != -1
+        entry = self.byId.get(transaction.ID)
+        return entry is not None and (entry[1] is transaction or entry[1] == transaction)
+
+    def __setitem__(self, index, transaction):
+        if isinstance(index, slice):
+            raise TypeError("TransactionList is sorted, so slices can't be assigned")
+        old = list.__getitem__(self, index)
+        self.removeFromIndex(old)
+        list.__setitem__(self, index, transaction)
+        self.addToIndex(transaction, self.keys[index])
+        self.balances.Add(self.keys[index][0], transaction.Amount - old.Amount)
+        if transactionKey(transaction) != self.keys[index]:
+            self.Reposition(transaction)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for transaction, key in zip(list.__getitem__(self, index), self.keys[index]):
+                self.removeFromIndex(transaction)
+                self.balances.Add(key[0], -transaction.Amount)
+            list.__delitem__(self, index)
+            del self.keys[index]
+        else:
+            self.pop(index)
+
+    def __delslice__(self, start, end):
+        self.__delitem__(slice(start, end))
+
+    def __setslice__(self, start, end, items):
+        self.__setitem__(slice(start, end), items)
+
+    def Reposition(self, transaction):
+        """Move a transaction whose date changed to where it now belongs."""
+        i = self.locate(transaction)
+        if i == -1:
+            raise ValueError("TransactionList.Reposition(x): x not in list")
+        self.pop(i)
+        self.append(transaction)
+
+    def RepositionMany(self, transactions):
+        """
+        Move many transactions whose dates changed, by removing them and putting them back where they now
+        belong: a few are each inserted by bisection, and many are merged back in at once (see extend).
+        """
+        self.RemoveMany(transactions)
+        self.extend(transactions)
+
+    def AmountChanged(self, transaction, difference):
+        """Update the balances for a change in the amount of a transaction in the list."""
+        entry = self.byId.get(transaction.ID)
+        if entry is not None and entry[1] is transaction:
+            self.balances.Add(entry[0][0], difference)
+
+    def GetBalanceAt(self, date):
+        """Return the balance through the end of the date."""
+        return self.balances.GetTotalThrough(date)
+
+    def GetBalanceThrough(self, index):
+        """Return the running balance at a row, including it."""
+        if index < 0:
+            index += len(self)
+        date = self.keys[index][0]
+        # Add the transactions earlier on the same day to the balance through the previous day.
+        dayStart = bisect_left(self.keys, (date,))
+        return self.balances.GetTotalBefore(date) + sum(t.Amount for t in list.__getslice__(self, dayStart, index + 1))
+
+    def First(self):
+        """Return the earliest transaction, or None if there aren't any."""
+        if self:
+            return list.__getitem__(self, 0)
+
+    def Last(self):
+        """Return the latest transaction, or None if there aren't any."""
+        if self:
+            return list.__getitem__(self, -1)
+
+    def Range(self, start=None, end=None):
+        """Return the transactions dated from start through end (either may be None, for no bound) in order."""
+        lo, hi = 0, len(self)
+        if start is not None:
+            lo = bisect_left(self.keys, (start,))
+        if end is not None:
+            # Infinity sorts after any ID on the end date.
+            hi = bisect_right(self.keys, (end, float("inf")))
+        return list.__getslice__(self, lo, hi)
 
     def __eq__(self, other):
         if not len(self) == len(other):
@@ -33,4 +268,4 @@ class TransactionList(list):
             if not leftTrans == rightTrans:
                 return False
 
-        return True
\ No newline at end of file
+        return True
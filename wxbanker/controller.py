@@ -39,6 +39,8 @@ class Controller(object):
         Publisher.subscribe(self.onShowZeroToggled, "user.showzero_toggled")
         Publisher.subscribe(self.onShowCurrencyNickToggled, "user.show_currency_nick_toggled")
         Publisher.subscribe(self.onSaveRequest, "user.saved")
+        Publisher.subscribe(self.onDurabilityChanged, "user.durability_changed")
+        Publisher.subscribe(self.onUpdatesBuffered, "store.updates_buffered")
         
     def MigrateIfFound(self, fromPath, toPath):
         """Migrate a file from fromPath (if it exists) to toPath."""
@@ -107,6 +109,20 @@ class Controller(object):
     def onSaveRequest(self, message):
         self.Model.Save()
 
+    def onDurabilityChanged(self, message):
+        val = message.data
+        self.Durability = val
+
+    def onUpdatesBuffered(self, message):
+        store = message.data
+        # Write the buffered updates after a while, even if the user stops editing and nothing else writes them.
+        wx.CallLater(int(store.FLUSH_INTERVAL * 1000), self.FlushStore, store)
+
+    def FlushStore(self, store):
+        # The store may have been closed since the flush was arranged.
+        if any(model.Store is store for model in self.Models):
+            store.flushUpdates()
+
     def GetAutoSave(self):
         return self._AutoSave
 
@@ -138,6 +154,16 @@ class Controller(object):
         wx.Config.Get().WriteBool("SHOW_CURRENCY_NICK", val)
         Publisher.sendMessage("controller.show_currency_nick_toggled", val)
 
+    def GetDurability(self):
+        return self.Model.Store.Durability
+
+    def SetDurability(self, val):
+        # This is stored in each database's meta table, not the config, since it describes the file.
+        debug.debug("Setting durability to: %s" % val)
+        for model in self.Models:
+            model.Store.SetDurability(val)
+        Publisher.sendMessage("controller.durability_changed", val)
+
     def LoadPath(self, path, use=False):
         if path is None:
             path = fileservice.getDataFilePath(self.DB_NAME)
@@ -171,3 +197,4 @@ class Controller(object):
     AutoSave = property(GetAutoSave, SetAutoSave)
     ShowZeroBalanceAccounts = property(GetShowZero, SetShowZero)
     ShowCurrencyNick = property(GetShowCurrencyNick, SetShowCurrencyNick)
+    Durability = property(GetDurability, SetDurability)
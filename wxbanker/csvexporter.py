@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import csv, cStringIO
+import numpy
+from wxbanker.bankobjects.transaction import describeTransfer
 
 class CsvExporter:
     """Iterate through the list of transactions for an account and
@@ -15,9 +17,17 @@ class CsvExporter:
         writer.writerow(['Account', 'Description', 'Amount', 'Date'])
 
         # Iterate through transaction list, write rows.
+        # Read the columns from the store, rather than creating (and keeping) a Transaction for every row.
+        columns = model.Store.GetTransactionColumns()
+        linkAccountIds = columns.GetLinkAccountIDs()
+        names = dict((account.ID, account.Name) for account in model.Accounts)
         for account in model.Accounts:
-            for transaction in account.Transactions:
-                row = [account.Name.encode("utf8"), transaction.GetDescription().encode("utf8"), transaction.GetAmount(), transaction.GetDate()]
+            selected = numpy.flatnonzero(columns.AccountIDs == account.ID)
+            rows = columns.Select(selected)
+            for description, amount, date, linkAccountId in zip(rows.GetDescriptions(), rows.Amounts.tolist(), rows.GetDates(), linkAccountIds[selected].tolist()):
+                if linkAccountId in names:
+                    description = describeTransfer(description, amount, names[linkAccountId])
+                row = [account.Name.encode("utf8"), description.encode("utf8"), amount, date]
                 writer.writerow(row)
                 
         return result.getvalue().decode("utf8")
@@ -20,22 +20,88 @@
 
 from wxbanker import localization, fileservice
 from xml.etree import ElementTree
+import os, time
+import numpy
 
 class ConversionException(Exception): pass
 
-class CurrencyConverter(object):
-    def __init__(self):
-        self.Exchanges = {"EUR": 1.0}
-        self.OriginalPath = fileservice.getSharedFilePath("exchanges.xml")
-        self._loadExchanges()
+def loadExchanges(path):
+    """Return the exchange rates (from euros) of each currency in an exchanges.xml."""
+    exchanges = {"EUR": 1.0}
+    tree = ElementTree.fromstring(open(path).read())
+    for e in tree.getchildren()[-1].getchildren()[0].getchildren():
+        exchanges[e.get("currency")] = float(e.get("rate"))
+    return exchanges
+
+
+class ExchangeRates(object):
+    """
+    The exchange rates shared by the process, and the factor to convert from each currency to each
+    other. The rates are loaded once, and only again if the file is modified, which is checked at
+    most every CHECK_INTERVAL seconds.
+    """
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, path=None):
+        self.Path = path
+        self.Exchanges = {}
+        self.factors = {}
+        self.mtime = None
+        self.lastCheck = None
+
+    def refresh(self):
+        now = time.time()
+        if self.lastCheck is not None and now - self.lastCheck < self.CHECK_INTERVAL:
+            return
+        self.lastCheck = now
+
+        if self.Path is None:
+            self.Path = fileservice.getSharedFilePath("exchanges.xml")
+        mtime = os.path.getmtime(self.Path)
+        if mtime != self.mtime:
+            self.Exchanges = loadExchanges(self.Path)
+            self.factors = dict(((src, dst), dstRate / srcRate) for src, srcRate in self.Exchanges.items() for dst, dstRate in self.Exchanges.items())
+            self.mtime = mtime
 
-    def _loadExchanges(self):
-        tree = ElementTree.fromstring(open(self.OriginalPath).read())
+    def GetExchanges(self):
+        self.refresh()
+        return self.Exchanges
 
-        exchanges = tree.getchildren()[-1].getchildren()[0].getchildren()
-        for e in exchanges:
-            self.Exchanges[e.get("currency")] = float(e.get("rate"))
+    def GetFactor(self, original, destination):
+        """Return what to multiply an amount in the original currency by to convert it to the destination."""
+        self.refresh()
+        factor = self.factors.get((original, destination))
+        if factor is None:
+            missing = [c for c in (original, destination) if c not in self.Exchanges]
+            raise ConversionException(_('No exchange rate for currency "%s"') % missing[0])
+        return factor
 
+Rates = ExchangeRates()
+
+def Convert(amount, original, destination):
+    """Convert an amount from one currency to another with the shared exchange rates."""
+    if original == destination:
+        return amount
+    return amount * Rates.GetFactor(original, destination)
+
+def ConvertMany(amounts, originals, destination):
+    """
+    Convert amounts, each in the currency at the same index of originals, to the destination, returning
+    an array. The factor of each distinct currency is looked up once, and applied in a single multiply.
+    """
+    amounts = numpy.asarray(amounts, dtype=float)
+    codes = {}
+    indexes = numpy.fromiter((codes.setdefault(original, len(codes)) for original in originals), dtype=int, count=len(amounts))
+    factors = numpy.empty(len(codes))
+    for original, code in codes.items():
+        factors[code] = 1.0 if original == destination else Rates.GetFactor(original, destination)
+    return amounts * factors[indexes]
+
+
+class CurrencyConverter(object):
+    def __init__(self):
+        # A copy of the shared rates, so they can be changed for this converter alone.
+        self.Exchanges = dict(Rates.GetExchanges())
 
     def Convert(self, amount, original, destination):
         """
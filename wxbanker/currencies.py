@@ -89,6 +89,13 @@ class BaseCurrency(object):
     def GetCurrencyNick(self):
         return self.LOCALECONV["int_curr_symbol"].strip()
 
+    def GetFracDigits(self):
+        """The number of digits after the decimal point, which is CHAR_MAX in the C locale, so fall back to 2."""
+        fracDigits = self.LOCALECONV["frac_digits"]
+        if not 0 <= fracDigits <= 6:
+            fracDigits = 2
+        return fracDigits
+
     def float2str(self, val, just=0, withNick=False):
         """Formats float values as currency strings according to the currency settings in self.LOCALECONV"""
         # Don't show negative zeroes!
@@ -523,6 +530,20 @@ class LocalizedCurrency(BaseCurrency):
         BaseCurrency.__init__(self)
         self.LOCALECONV = locale.localeconv()
 
+def GetCurrencyNick(index):
+    """
+    Return the nick of the currency at the index of CurrencyList. Each is only instantiated once for this,
+    other than the localized currency which follows the current locale.
+    """
+    if index == 0:
+        return LocalizedCurrency().GetCurrencyNick()
+    nick = currencyNicks.get(index)
+    if nick is None:
+        nick = currencyNicks[index] = CurrencyList[index]().GetCurrencyNick()
+    return nick
+
+currencyNicks = {}
+
 def GetCurrencyInt(currency):
     for i, curr in enumerate(CurrencyList):
         if isinstance(currency, curr):
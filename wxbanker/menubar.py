@@ -48,6 +48,9 @@ class BankMenuBar(wx.MenuBar):
     ID_EXPORT_CSV = wx.NewId()
     ID_IMPORT_XML = wx.NewId()
     ID_EXPORT_XML = wx.NewId()
+    # The durability profiles of the store (see PersistentStore.DURABILITY_PROFILES), from fastest to safest.
+    DURABILITIES = ["fast", "balanced", "safe"]
+    IDS_DURABILITIES = [wx.NewId() for i in range(len(DURABILITIES))]
 
     def __init__(self, bankController, *args, **kwargs):
         wx.MenuBar.__init__(self, *args, **kwargs)
@@ -109,6 +112,19 @@ class BankMenuBar(wx.MenuBar):
 
         self.mintEnabledItem = settingsMenu.AppendCheckItem(self.ID_MINTINTEGRATION, _("Integrate with Mint.com"), _("Sync account balances with an existing Mint.com account"))
 
+        # Add an entry for each durability profile, which trade the speed of saving against what a crash can lose.
+        durabilities = wx.Menu()
+        durabilityLabels = {
+            "fast": (_("Fast"), _("Don't wait for the disk when saving; a crash may lose recent changes")),
+            "balanced": (_("Balanced"), _("Wait for the disk now and then; a power loss may lose the last few changes")),
+            "safe": (_("Safe"), _("Wait for the disk on every save; nothing saved is ever lost")),
+        }
+        self.durabilityItems = []
+        for durability, ID in zip(self.DURABILITIES, self.IDS_DURABILITIES):
+            label, helpString = durabilityLabels[durability]
+            self.durabilityItems.append(durabilities.AppendRadioItem(ID, label, helpString))
+        settingsMenu.AppendMenu(-1, _("Save durability"), durabilities, _("Choose how safely changes are saved"))
+
         # Help menu.
         helpMenu = wx.Menu()
 
@@ -150,9 +166,11 @@ class BankMenuBar(wx.MenuBar):
 
         self.toggleAutoSave(autosave)
         self.toggleShowCurrencyNick(showcurrnick)
+        self.toggleDurability(bankController.Durability)
         Publisher.subscribe(self.onAutoSaveToggled, "controller.autosave_toggled")
         Publisher.subscribe(self.onShowZeroToggled, "controller.showzero_toggled")
         Publisher.subscribe(self.onShowCurrencyNickToggled, "controller.show_currency_nick_toggled")
+        Publisher.subscribe(self.onDurabilityChanged, "controller.durability_changed")
         # Subscribe to a Mint update event, which tells us the checkbox should be enabled after startup.
         Publisher.subscribe(self.onMintUpdate, "mint.updated")
 
@@ -161,6 +179,8 @@ class BankMenuBar(wx.MenuBar):
 
         if ID in self.IDS_CURRENCIES:
             self.onSelectCurrency(self.IDS_CURRENCIES.index(ID))
+        elif ID in self.IDS_DURABILITIES:
+            self.onSelectDurability(self.DURABILITIES[self.IDS_DURABILITIES.index(ID)])
         else:
             handler = {
                 wx.ID_SAVE: self.onClickSave,
@@ -212,6 +232,12 @@ class BankMenuBar(wx.MenuBar):
     def toggleMintEnabled(self, enabled):
         self.mintEnabledItem.Check(enabled)
 
+    def onDurabilityChanged(self, message):
+        self.toggleDurability(message.data)
+
+    def toggleDurability(self, durability):
+        self.durabilityItems[self.DURABILITIES.index(durability)].Check(True)
+
     def onClickSave(self, event):
         Publisher.sendMessage("user.saved")
 
@@ -236,6 +262,9 @@ class BankMenuBar(wx.MenuBar):
     def onSelectCurrency(self, currencyIndex):
         Publisher.sendMessage("user.global_currency_changed", currencyIndex)
 
+    def onSelectDurability(self, durability):
+        Publisher.sendMessage("user.durability_changed", durability)
+
     def onClickFAQs(self, event):
         webbrowser.open("https://answers.launchpad.net/wxbanker/+faqs")
 
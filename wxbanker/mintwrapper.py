@@ -42,7 +42,7 @@ def ImportAccounts(model):
         
         # Now we have to add an initial transaction for the initial balance.
         if transactions:
-            firstTransaction = sorted(transactions)[0]
+            firstTransaction = min(transactions)
             initialDate = firstTransaction.Date
 
             initialBalance = balance - account.Balance
@@ -17,25 +17,44 @@
 #    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
 
 """
-Table: accounts                                v2                 v3              v10
-+---------------------------------------------------------------+---------------+-----------------+
-| id INTEGER PRIMARY KEY | name VARCHAR(255) | currency INTEGER | balance FLOAT | mintId INTEGER  |
-|------------------------+-------------------+------------------+---------------+-----------------|
-| 1                      | "My Account"      | 0                | 0             | 123456          |
-+---------------------------------------------------------------+---------------+-----------------+
-
-Table: transactions                                                                                       v4
-+-------------------------------------------------------------------------------------------------------+----------------+
-| id INTEGER PRIMARY KEY | accountId INTEGER | amount FLOAT | description VARCHAR(255) | date CHAR(10)) | linkId INTEGER |
-|------------------------+-------------------+--------------+--------------------------+----------------|----------------|
-| 1                      | 1                 | 100.00       | "Initial Balance"        | "2007/01/06"   | null           |
-+-------------------------------------------------------------------------------------------------------+----------------+
+Table: accounts                                v2                 v3                v10               v15
++-----------------------------------------------------------------+-----------------+-----------------+--------------------+
+| id INTEGER PRIMARY KEY | name VARCHAR(255) | currency INTEGER | balance INTEGER | mintId INTEGER  | fracDigits INTEGER |
+|------------------------+-------------------+------------------+-----------------+-----------------+--------------------|
+| 1                      | "My Account"      | 0                | 0               | 123456          | 2                  |
++-----------------------------------------------------------------+-----------------+-----------------+--------------------+
+
+Table: transactions                                                                                         v4
++---------------------------------------------------------------------------------------------------------+----------------+
+| id INTEGER PRIMARY KEY | accountId INTEGER | amount INTEGER | description VARCHAR(255) | date INTEGER   | linkId INTEGER |
+|------------------------+-------------------+----------------+--------------------------+----------------|----------------|
+| 1                      | 1                 | 10000          | "Initial Balance"        | 732682         | null           |
++---------------------------------------------------------------------------------------------------------+----------------+
+
+As of v15, amounts and balances are stored as integers in minor units (cents), scaled by the
+fracDigits of their account, which is the frac_digits of its currency when it was created.
+As of v16, transactions are indexed by (accountId, date), linkId and recurringParent.
+As of v17, transaction dates are stored as datetime.date ordinals (days since 0001-01-01, which is 1).
+
+Table: tags                                          Table: transactions_tags_link                                   v18
++----------------------------------------------+     +-----------------------------------------------------------------+
+| id INTEGER PRIMARY KEY | name VARCHAR(255)   |     | id INTEGER PRIMARY KEY | transactionId INTEGER | tagId INTEGER |
+|------------------------+---------------------|     |------------------------+-----------------------+---------------|
+| 1                      | "groceries"         |     | 1                      | 1                     | 1             |
++----------------------------------------------+     +-----------------------------------------------------------------+
+
+As of v18, the tags of each transaction are stored, so they load without parsing descriptions.
 """
 
 import ast
 import datetime
+import heapq
 import os
+import re
 import sys
+import time
+from collections import OrderedDict
+import numpy
 
 from sqlite3 import dbapi2 as sqlite
 import sqlite3
@@ -45,8 +64,10 @@ from wxbanker import currencies, debug
 from wxbanker.bankobjects.account import Account
 from wxbanker.bankobjects.accountlist import AccountList
 from wxbanker.bankobjects.bankmodel import BankModel
-from wxbanker.bankobjects.transaction import Transaction
+from wxbanker.bankobjects.transaction import Transaction, describeTransfer
+from wxbanker.bankobjects.tag import Tag, parseTags
 from wxbanker.bankobjects.transactionlist import TransactionList
+from wxbanker.bankobjects.transactioncolumns import TransactionColumns
 from wxbanker.bankobjects.recurringtransaction import RecurringTransaction
 from wxbanker.bankobjects.ormobject import ORMKeyValueObject
 from wxbanker.bankexceptions import MissingLinkException
@@ -56,15 +77,48 @@ class PersistentStore:
     Handles creating the Model (bankobjects) from the store and writing
     back the changes.
     """
+    # All profiles journal with WAL, so a commit is just an append to the log. They differ in how
+    # often the log is synced to disk, and how much is memory mapped (which is unsafe on I/O errors).
+    DURABILITY_PROFILES = {
+        # Never sync; the fastest, but a power loss or OS crash can corrupt the database.
+        "fast": {"synchronous": "OFF", "mmap_size": 268435456},
+        # Sync on checkpoints; crash-safe, though the last few commits can be lost on power loss.
+        "balanced": {"synchronous": "NORMAL", "mmap_size": 67108864},
+        # Sync on every commit; nothing committed is ever lost.
+        "safe": {"synchronous": "FULL", "mmap_size": 0},
+    }
+    DEFAULT_DURABILITY = "balanced"
+    # The most seconds ORM updates wait in the write-behind buffer, when nothing else writes them first (see Controller).
+    FLUSH_INTERVAL = 2.0
+    # Stores the balance of accounts as the exact sum of the minor units of their transactions.
+    BALANCE_UPDATE = 'UPDATE accounts SET balance=(SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE accountId=accounts.id)'
 
     def __init__(self, path, autoSave=True):
         self.Subscriptions = []
-        self.Version = 13
+        self.Version = 18
         self.Path = path
         self.AutoSave = False
         self.Dirty = False
         self.BatchDepth = 0
         self.cachedModel = None
+        # A cache of account IDs to the fracDigits their amounts are stored with.
+        self.fracDigits = {}
+        # A memo of stored date ordinals to their dates.
+        self.dateCache = {}
+        # The IDs of accounts whose balance changed since loading, which are the only ones to sync on exit.
+        self.changedBalances = set()
+        # Write-behind buffer of ORM updates: (table, column, keyColumn) -> {key: value}, so only the last value is written.
+        self.pendingUpdates = OrderedDict()
+        # Write-behind buffer of re-tagged transactions: {transactionId: set of tag names}.
+        self.pendingTags = OrderedDict()
+        # Write-behind buffer of the IDs of accounts whose balance changed, to store as the sum of their transactions.
+        self.pendingBalances = set()
+        # Whether the buffer has updates which the controller was asked to flush (see bufferingStarted).
+        self.flushDue = False
+        # Transactions with tags loaded since the last registerTags, to announce together rather than one at a time.
+        self.loadedTagged = []
+        self.lastFlush = time.time()
+        self.FlushStats = {"updates": 0, "coalesced": 0, "flushes": 0, "rows": 0, "statements": 0, "seconds": 0.0}
         # Upgrades can't enable syncing if needed from older versions.
         self.needsSync = False
         existed = True
@@ -76,8 +130,8 @@ class PersistentStore:
         # Initialize the connection and optimize it.
         connection = sqlite.connect(self.Path)
         self.dbconn = connection
-        # Disable synchronous I/O, which makes everything MUCH faster, at the potential cost of durability.
-        self.dbconn.execute("PRAGMA synchronous=OFF;")
+        # This must happen before anything else, as the journal mode can't be changed inside a transaction.
+        self.initDurability()
 
         # If the db doesn't exist, initialize it.
         if not existed:
@@ -93,10 +147,14 @@ class PersistentStore:
             self.upgradeDb(self.Meta['VERSION'], backup=existed)
             self.Meta = self.getMeta()
             debug.debug(self.Meta)
+
+        # The search index is derived data, so it is (re)built here as needed rather than by an upgrade.
+        self.HasSearchIndex = self.initSearchIndex()
          
         # We have to subscribe before syncing otherwise it won't get synced if there aren't other changes.
         self.Subscriptions = (
             (self.onORMObjectUpdated, "ormobject.updated"),
+            (self.onORMObjectsBulkUpdated, "ormobject.bulkupdated"),
             (self.onAccountBalanceChanged, "account.balance changed"),
             (self.onAccountRemoved, "account.removed"),
             (self.onBatchEvent, "batch"),
@@ -127,58 +185,122 @@ class PersistentStore:
         if type(currency) != int or currency < 0:
             raise Exception("Currency code must be int and >= 0")
 
-        cursor = self.dbconn.cursor()
-        cursor.execute('INSERT INTO accounts (name, currency) VALUES (?, ?)', (accountName, currency))
+        fracDigits = currencies.CurrencyList[currency]().GetFracDigits()
+        cursor = self.getCursor()
+        cursor.execute('INSERT INTO accounts (name, currency, fracDigits) VALUES (?, ?, ?)', (accountName, currency, fracDigits))
         ID = cursor.lastrowid
+        self.fracDigits[ID] = fracDigits
         self.commitIfAppropriate()
 
         account = Account(self, ID, accountName, currency)
         return account
 
     def RemoveAccount(self, account):
-        self.dbconn.cursor().execute('DELETE FROM accounts WHERE id=?',(account.ID,))
+        self.getCursor().execute('DELETE FROM accounts WHERE id=?',(account.ID,))
         self.commitIfAppropriate()
         
     def MakeRecurringTransaction(self, recurring):
-        cursor = self.dbconn.cursor()
+        cursor = self.getCursor()
         cursor.execute('INSERT INTO recurring_transactions VALUES (null, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self.recurringtransaction2result(recurring)[1:])
         self.commitIfAppropriate()
         recurring.ID = cursor.lastrowid
         return recurring
 
     def MakeTransaction(self, account, transaction):
-        cursor = self.dbconn.cursor()
-        cursor.execute('INSERT INTO transactions VALUES (null, ?, ?, ?, ?, ?, ?)', [account.ID] + transaction.toResult()[1:])
-        self.commitIfAppropriate()
+        cursor = self.getCursor()
+        cursor.execute('INSERT INTO transactions VALUES (null, ?, ?, ?, ?, ?, ?)', self.transaction2result(transaction, account)[1:])
         transaction.ID = cursor.lastrowid
+        self.insertTagLinks([(transaction.ID, self.tagNames(transaction))])
+        self.commitIfAppropriate()
         return transaction
 
+    def MakeTransactions(self, account, transactions):
+        """
+        Insert many transactions in a single SQL transaction, with the tag links of all of them
+        at once, which is MUCH faster than a MakeTransaction per row for large imports.
+        """
+        if not transactions:
+            return transactions
+
+        cursor = self.getCursor()
+        # Let SQLite pick each ID and read it back, rather than assuming which ones it would pick.
+        for transaction in transactions:
+            cursor.execute('INSERT INTO transactions VALUES (null, ?, ?, ?, ?, ?, ?)', self.transaction2result(transaction, account)[1:])
+            transaction.ID = cursor.lastrowid
+        self.insertTagLinks([(t.ID, self.tagNames(t)) for t in transactions])
+        self.commitIfAppropriate()
+        return transactions
+
     def RemoveTransaction(self, transaction):
-        ID = transaction.ID
-        result = self.dbconn.cursor().execute('DELETE FROM transactions WHERE id=?', (ID,)).fetchone()
+        return self.RemoveTransactions([transaction])
+
+    def RemoveTransactions(self, transactions):
+        """Delete many transactions, and their tag links, with a statement per chunk of IDs."""
+        cursor = self.getCursor()
+        for ids, placeholders in self.idChunks([t.ID for t in transactions]):
+            cursor.execute('DELETE FROM transactions WHERE id IN (%s)' % placeholders, ids)
+            cursor.execute('DELETE FROM transactions_tags_link WHERE transactionId IN (%s)' % placeholders, ids)
         self.commitIfAppropriate()
-        # The result doesn't appear to be useful here, it is None regardless of whether the DELETE matched anything.
         return True
+
+    def idChunks(self, ids):
+        """
+        Split IDs into chunks for "IN (...)" clauses, yielding each with its placeholders.
+        This stays well under the limit of SQL variables, which is 999 in older versions of SQLite.
+        """
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i+500]
+            yield chunk, ",".join("?" * len(chunk))
     
     def RemoveRecurringTransaction(self, recurring):
         ID = recurring.ID
-        result = self.dbconn.cursor().execute('DELETE FROM recurring_transactions WHERE id=?', (ID,))
+        result = self.getCursor().execute('DELETE FROM recurring_transactions WHERE id=?', (ID,))
         self.commitIfAppropriate()
 
     def Save(self):
-        import time; t = time.time()
+        t = time.time()
+        self.flushUpdates()
         self.dbconn.commit()
         debug.debug("Committed in %s seconds" % (time.time()-t))
         self.Dirty = False
 
     def Close(self):
+        self.flushUpdates()
         self.dbconn.close()
         for callback, topic in self.Subscriptions:
             Publisher.unsubscribe(callback)
             
+    def SetDurability(self, profile):
+        """Switch to one of the DURABILITY_PROFILES, and remember it in the meta table."""
+        self.applyDurability(profile)
+        self.getCursor().execute('UPDATE meta SET value=? WHERE name=?', (repr(profile), "Durability"))
+        self.commitIfAppropriate()
+
+    def initDurability(self):
+        # Use the stored profile if there is one; new and older databases get the default.
+        stored = self.getMeta().get("Durability")
+        profile = stored and ast.literal_eval(stored)
+        if profile not in self.DURABILITY_PROFILES:
+            profile = self.DEFAULT_DURABILITY
+
+        self.dbconn.execute("PRAGMA journal_mode=WAL;")
+        # Use an 8MB page cache, and keep temporary tables and indices in memory.
+        self.dbconn.execute("PRAGMA cache_size=-8000;")
+        self.dbconn.execute("PRAGMA temp_store=MEMORY;")
+        self.applyDurability(profile)
+
+    def applyDurability(self, profile):
+        if profile not in self.DURABILITY_PROFILES:
+            raise Exception("Unknown durability profile '%s'" % profile)
+
+        for pragma, value in self.DURABILITY_PROFILES[profile].items():
+            self.dbconn.execute("PRAGMA %s=%s;" % (pragma, value))
+        self.Durability = profile
+
     def PopulateKeyValues(self, ormkvobj):
         table = ormkvobj.ORM_TABLE
-        for result in self.dbconn.cursor().execute("SELECT * from %s" % table).fetchall():
+        for result in self.getCursor().execute("SELECT * from %s" % table).fetchall():
             autoid, key, value = result
             # eval the value since we store it repr'd. However null comes out as None, so cast to a string.
             value = ast.literal_eval(str(value))
@@ -193,12 +315,97 @@ class PersistentStore:
                 raise Exception("Cannot end a batch that has not started.")
 
             self.BatchDepth -= 1
-            # If the batching is over, perhaps we should save.
-            if self.BatchDepth == 0 and self.Dirty:
-                self.commitIfAppropriate()
+            # If the batching is over, write what it changed, and perhaps we should save.
+            if self.BatchDepth == 0:
+                self.flushUpdates()
+                if self.Dirty:
+                    self.commitIfAppropriate()
         else:
             raise Exception("Expected batch type of 'start' or 'end', got '%s'" % batchType)
 
+    def getCursor(self, reads=None):
+        """
+        Return a cursor for running SQL. Buffered ORM updates are written first, so statements see (and are
+        ordered after) them, as if they had been executed immediately. A read can name the tables and
+        "table.column"s it depends on in `reads`, and then the buffer is only written if it updates one of those.
+        """
+        if reads is None or not self.getPendingColumns().isdisjoint(reads):
+            self.flushUpdates()
+        return self.dbconn.cursor()
+
+    def getPendingColumns(self):
+        """Return the set of the tables and "table.column"s which have buffered updates."""
+        columns = set()
+        for table, column, keyColumn in self.pendingUpdates:
+            columns.update((table, "%s.%s" % (table, column)))
+        if self.pendingTags:
+            columns.update(("tags", "transactions_tags_link"))
+        if self.pendingBalances:
+            columns.update(("accounts", "accounts.balance"))
+        return columns
+
+    def bufferUpdate(self, table, column, keyColumn, key, value):
+        """Buffer an UPDATE of one column of a row, replacing any pending value for it."""
+        updates = self.pendingUpdates.setdefault((table, column, keyColumn), OrderedDict())
+        if key in updates:
+            self.FlushStats["coalesced"] += 1
+            # Move it to the end so updates are still written in the order they were last made.
+            del updates[key]
+        self.bufferingStarted()
+        updates[key] = value
+        self.FlushStats["updates"] += 1
+
+    def bufferingStarted(self):
+        # When the buffer starts filling up, the controller arranges for a flush after FLUSH_INTERVAL,
+        # so updates are written after a while even if nothing else needs them to be.
+        if not self.flushDue:
+            self.flushDue = True
+            Publisher.sendMessage("store.updates_buffered", self)
+
+    def bufferBalance(self, accountId):
+        """
+        Buffer storing the balance of an account. It is stored as the SQL sum of the minor units of its
+        transactions, rather than the float in memory, so it is exactly what the transactions add up to.
+        """
+        self.bufferingStarted()
+        self.pendingBalances.add(accountId)
+        self.changedBalances.add(accountId)
+
+    def flushUpdates(self):
+        """Write the buffered ORM updates, with an executemany per table and column."""
+        self.lastFlush = time.time()
+        self.flushDue = False
+        if not self.pendingUpdates and not self.pendingTags and not self.pendingBalances:
+            return
+
+        pending, self.pendingUpdates = self.pendingUpdates, OrderedDict()
+        cursor = self.dbconn.cursor()
+        for (table, column, keyColumn), updates in pending.items():
+            query = "UPDATE %s SET %s=? WHERE %s=?" % (table, column, keyColumn)
+            cursor.executemany(query, [(value, key) for key, value in updates.items()])
+            self.FlushStats["statements"] += 1
+            self.FlushStats["rows"] += len(updates)
+
+        if self.pendingTags:
+            pendingTags, self.pendingTags = self.pendingTags, OrderedDict()
+            # Replace the links of each re-tagged transaction.
+            cursor.executemany('DELETE FROM transactions_tags_link WHERE transactionId=?', [(tid,) for tid in pendingTags])
+            self.insertTagLinks(pendingTags.items())
+
+        if self.pendingBalances:
+            # These go last, so the sums include the amounts just written.
+            pendingBalances, self.pendingBalances = self.pendingBalances, set()
+            cursor.executemany(self.BALANCE_UPDATE + ' WHERE id=?', [(accountId,) for accountId in pendingBalances])
+        self.FlushStats["flushes"] += 1
+        self.FlushStats["seconds"] += time.time() - self.lastFlush
+        debug.debug("Flushed %i buffered updates" % sum(len(updates) for updates in pending.values()))
+
+    def GetFlushStats(self):
+        """Return counts of buffered updates, how many were coalesced away, and the flushes that wrote the rest."""
+        stats = dict(self.FlushStats)
+        stats["pending"] = sum(len(updates) for updates in self.pendingUpdates.values())
+        return stats
+
     def commitIfAppropriate(self):
         # Don't commit if there is a batch in progress.
         if self.AutoSave and not self.BatchDepth:
@@ -207,7 +414,7 @@ class PersistentStore:
             self.Dirty = True
 
     def initialize(self):
-        cursor = self.dbconn.cursor()
+        cursor = self.getCursor()
 
         cursor.execute('CREATE TABLE accounts (id INTEGER PRIMARY KEY, name VARCHAR(255), currency INTEGER)')
         cursor.execute('CREATE TABLE transactions (id INTEGER PRIMARY KEY, accountId INTEGER, amount FLOAT, description VARCHAR(255), date CHAR(10))')
@@ -217,7 +424,7 @@ class PersistentStore:
 
     def getMeta(self):
         try:
-            results = self.dbconn.cursor().execute('SELECT * FROM meta').fetchall()
+            results = self.getCursor().execute('SELECT * FROM meta').fetchall()
         except sqlite3.OperationalError:
             meta = {'VERSION': 1}
         else:
@@ -238,6 +445,8 @@ class PersistentStore:
             dest = self.Path + ".backup-v%i-%s" % (fromVer, datetime.date.today().strftime("%Y-%m-%d"))
             debug.debug("Making backup to %s" % dest)
             import shutil
+            # Move everything from the write-ahead log into the database file, so the copy is complete.
+            self.dbconn.execute("PRAGMA wal_checkpoint;")
             try:
                 shutil.copyfile(source, dest)
             except IOError:
@@ -245,7 +454,7 @@ class PersistentStore:
                 raise Exception("Unable to make backup before proceeding with database upgrade...bailing.")
 
         debug.debug('Upgrading db from %i' % fromVer)
-        cursor = self.dbconn.cursor()
+        cursor = self.getCursor()
 
         if fromVer == 1:
             # Add `currency` column to the accounts table with default value 0.
@@ -299,27 +508,428 @@ class PersistentStore:
         elif fromVer == 12:
             # globalCurrency entry
             cursor.execute('INSERT INTO meta VALUES (null, ?, ?)', ('GlobalCurrency', 0))
+        elif fromVer == 13:
+            # Durability profile entry
+            cursor.execute('INSERT INTO meta VALUES (null, ?, ?)', ('Durability', repr(self.Durability)))
+        elif fromVer == 14:
+            # Store amounts as integer minor units, so sums (in Python or SQL) are exact and don't drift.
+            self.upgradeAmountsToMinorUnits()
+        elif fromVer == 15:
+            # Dates were written as both YYYY-MM-DD (inserts) and YYYY/MM/DD (updates), which don't compare
+            # correctly as strings. Settle on the former so date ranges can be filtered in SQL.
+            cursor.execute("UPDATE transactions SET date=REPLACE(date, '/', '-')")
+            # Indexes for date ranges within an account, and for following transfers and recurring parents.
+            cursor.execute('CREATE INDEX IF NOT EXISTS transactions_accountId_date_idx ON transactions(accountId, date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS transactions_linkId_idx ON transactions(linkId)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS transactions_recurringParent_idx ON transactions(recurringParent)')
+        elif fromVer == 16:
+            # Store transaction dates as day ordinals, which load straight into dates without parsing.
+            self.upgradeDatesToOrdinals()
+        elif fromVer == 17:
+            # Tagging infrastructure, so tags load with a join instead of parsing every description on startup.
+            cursor.execute('CREATE TABLE tags (id INTEGER PRIMARY KEY, name VARCHAR(255) UNIQUE)')
+            cursor.execute('CREATE TABLE transactions_tags_link (id INTEGER PRIMARY KEY, transactionId INTEGER, tagId INTEGER)')
+            cursor.execute('CREATE INDEX transactions_tags_transactionId_idx ON transactions_tags_link(transactionId)')
+            cursor.execute('CREATE INDEX transactions_tags_tagId_idx ON transactions_tags_link(tagId)')
+            # Parse the existing descriptions this one time.
+            rows = cursor.execute('SELECT id, description FROM transactions').fetchall()
+            self.insertTagLinks([(tid, set(tag.Name for tag in parseTags(unicode(description)))) for tid, description in rows])
         else:
             raise Exception("Cannot upgrade database from version %i"%fromVer)
-        
-        """
-        # Tagging infrastructure (currently unused due to speed of parsing on startup).
-        cursor.execute('CREATE TABLE tags (id INTEGER PRIMARY KEY, name VARCHAR(255))')
-        cursor.execute('CREATE TABLE transactions_tags_link (id INTEGER PRIMARY KEY, transactionId INTEGER, tagId INTEGER)')
-        cursor.execute('CREATE INDEX transactions_tags_transactionId_idx ON transactions_tags_link(transactionId)')
-        cursor.execute('CREATE INDEX transactions_tags_tagId_idx ON transactions_tags_link(tagId)')
-        """
 
         metaVer = fromVer + 1
         cursor.execute('UPDATE meta SET value=? WHERE name=?', (metaVer, "VERSION"))
         self.commitIfAppropriate()
 
-    def syncBalances(self):
+    def upgradeAmountsToMinorUnits(self):
+        """
+        Rebuild the tables with amounts as INTEGER columns (a FLOAT column would turn them back into floats),
+        scaling each account's amounts by the frac_digits of its currency.
+        """
+        cursor = self.getCursor()
+        accountColumns = "id, name, currency, balance, mintId"
+        transactionColumns = "id, accountId, amount, description, date, linkId, recurringParent"
+        recurringColumns = "id, accountId, amount, description, date, repeatType, repeatEvery, repeatsOn, endDate, sourceId, lastTransacted"
+        for table in ("accounts", "transactions", "recurring_transactions"):
+            cursor.execute('ALTER TABLE %s RENAME TO %s_float' % (table, table))
+
+        cursor.execute('CREATE TABLE accounts (id INTEGER PRIMARY KEY, name VARCHAR(255), currency INTEGER not null DEFAULT 0, '
+                       'balance INTEGER not null DEFAULT 0, mintId INTEGER, fracDigits INTEGER not null DEFAULT 2)')
+        cursor.execute('CREATE TABLE transactions (id INTEGER PRIMARY KEY, accountId INTEGER, amount INTEGER, description VARCHAR(255), '
+                       'date CHAR(10), linkId INTEGER, recurringParent INTEGER)')
+        cursor.execute('CREATE TABLE recurring_transactions (id INTEGER PRIMARY KEY, accountId INTEGER, amount INTEGER, description VARCHAR(255), '
+                       'date CHAR(10), repeatType INTEGER, repeatEvery INTEGER, repeatsOn VARCHAR(255), endDate CHAR(10), sourceId INTEGER, lastTransacted CHAR(10))')
+
+        for accountId, currency in cursor.execute('SELECT id, currency FROM accounts_float').fetchall():
+            fracDigits = currencies.CurrencyList[currency]().GetFracDigits()
+            scale = 10 ** fracDigits
+            cursor.execute('INSERT INTO accounts (%s, fracDigits) SELECT id, name, currency, ROUND(balance * ?), mintId, ? FROM accounts_float WHERE id=?' % accountColumns, (scale, fracDigits, accountId))
+            for table, columns in (("transactions", transactionColumns), ("recurring_transactions", recurringColumns)):
+                scaledColumns = columns.replace("amount", "ROUND(amount * %i)" % scale)
+                cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s_float WHERE accountId=?' % (table, columns, scaledColumns, table), (accountId,))
+
+        for table in ("accounts", "transactions", "recurring_transactions"):
+            cursor.execute('DROP TABLE %s_float' % table)
+        cursor.execute('CREATE INDEX IF NOT EXISTS transactions_accountId_idx ON transactions(accountId)')
+
+    def upgradeDatesToOrdinals(self):
+        """Rebuild the transactions table with an INTEGER date column of datetime.date ordinals."""
+        cursor = self.dbconn.cursor()
+        cursor.execute('ALTER TABLE transactions RENAME TO transactions_str')
+        cursor.execute('CREATE TABLE transactions (id INTEGER PRIMARY KEY, accountId INTEGER, amount INTEGER, description VARCHAR(255), '
+                       'date INTEGER, linkId INTEGER, recurringParent INTEGER)')
+        # 0001-01-01, ordinal 1, is julian day 1721425.5.
+        cursor.execute('INSERT INTO transactions SELECT id, accountId, amount, description, CAST(ROUND(julianday(date) - 1721424.5) AS INTEGER), '
+                       'linkId, recurringParent FROM transactions_str')
+        cursor.execute('DROP TABLE transactions_str')
+        cursor.execute('CREATE INDEX IF NOT EXISTS transactions_accountId_idx ON transactions(accountId)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS transactions_accountId_date_idx ON transactions(accountId, date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS transactions_linkId_idx ON transactions(linkId)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS transactions_recurringParent_idx ON transactions(recurringParent)')
+
+    def tagNames(self, transaction):
+        return set(tag.Name for tag in transaction.Tags)
+
+    def insertTagLinks(self, transactionTags):
+        """Link transactions to their tags, given (transactionId, set of tag names) pairs, creating any new tags."""
+        links = [(tid, name) for tid, names in transactionTags for name in names]
+        if not links:
+            return
+
+        cursor = self.dbconn.cursor()
+        cursor.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', [(name,) for name in set(name for tid, name in links)])
+        cursor.executemany('INSERT INTO transactions_tags_link (transactionId, tagId) SELECT ?, id FROM tags WHERE name=?', links)
+
+    def getTransactionTags(self, account=None, transactionIds=None):
+        """
+        Return a map of transaction IDs to their sets of Tags, for the transactions of an account, the given
+        transactions, or otherwise all of them, with one join query. Transactions without tags are left out.
+        """
+        query = 'SELECT l.transactionId, t.id, t.name FROM transactions_tags_link l JOIN tags t ON t.id=l.tagId'
+        if account is not None:
+            queries = [(query + ' WHERE l.transactionId IN (SELECT id FROM transactions WHERE accountId=?)', (account.ID,))]
+        elif transactionIds is not None:
+            queries = [(query + ' WHERE l.transactionId IN (%s)' % placeholders, ids) for ids, placeholders in self.idChunks(transactionIds)]
+        else:
+            queries = [(query, ())]
+
+        # Share a Tag object between all the transactions with it.
+        tags = {}
+        transactionTags = {}
+        cursor = self.getCursor(reads=("tags", "transactions_tags_link"))
+        for query, args in queries:
+            for tid, tagId, name in cursor.execute(query, args):
+                tag = tags.get(tagId)
+                if tag is None:
+                    tag = tags[tagId] = Tag(name)
+                transactionTags.setdefault(tid, set()).add(tag)
+        return transactionTags
+
+    def getTaggedQuery(self, columns, rest=""):
+        return ('SELECT %s FROM transactions_tags_link l JOIN tags g ON g.id=l.tagId JOIN transactions t ON t.id=l.transactionId '
+                'WHERE g.name=?%s' % (columns, rest))
+
+    def GetTaggedTransactionIds(self, tag):
+        """Return the (transaction ID, account ID) of each transaction with the tag, in (date, id) order."""
+        query = self.getTaggedQuery('t.id, t.accountId', ' ORDER BY t.date, t.id')
+        return self.getCursor(reads=("tags", "transactions_tags_link", "transactions.date", "transactions.amount")).execute(query, (tag.Name,)).fetchall()
+
+    def GetTagTotals(self, tag):
+        """Return a map of account IDs to the [count, total] of the transactions of each account with the tag."""
+        query = self.getTaggedQuery('t.accountId, COUNT(*), SUM(t.amount)', ' GROUP BY t.accountId')
+        rows = self.getCursor(reads=("tags", "transactions_tags_link", "transactions.date", "transactions.amount")).execute(query, (tag.Name,)).fetchall()
+        return dict((accountId, [count, self.result2amount(total, accountId)]) for accountId, count, total in rows)
+
+    def GetTagDailyTotals(self, tag):
+        """Return a date ordered list of (date, accountId, count, total) for each day and account with transactions with the tag."""
+        query = self.getTaggedQuery('t.date, t.accountId, COUNT(*), SUM(t.amount)', ' GROUP BY t.date, t.accountId ORDER BY t.date')
+        rows = self.getCursor(reads=("tags", "transactions_tags_link", "transactions.date", "transactions.amount")).execute(query, (tag.Name,)).fetchall()
+        return [(self.result2date(date), accountId, count, self.result2amount(total, accountId)) for date, accountId, count, total in rows]
+
+    def GetTransactionsByIds(self, account, ids):
+        """
+        Return a map of the IDs to the transactions of an account with them, using the objects already in use
+        and fetching just the rest, rather than loading the account.
+        """
+        transactions = {}
+        missing = []
+        for tid in ids:
+            t = self.getKnownTransaction(account, tid)
+            if t is None:
+                missing.append(tid)
+            else:
+                transactions[tid] = t
+
+        cursor = self.getCursor(reads=("transactions",))
+        for chunk, placeholders in self.idChunks(missing):
+            rows = cursor.execute('SELECT * FROM transactions WHERE id IN (%s)' % placeholders, chunk).fetchall()
+            for t in self.rows2transactions(rows, [account]):
+                transactions[t.ID] = t
+        return transactions
+
+    def rows2transactions(self, rows, accounts):
+        """
+        Return the transactions of rows of the accounts, in the same order, without loading the accounts:
+        objects already in use for them are reused, and the rest are created and remembered by their account.
+        """
+        if not rows:
+            return []
+        accountsById = dict((account.ID, account) for account in accounts)
+        recurringCache = dict((recurring.ID, recurring) for recurring in accounts[0].Parent.GetRecurringTransactions())
+        tagCache = self.getTransactionTags(transactionIds=[row[0] for row in rows])
+
+        transactions = []
+        Publisher.sendMessage("batch.start")
+        for row in rows:
+            account = accountsById[row[1]]
+            # This is checked for each row, as a transfer may have made the other half of a later one.
+            t = self.getKnownTransaction(account, row[0])
+            if t is None:
+                t = self.result2transaction(row, account, recurringCache=recurringCache, tagCache=tagCache)
+            transactions.append(t)
+        self.registerTags()
+        Publisher.sendMessage("batch.end")
+        return transactions
+
+    def initSearchIndex(self):
+        """
+        Make sure the full-text index of descriptions exists and that triggers keep it in sync, returning
+        whether it is usable. It is an FTS5 trigram index, so it can find any substring like the regex
+        search does. If this SQLite lacks FTS5 or the trigram tokenizer, the triggers are dropped so they
+        don't break every write, and the index is rebuilt once it is available again.
+        """
+        cursor = self.dbconn.cursor()
+        triggers = {
+            "transactions_fts_insert": "AFTER INSERT ON transactions BEGIN "
+                "INSERT INTO transactions_fts(rowid, description) VALUES (new.id, new.description); END",
+            "transactions_fts_delete": "AFTER DELETE ON transactions BEGIN "
+                "INSERT INTO transactions_fts(transactions_fts, rowid, description) VALUES ('delete', old.id, old.description); END",
+            "transactions_fts_update": "AFTER UPDATE OF description ON transactions BEGIN "
+                "INSERT INTO transactions_fts(transactions_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+                "INSERT INTO transactions_fts(rowid, description) VALUES (new.id, new.description); END",
+        }
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(description, content='transactions', content_rowid='id', tokenize='trigram')")
+            cursor.execute("SELECT rowid FROM transactions_fts LIMIT 0")
+        except sqlite3.OperationalError:
+            debug.debug("Full-text search is unavailable, searching without an index.")
+            for name in triggers:
+                cursor.execute("DROP TRIGGER IF EXISTS %s" % name)
+            return False
+
+        existing = set(row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='trigger'"))
+        if not set(triggers).issubset(existing):
+            # Descriptions may have changed without the triggers (or the table was rebuilt), so start over.
+            for name, body in triggers.items():
+                cursor.execute("CREATE TRIGGER IF NOT EXISTS %s %s" % (name, body))
+            cursor.execute("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')")
+        return True
+
+    def SearchDescriptions(self, searchString):
+        """
+        Return the IDs of the transactions which may match a description search, or None if the index can't
+        narrow it down: without the index, or for patterns (regular expressions) or strings shorter than a trigram.
+        Callers still apply the search itself to these candidates.
+        """
+        if not self.HasSearchIndex or len(searchString) < 3 or re.search(r"[.^$*+?{}\[\]\\|()]", searchString):
+            return None
+
+        cursor = self.getCursor(reads=("transactions.description", "transactions.linkId", "transactions.amount"))
+        phrase = '"%s"' % searchString.replace('"', '""')
+        ids = set(row[0] for row in cursor.execute("SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?", (phrase,)))
+
+        # Transfers are searched with a description including the other account (see Transaction.GetDescription),
+        # as "<prefix> (<description>)". Searches can't have parentheses, so one which isn't in the description must
+        # be in the prefix and the space after it, which depends only on the other account and the direction.
+        needle = searchString.lower()
+        query = 'SELECT t.id FROM transactions o JOIN transactions t ON t.linkId=o.id WHERE o.accountId=? AND t.amount%s0'
+        for accountId, name in cursor.execute('SELECT id, name FROM accounts').fetchall():
+            for amount, comparison in ((1, ">"), (-1, "<=")):
+                if needle in (describeTransfer("", amount, name) + " ").lower():
+                    ids.update(row[0] for row in cursor.execute(query % comparison, (accountId,)))
+        return ids
+
+    def getFracDigits(self, accountId):
+        if accountId not in self.fracDigits:
+            self.fracDigits[accountId] = self.getCursor(reads=("accounts.fracDigits",)).execute('SELECT fracDigits FROM accounts WHERE id=?', (accountId,)).fetchone()[0]
+        return self.fracDigits[accountId]
+
+    def amount2result(self, amount, accountId):
+        """Convert an amount into the integer minor units it is stored as."""
+        return int(round(amount * 10 ** self.getFracDigits(accountId)))
+
+    def result2amount(self, result, accountId):
+        return result / float(10 ** self.getFracDigits(accountId))
+
+    def RoundAmount(self, amount, accountId):
+        """Round an amount to the minor units of an account, which is what it will be once stored and loaded."""
+        return self.result2amount(self.amount2result(amount, accountId), accountId)
+
+    def GetTransactionsTotal(self, account):
+        """Return the exact sum of the transactions in an account, computed by SQL."""
+        total = self.getCursor(reads=("transactions.amount",)).execute('SELECT SUM(amount) FROM transactions WHERE accountId=?', (account.ID,)).fetchone()[0]
+        return self.result2amount(total or 0, account.ID)
+
+    def date2result(self, date):
+        return date.toordinal()
+
+    def result2date(self, result):
+        """Return the date of a stored ordinal. Many rows share a date, so they are memoized."""
+        date = self.dateCache.get(result)
+        if date is None:
+            date = self.dateCache[result] = datetime.date.fromordinal(result)
+        return date
+
+    def getDateRangeClause(self, account, start, end, accounts=None):
+        """
+        Return the WHERE clause and arguments selecting the transactions of an account (or those of the
+        given accounts, or otherwise all) within start and end, inclusive.
+        """
+        conditions, args = [], []
+        if account is not None:
+            conditions.append('accountId=?')
+            args.append(account.ID)
+        elif accounts is not None:
+            conditions.append('accountId IN (%s)' % ",".join("?" * len(accounts)))
+            args.extend(a.ID for a in accounts)
+        if start is not None:
+            conditions.append('date>=?')
+            args.append(self.date2result(start))
+        if end is not None:
+            conditions.append('date<=?')
+            args.append(self.date2result(end))
+
+        clause = ""
+        if conditions:
+            clause = " WHERE " + " AND ".join(conditions)
+        return clause, args
+
+    def GetTransactionsBetween(self, account, start, end):
+        """
+        Return the transactions of an account (or all accounts, if None) dated between start and end inclusive,
+        in (date, id) order. Either bound may be None. The range is bisected from the sorted transactions of
+        accounts which are loaded, and selected with the (accountId, date) index for the rest, without loading them.
+        """
+        accounts = [account] if account is not None else list(self.GetModel().Accounts)
+        ranges = [a._Transactions.Range(start, end) for a in accounts if a._Transactions is not None]
+        unloaded = [a for a in accounts if a._Transactions is None]
+        if unloaded:
+            clause, args = self.getDateRangeClause(None, start, end, unloaded)
+            rows = self.getCursor(reads=("transactions",)).execute('SELECT * FROM transactions%s ORDER BY date, id' % clause, args).fetchall()
+            ranges.append(self.rows2transactions(rows, unloaded))
+
+        if len(ranges) == 1:
+            return ranges[0]
+        return list(heapq.merge(*ranges))
+
+    def GetBalanceBefore(self, account, date):
+        """Return the balance of an account from all of its transactions before (not on) the date."""
+        total = self.getCursor(reads=("transactions.amount", "transactions.date")).execute('SELECT SUM(amount) FROM transactions WHERE accountId=? AND date<?',
+                                             (account.ID, self.date2result(date))).fetchone()[0]
+        return self.result2amount(total or 0, account.ID)
+
+    def GetDateRange(self, account=None):
+        """Return the dates of the first and last transaction of an account (or all accounts), or None if there are none."""
+        clause, args = self.getDateRangeClause(account, None, None)
+        first, last = self.getCursor(reads=("transactions.date",)).execute('SELECT MIN(date), MAX(date) FROM transactions%s' % clause, args).fetchone()
+        if first is None:
+            return None
+        return self.result2date(first), self.result2date(last)
+
+    def GetTransactionCount(self, account):
+        return self.getCursor(reads=("transactions.accountId",)).execute('SELECT COUNT(*) FROM transactions WHERE accountId=?', (account.ID,)).fetchone()[0]
+
+    def getKeysetClause(self, key):
+        """
+        Return the condition and arguments selecting rows ordered after a (date, id) key. The redundant
+        date>= lets SQLite seek in the (accountId, date) index rather than scanning the account.
+        """
+        if key is None:
+            return "", []
+        date, tid = key
+        return ' AND date>=? AND (date>? OR id>?)', [date, date, tid]
+
+    def getTransactionRowsAfter(self, account, key, limit):
+        """Return up to `limit` transaction rows of an account ordered by (date, id), starting after the key (or the beginning)."""
+        clause, args = self.getKeysetClause(key)
+        query = 'SELECT * FROM transactions WHERE accountId=?%s ORDER BY date, id LIMIT ?' % clause
+        return self.getCursor(reads=("transactions",)).execute(query, [account.ID] + args + [limit]).fetchall()
+
+    def getTransactionKeyAfter(self, account, key, offset):
+        """Return the (date, id) key of the row `offset` rows after the key (or the beginning), or None past the end."""
+        clause, args = self.getKeysetClause(key)
+        query = 'SELECT date, id FROM transactions WHERE accountId=?%s ORDER BY date, id LIMIT 1 OFFSET ?' % clause
+        return self.getCursor(reads=("transactions.date",)).execute(query, [account.ID] + args + [offset]).fetchone()
+
+    def getTransactionIndex(self, transaction):
+        """Return the number of transactions in the parent account of a transaction before it in (date, id) order."""
+        date = self.date2result(transaction.Date)
+        query = 'SELECT COUNT(*) FROM transactions WHERE accountId=? AND date<=? AND (date<? OR id<?)'
+        return self.getCursor(reads=("transactions.date",)).execute(query, (transaction.Parent.ID, date, date, transaction.ID)).fetchone()[0]
+
+    def GetBalanceThrough(self, transaction):
+        """Return the running balance of the parent account of a transaction, up to and including it in (date, id) order."""
+        account = transaction.Parent
+        date = self.date2result(transaction.Date)
+        query = 'SELECT SUM(amount) FROM transactions WHERE accountId=? AND date<=? AND (date<? OR id<=?)'
+        total = self.getCursor(reads=("transactions.amount", "transactions.date")).execute(query, (account.ID, date, date, transaction.ID)).fetchone()[0]
+        return self.result2amount(total or 0, account.ID)
+
+    def GetDailyTotals(self, account, start=None, end=None):
+        """
+        Return a date ordered list of (date, accountId, total) for each day and account with transactions,
+        within start and end inclusive (if given), optionally for just one account.
+        """
+        clause, args = self.getDateRangeClause(account, start, end)
+        query = 'SELECT date, accountId, SUM(amount) FROM transactions%s GROUP BY date, accountId ORDER BY date' % clause
+        rows = self.getCursor(reads=("transactions.amount", "transactions.date")).execute(query, args).fetchall()
+        return [(self.result2date(date), accountId, self.result2amount(total, accountId)) for date, accountId, total in rows]
+
+    def GetTransactionColumns(self, account=None):
+        """Return the transactions of an account (or all of them) as TransactionColumns, without creating Transactions."""
+        clause, args = self.getDateRangeClause(account, None, None)
+        query = 'SELECT id, accountId, date, amount, COALESCE(linkId, 0), description FROM transactions%s ORDER BY date, id' % clause
+        rows = self.getCursor(reads=("transactions",)).execute(query, args).fetchall()
+        count = len(rows)
+        ids, accountIds, dates, amounts, linkIds = [numpy.fromiter((row[i] for row in rows), dtype=numpy.int64, count=count) for i in range(5)]
+
+        # Amounts are stored as the minor units of their account, so divide each by the scale of its account.
+        accountsPresent, accountIndexes = numpy.unique(accountIds, return_inverse=True)
+        scales = numpy.array([float(10 ** self.getFracDigits(int(accountId))) for accountId in accountsPresent])
+        amounts = amounts / scales[accountIndexes]
+
+        # Store each distinct description once.
+        descriptionIds = {}
+        descriptionIndexes = numpy.fromiter((descriptionIds.setdefault(row[5], len(descriptionIds)) for row in rows), dtype=int, count=count)
+        descriptions = sorted(descriptionIds, key=descriptionIds.get)
+        return TransactionColumns(ids, accountIds, dates, amounts, linkIds, descriptionIndexes, descriptions)
+
+    def syncBalances(self, accountIds=None):
+        """
+        Recompute the stored balances of the given account IDs (or all accounts) from their
+        transactions, in one UPDATE. Any loaded Account objects are then corrected if they differ.
+        """
         debug.debug("Syncing balances...")
-        # Load the model, necessary to sync the balances.
-        model = self.GetModel()
-        for account in model.Accounts:
-            account.Balance = sum([t.Amount for t in account.Transactions])
+        query = self.BALANCE_UPDATE
+        args = []
+        if accountIds is not None:
+            if not accountIds:
+                return
+            args = list(accountIds)
+            query += ' WHERE id IN (%s)' % ", ".join("?" * len(args))
+
+        cursor = self.getCursor()
+        cursor.execute(query, args)
+
+        if self.cachedModel is not None:
+            for account in self.cachedModel.Accounts:
+                if accountIds is None or account.ID in accountIds:
+                    balance = cursor.execute('SELECT balance FROM accounts WHERE id=?', (account.ID,)).fetchone()[0]
+                    balance = self.result2amount(balance, account.ID)
+                    if account.Balance != balance:
+                        account.Balance = balance
+
+        self.changedBalances = set()
         self.commitIfAppropriate()
             
     def recurringtransaction2result(self, recurringObj):
@@ -332,16 +942,26 @@ class PersistentStore:
         if repeatOn:
             repeatOn = ",".join((str(i) for i in repeatOn))
         sourceId = recurringObj.Source and recurringObj.Source.ID
-        result = [recurringObj.ID, recurringObj.Parent.ID, recurringObj.Amount, recurringObj.Description, dateStr]
+        amount = self.amount2result(recurringObj.Amount, recurringObj.Parent.ID)
+        result = [recurringObj.ID, recurringObj.Parent.ID, amount, recurringObj.Description, dateStr]
         result += [recurringObj.RepeatType, recurringObj.RepeatEvery, repeatOn, recurringObj.EndDate, sourceId, recurringObj.LastTransacted]
         return result
 
+    def transaction2result(self, transaction, account):
+        """Convert a transaction into a transactions row for the given account, with the amount in minor units."""
+        result = transaction.toResult()
+        result[1] = self.amount2result(result[1], account.ID)
+        result[3] = self.date2result(transaction.Date)
+        return result[:1] + [account.ID] + result[1:]
+
     def result2account(self, result):
-        ID, name, currency, balance, mintId = result
-        return Account(self, ID, name, currency, balance, mintId)
+        ID, name, currency, balance, mintId, fracDigits = result
+        self.fracDigits[ID] = fracDigits
+        return Account(self, ID, name, currency, self.result2amount(balance, ID), mintId)
     
     def result2recurringtransaction(self, result, parentAccount, allAccounts):
         rId, accountId, amount, description, date, repeatType, repeatEvery, repeatOn, endDate, sourceId, lastTransacted = result
+        amount = self.result2amount(amount, accountId)
         
         if repeatOn:
             repeatOn = [int(x) for x in repeatOn.split(",")]
@@ -358,7 +978,7 @@ class PersistentStore:
         return RecurringTransaction(rId, parentAccount, amount, description, date, repeatType, repeatEvery, repeatOn, endDate, sourceAccount, lastTransacted)
 
     def getAccountRows(self):
-        return self.dbconn.cursor().execute("SELECT * FROM accounts").fetchall()
+        return self.getCursor().execute("SELECT * FROM accounts").fetchall()
         
     def GetAccounts(self):
         # Fetch all the accounts.
@@ -374,7 +994,7 @@ class PersistentStore:
         return accounts
     
     def getRecurringTransactions(self):
-        return self.dbconn.cursor().execute('SELECT * FROM recurring_transactions').fetchall()
+        return self.getCursor().execute('SELECT * FROM recurring_transactions').fetchall()
         
     def cleanOrphanedTransactions(self):
         # Grab all the accounts that currently exist, to check against.
@@ -383,7 +1003,7 @@ class PersistentStore:
         deceasedAccounts = set()
         
         # Iterate over the transactions, treating the cursor as an iterator instead of fetchall() in case there are a lot.
-        for transactionRow in self.dbconn.cursor().execute('SELECT * FROM transactions'):
+        for transactionRow in self.getCursor().execute('SELECT * FROM transactions'):
             accountID = transactionRow[1]
             # If the account ID isn't in the current accounts, it must not exist and this transaction is an orphan, so note the parent.
             if accountID not in accountIDs:
@@ -391,13 +1011,21 @@ class PersistentStore:
                 
         # Now iterate over the deceased accounts of which to remove orphans.
         for accountID in deceasedAccounts:
-            self.dbconn.cursor().execute('DELETE FROM transactions WHERE accountId=?', (accountID,))
+            self.getCursor().execute('DELETE FROM transactions WHERE accountId=?', (accountID,))
         
         self.commitIfAppropriate()        
 
-    def result2transaction(self, result, parentObj, linkedTransaction=None, recurringCache=None):
+    def result2transaction(self, result, parentObj, linkedTransaction=None, recurringCache=None, tagCache=None):
         tid, pid, amount, description, date, linkId, recurringId = result
-        t = Transaction(tid, parentObj, amount, description, date)
+        if tagCache is None:
+            tagCache = self.getTransactionTags(transactionIds=[tid])
+        tags = tagCache.get(tid, set())
+        t = Transaction.FromStore(tid, parentObj, self.result2amount(amount, pid), description, self.result2date(date), tags)
+        if tags:
+            self.loadedTagged.append(t)
+        # If the account hasn't loaded its transactions yet, remember this object so it is used if and when they are.
+        if parentObj._Transactions is None:
+            parentObj._preTransactions[tid] = t
 
         # Handle a linked transaction being passed in, a special case called from a few lines down.
         if linkedTransaction:
@@ -415,31 +1043,108 @@ class PersistentStore:
                     # The link is gone, it's Account was likely deleted before LP: #514183/605591 was fixed. Remove it.
                     t.LinkedTransaction = None
                 else:
-                    # If the link parent hasn't loaded its transactions yet, put this in its pre list so this
-                    # object is used if and when they are loaded.
-                    if linkAccount._Transactions is None:
-                        linkAccount._preTransactions.append(link)
                     t.LinkedTransaction = link
                     # Synchronize the RecurringParent attribute.
                     t.LinkedTransaction.RecurringParent = t.RecurringParent
         return t
 
     def getTransactionsFrom(self, account):
-        transactions = TransactionList()
+        transactions = []
         # Generate a map of recurring transaction IDs to the objects for fast look-up.
         recurringCache = {}
         for recurring in account.Parent.GetRecurringTransactions():
             recurringCache[recurring.ID] = recurring
             
+        tagCache = self.getTransactionTags(account)
+
         Publisher.sendMessage("batch.start")
-        for result in self.dbconn.cursor().execute('SELECT * FROM transactions WHERE accountId=?', (account.ID,)).fetchall():
-            t = self.result2transaction(result, account, recurringCache=recurringCache)
+        for result in self.getCursor(reads=("transactions",)).execute('SELECT * FROM transactions WHERE accountId=?', (account.ID,)).fetchall():
+            # Use the object already handed out for the transaction, if there is one.
+            t = account._preTransactions.get(result[0])
+            if t is None:
+                t = self.result2transaction(result, account, recurringCache=recurringCache, tagCache=tagCache)
             transactions.append(t)
+        self.registerTags()
         Publisher.sendMessage("batch.end")
-        return transactions
+        # Sort them all at once, rather than inserting each in order.
+        return TransactionList(transactions)
+
+    def LoadTransactions(self, accounts):
+        """
+        Eagerly load the transactions of every account in `accounts` which hasn't loaded them yet,
+        using one ordered query. Links and recurring parents are resolved from an in-memory ID map,
+        instead of a query per transfer as happens when loading a single account.
+        """
+        transactionMap = {}
+        accountLists = {}
+        for account in accounts:
+            if account._Transactions is None:
+                accountLists[account.ID] = []
+                # Objects handed out before loading (see Account.AddTransaction) must be used instead of new ones.
+                transactionMap.update(account._preTransactions.items())
+            else:
+                for t in account._Transactions:
+                    transactionMap[t.ID] = t
+
+        # If everything is already loaded, there is nothing to do.
+        if not accountLists:
+            return
+
+        accountsById = dict((account.ID, account) for account in accounts)
+        recurringCache = dict((recurring.ID, recurring) for recurring in accounts.GetRecurringTransactions())
+        tagCache = self.getTransactionTags()
+        links = []
+
+        Publisher.sendMessage("batch.start")
+        for result in self.getCursor(reads=("transactions",)).execute('SELECT * FROM transactions ORDER BY date, id'):
+            tid, pid, amount, description, date, linkId, recurringId = result
+            transactions = accountLists.get(pid)
+            if transactions is None:
+                continue
+
+            t = transactionMap.get(tid)
+            if t is None:
+                tags = tagCache.get(tid)
+                t = Transaction.FromStore(tid, accountsById[pid], self.result2amount(amount, pid), description, self.result2date(date), tags or ())
+                if tags:
+                    self.loadedTagged.append(t)
+                transactionMap[tid] = t
+                # Freeze so these in-memory links aren't written back to the store.
+                t.IsFrozen = True
+                if recurringId:
+                    t.RecurringParent = recurringCache[recurringId]
+                t.IsFrozen = False
+                if linkId:
+                    links.append((t, linkId))
+            transactions.append(t)
+
+        # Now that every transaction exists, wire up the links.
+        for t, linkId in links:
+            link = transactionMap.get(linkId)
+            if link is None:
+                # The link is gone, it's Account was likely deleted before LP: #514183/605591 was fixed. Remove it.
+                t.LinkedTransaction = None
+            else:
+                t.IsFrozen = True
+                t.LinkedTransaction = link
+                t.IsFrozen = False
+
+        for account in accounts:
+            if account.ID in accountLists:
+                # The rows are already in order, so the list and its indexes are built in one pass.
+                account._Transactions = TransactionList(accountLists[account.ID])
+                account._preTransactions.clear()
+        self.registerTags()
+        Publisher.sendMessage("batch.end")
+
+    def registerTags(self):
+        """Announce the tags of the transactions loaded since the last call, in one message."""
+        if self.loadedTagged:
+            loadedTagged, self.loadedTagged = self.loadedTagged, []
+            Publisher.sendMessage("transactions.tagged", loadedTagged)
 
     def getTransactionAndParentById(self, tId, parentObj, linked):
-        result = self.dbconn.cursor().execute('SELECT * FROM transactions WHERE id=? LIMIT 1', (tId,)).fetchone()
+        result = self.getCursor(reads=("transactions",)).execute('SELECT * FROM transactions WHERE id=? LIMIT 1', (tId,)).fetchone()
         if result is None:
             # This is probably LP #514183: the account of the sibling was deleted.
             raise MissingLinkException("Unable to find the linked transaction")
@@ -453,24 +1158,50 @@ class PersistentStore:
         if linkedParent is None:
             raise Exception("Unable to find parent of LinkedTransaction")
         
-        transaction = self.result2transaction(result, linkedParent, linkedTransaction=linked)
+        # The other half may already be in use, such as when a page of this account is fetched again.
+        transaction = self.getKnownTransaction(linkedParent, tId)
+        if transaction is None:
+            transaction = self.result2transaction(result, linkedParent, linkedTransaction=linked)
         return transaction, linkedParent
 
+    def getKnownTransaction(self, account, tId):
+        """Return the object in use for the transaction of the account, loaded or handed out before, or None."""
+        if account._Transactions is None:
+            return account._preTransactions.get(tId)
+        entry = account._Transactions.byId.get(tId)
+        return entry and entry[1]
+
     def renameAccount(self, oldName, account):
-        self.dbconn.cursor().execute("UPDATE accounts SET name=? WHERE name=?", (account.Name, oldName))
+        self.getCursor().execute("UPDATE accounts SET name=? WHERE name=?", (account.Name, oldName))
         self.commitIfAppropriate()
         
     def setCurrency(self, currencyIndex, account=None):
-		if account:
-			self.dbconn.cursor().execute('UPDATE accounts SET currency=? WHERE id=?', (currencyIndex, account.ID))
-		else:
-		    # Since no account received, we are updating the global currency
-		    self.dbconn.cursor().execute('UPDATE meta SET value=? WHERE name="GlobalCurrency"', (currencyIndex,))	
-		self.commitIfAppropriate()
+        if account:
+            self.getCursor().execute('UPDATE accounts SET currency=? WHERE id=?', (currencyIndex, account.ID))
+            self.rescaleAmounts(account, currencies.CurrencyList[currencyIndex]().GetFracDigits())
+        else:
+            # Since no account received, we are updating the global currency
+            self.getCursor().execute('UPDATE meta SET value=? WHERE name="GlobalCurrency"', (currencyIndex,))
+        self.commitIfAppropriate()
+
+    def rescaleAmounts(self, account, fracDigits):
+        """
+        Store the amounts of an account with more fraction digits, such as when its currency changes.
+        This never reduces the digits, as going to a currency with fewer and back shouldn't lose anything.
+        """
+        oldDigits = self.getFracDigits(account.ID)
+        if fracDigits <= oldDigits:
+            return
+
+        factor = 10 ** (fracDigits - oldDigits)
+        cursor = self.getCursor()
+        cursor.execute('UPDATE transactions SET amount=amount*? WHERE accountId=?', (factor, account.ID))
+        cursor.execute('UPDATE recurring_transactions SET amount=amount*? WHERE accountId=?', (factor, account.ID))
+        cursor.execute('UPDATE accounts SET balance=balance*?, fracDigits=? WHERE id=?', (factor, fracDigits, account.ID))
+        self.fracDigits[account.ID] = fracDigits
 
-        
     def __print__(self):
-        cursor = self.dbconn.cursor()
+        cursor = self.getCursor()
         for account in cursor.execute("SELECT * FROM accounts").fetchall():
             print account[1]
             for trans in cursor.execute("SELECT * FROM transactions WHERE accountId=?", (account[0],)).fetchall():
@@ -486,11 +1217,12 @@ class PersistentStore:
 
     def onAccountBalanceChanged(self, message):
         account = message.data
-        self.dbconn.cursor().execute("UPDATE accounts SET balance=? WHERE id=?", (account.Balance, account.ID))
+        self.bufferBalance(account.ID)
         self.commitIfAppropriate()
 
     def onExit(self, message):
-        self.syncBalances()
+        # Only accounts which changed can be out of sync, so this doesn't depend on the size of the history.
+        self.syncBalances(self.changedBalances)
         if self.Dirty:
             Publisher.sendMessage("warning.dirty exit", message.data)
             
@@ -499,23 +1231,43 @@ class PersistentStore:
         classname, attrname = topic[-2:]
         ormobj = data
         
+        self.bufferORMUpdate(ormobj, attrname)
+        self.commitIfAppropriate()
+
+    def onORMObjectsBulkUpdated(self, message):
+        """Buffer every update of a bulk edit (see ORMObject.Bulk), and then commit just once."""
+        for (classname, attrname), ormobjs in message.data.iteritems():
+            for ormobj in ormobjs:
+                self.bufferORMUpdate(ormobj, attrname)
+        self.commitIfAppropriate()
+
+    def bufferORMUpdate(self, ormobj, attrname):
         table = ormobj.ORM_TABLE
         value = ormobj.getAttrValue(attrname)
         
         if isinstance(ormobj, ORMKeyValueObject):
-            result = self.dbconn.cursor().execute("UPDATE %s SET value=? WHERE name=?" % table, (repr(value), attrname))
+            self.bufferUpdate(table, "value", "name", attrname, repr(value))
         else:
             # Figure out the name of the column
             colname = attrname.strip("_")
             colname = colname[0].lower() + colname[1:]
             colname = {"repeatOn": "repeatsOn", "source": "sourceId", "linkedTransaction": "linkId"}.get(colname, colname)
             
-            query = "UPDATE %s SET %s=? WHERE id=?" % (table, colname)
-            objId = ormobj.ID    
-            self.dbconn.cursor().execute(query, (value, objId))
+            if colname == "amount":
+                # Amounts are stored in the minor units of their account.
+                value = self.amount2result(value, ormobj.Parent.ID)
+            elif colname == "date" and table == "transactions":
+                value = self.date2result(ormobj.Date)
+            elif colname == "description" and table == "transactions":
+                # The tags were updated before the description, so they can be stored along with it.
+                self.pendingTags[ormobj.ID] = self.tagNames(ormobj)
+
+            if colname == "balance":
+                self.bufferBalance(ormobj.ID)
+            else:
+                self.bufferUpdate(table, colname, "id", ormobj.ID, value)
             
-        self.commitIfAppropriate()
-        debug.debug("Persisting %s.%s update (%s)" % (classname, attrname, value))
+        debug.debug("Persisting %s.%s update (%s)" % (ormobj.__class__.__name__, attrname, value))
 
     def __del__(self):
         self.commitIfAppropriate()
@@ -30,6 +30,7 @@ try:
 except:
     if polyfit is None:
         raise BasePlotImportException()
+import numpy
 
 
 class BaseFactory(object):
@@ -43,37 +44,33 @@ class BaseFactory(object):
     
 class BasePlot(object):
     def getPoints(self, totals, numPoints):
-       
+        """
+        Resample the (days, balances) arrays of BankModel.GetXTotals into numPoints, each the
+        balance at the end of an equal fraction of the range.
+        """
+        days, balances = totals
         # Don't ever return 0 as the dpp, you can't graph without SOME x delta.
         smallDelta = 1.0/2**32
         
         # If there aren't any transactions, return 0 for every point and start at today.
-        if totals == []:
+        if len(days) == 0:
             return [0] * 10, datetime.date.today(), smallDelta
         
-        startDate = totals[0][0]
-        endDate = totals[-1][0]
+        startDate = datetime.date.fromordinal(int(days[0]))
 
         # Figure out the fraction of a day that exists between each point.
-        distance = (endDate - startDate).days
+        distance = int(days[-1] - days[0])
         daysPerPoint = 1.0 * distance / numPoints
-        dppDelta = datetime.timedelta(daysPerPoint)
         
-        # Generate all the points.
-        tindex = 0
-        points = [totals[0][1]]
+        # Each point is the balance of the last day on or before its end.
+        ends = days[0] + (distance * numpy.arange(1, numPoints + 1)) // numPoints
+        points = balances[numpy.searchsorted(days, ends, side="right") - 1]
 
-        for i in range(numPoints):
-            while tindex < len(totals) and totals[tindex][0] <= startDate + (dppDelta * (i+1)):
-                points[i] = totals[tindex][1]
-                tindex += 1
-            points.append(points[-1])
-
-        return points[:-1], startDate, daysPerPoint or smallDelta
+        return points.tolist(), startDate, daysPerPoint or smallDelta
     
-    def plotMonthly(self, transactions, months):
+    def plotMonthly(self, model, months):
         monthly = MonthlyAnalyzer(months)
-        earnings = monthly.GetEarnings(transactions)
+        earnings = monthly.GetStoredEarnings(model.Store)
         return earnings
     
     def plotBalance(self, totals, plotSettings, xunits):
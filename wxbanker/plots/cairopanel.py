@@ -44,8 +44,7 @@ class CairoPlotPanelMonthly(BaseCairoPlotPanel):
     def plotBalance(self, totals, plotSettings):
         self.plotSettings = plotSettings
         model = self.bankController.Model
-        transactions = model.GetTransactions()
-        earnings = baseplot.BasePlot.plotMonthly(self, transactions, plotSettings['Months'])
+        earnings = baseplot.BasePlot.plotMonthly(self, model, plotSettings['Months'])
         self.data, self.x_labels = [], []
         for month, amount in earnings:
             # Add the amount to the data.
@@ -126,9 +126,11 @@ class SummaryPanel(wx.Panel):
         self.isActive = False
 
     def generateData(self, useCache=False):
-        if useCache and self.cachedData is not None:
-            totals = self.cachedData
+        # The totals are only sampled as finely as the plot needs, so they must be for the same granularity.
+        granularity = self.plotSettings['Granularity']
+        if useCache and self.cachedData is not None and self.cachedData[0] == granularity:
+            totals = self.cachedData[1]
         else:
-            totals = self.bankController.Model.GetXTotals(self.plotSettings['Account'], daterange=self.getDateRange())
-            self.cachedData = totals
+            totals = self.bankController.Model.GetXTotals(self.plotSettings['Account'], daterange=self.getDateRange(), granularity=granularity)
+            self.cachedData = (granularity, totals)
         self.plotPanel.plotBalance(totals, self.plotSettings)
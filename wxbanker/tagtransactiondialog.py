@@ -18,6 +18,7 @@
 
 import wx
 from wxbanker.bankobjects.tag import Tag, EmptyTagException
+from wxbanker.bankobjects.transaction import Transaction
 
 class TagTransactionsPanel(wx.Panel):
     def __init__(self, parent, transactions):
@@ -90,9 +91,10 @@ class TagTransactionsPanel(wx.Panel):
         if not tag:
             return
         
-        # Apply the tag to each transaction selected.
-        for transaction in self.Transactions:
-            transaction.AddTag(tag)
+        # Apply the tag to each transaction selected, as one bulk edit.
+        with Transaction.Bulk():
+            for transaction in self.Transactions:
+                transaction.AddTag(tag)
         
             
 class TagTransactionsDialog(wx.Dialog):
@@ -60,6 +60,13 @@ class AnalyzerTests(testbase.TestCaseWithController):
         earnings = monthly.GetEarnings(self.Model.GetTransactions())
         self.assertEqual(earnings, [("2009.12", 12)])
 
+    def testMonthlyStoredAmountsMatch(self):
+        self.Model.Accounts[0].AddTransaction(amount=100, date=datetime.date(2008, 12, 31))
+        monthly = self.createMonthly(months=3)
+        earnings = monthly.GetStoredEarnings(self.Model.Store)
+        self.assertEqual(earnings, [("2009.10", 10), ("2009.11", 11), ("2009.12", 12)])
+        self.assertEqual(earnings, monthly.GetEarnings(self.Model.GetTransactions()))
+
     def testMonthlyAmountsEmpty(self):
         # With no transactions from a previous month, we should have a zero for all months to show. (LP: #623055)
         self.Model.Accounts[0].Remove()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#    https://launchpad.net/wxbanker
+#    benchmarks.py: Copyright 2007-2010 Mike Rooney <mrooney@ubuntu.com>
+#
+#    This file is part of wxBanker.
+#
+#    wxBanker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    wxBanker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Benchmarks of the persistent store, which aren't run as part of alltests.
+Usage: python -m wxbanker.tests.benchmarks
+"""
+
+from wxbanker.tests import testbase
+import datetime, os, tempfile, time
+
+from wxbanker.persistentstore import PersistentStore
+from wxbanker.bankobjects.transaction import Transaction
+from wxbanker.lib.pubsub import Publisher
+
+def timeCommits(profile, commits):
+    """Return the time in seconds of each auto-saved transaction entry, using the durability profile."""
+    path = tempfile.mkstemp()[1]
+    os.remove(path)
+    store = PersistentStore(path)
+    store.SetDurability(profile)
+    account = store.GetModel().CreateAccount("Benchmark")
+
+    times = []
+    for i in range(commits):
+        start = time.time()
+        account.AddTransaction(1, "Commit %i" % i)
+        times.append(time.time() - start)
+
+    store.Close()
+    Publisher.unsubAll()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return times
+
+def benchmarkDurability(commits=500):
+    print "Commit latency over %i auto-saved transactions:" % commits
+    print "%-10s %10s %10s %10s" % ("profile", "mean (ms)", "median", "max")
+    for profile in ("fast", "balanced", "safe"):
+        times = sorted(timeCommits(profile, commits))
+        mean = sum(times) / len(times)
+        median = times[len(times) / 2]
+        print "%-10s %10.3f %10.3f %10.3f" % (profile, mean * 1000, median * 1000, times[-1] * 1000)
+
+def benchmarkBulkEdits(count=5000):
+    """Time editing every transaction in one batch, and show how the write-behind buffer flushed them."""
+    store = PersistentStore(":memory:")
+    account = store.GetModel().CreateAccount("Benchmark")
+    transactions = [account.AddTransaction(1, "Edit") for i in range(count)]
+
+    before = store.GetFlushStats()
+    start = time.time()
+    Publisher.sendMessage("batch.start")
+    for t in transactions:
+        t.Description = "Edited #tag"
+        t.Amount = 2
+    Publisher.sendMessage("batch.end")
+    print "Edited %i transactions twice in %.3f seconds:" % (count, time.time() - start)
+    stats = store.GetFlushStats()
+    for key in sorted(stats):
+        print "%-12s %s" % (key, stats[key] - before.get(key, 0))
+
+    # Moving every transaction to another date, one message per edit and then as one bulk edit.
+    for bulk in (False, True):
+        date = transactions[0].Date + datetime.timedelta(days=bulk and 2 or 1)
+        start = time.time()
+        if bulk:
+            with Transaction.Bulk():
+                for t in transactions:
+                    t.Date = date
+        else:
+            for t in transactions:
+                t.Date = date
+        print "Redated %i transactions %s in %.3f seconds" % (count, bulk and "in bulk" or "one at a time", time.time() - start)
+
+    store.Close()
+    Publisher.unsubAll()
+
+def benchmarkLoad(count=100000):
+    """Time loading every transaction of an account, as on startup."""
+    path = tempfile.mkstemp()[1]
+    os.remove(path)
+    store = PersistentStore(path)
+    account = store.GetModel().CreateAccount("Benchmark")
+    start = datetime.date(2000, 1, 1)
+    account.AddTransactions([Transaction(None, None, 1, "Load #tag%i" % (i % 10), start + datetime.timedelta(days=i//10)) for i in range(count)])
+    store.Close()
+    Publisher.unsubAll()
+
+    begin = time.time()
+    store = PersistentStore(path)
+    model = store.GetModel()
+    model.GetTransactions()
+    print "Loaded %i transactions in %.3f seconds" % (count, time.time() - begin)
+
+    store.Close()
+    Publisher.unsubAll()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def benchmarkSearch(count=100000):
+    """Time a description search with and without the full-text index."""
+    store = PersistentStore(":memory:")
+    model = store.GetModel()
+    account = model.CreateAccount("Benchmark")
+    words = ["Groceries", "Rent", "Coffee", "Hotdog stand", "Salary"]
+    account.AddTransactions([Transaction(None, None, 1, "%s %i" % (words[i % len(words)], i), None) for i in range(count)])
+    model.GetTransactions()
+
+    search = "Coffee 424"
+    for indexed in (True, False):
+        store.HasSearchIndex = indexed
+        # Don't just refine the results of the last search.
+        model.SearchEngine.last = None
+        start = time.time()
+        matches = model.Search(search)
+        print "Searched %i transactions in %.3f seconds (indexed: %s, %i matches)" % (count, time.time() - start, indexed, len(matches))
+
+    # As when typing the search, each one refining the last.
+    model.SearchEngine.last = None
+    start = time.time()
+    for i in range(1, len(search) + 1):
+        matches = model.Search(search[:i])
+    print "Searched as typed in %.3f seconds (indexed: %s, %i matches)" % (time.time() - start, store.HasSearchIndex, len(matches))
+
+    store.Close()
+    Publisher.unsubAll()
+
+def benchmarkMove(count=10000):
+    """Time moving every transaction of an account to another, and then purging that account."""
+    store = PersistentStore(":memory:")
+    model = store.GetModel()
+    a, b = model.CreateAccount("A"), model.CreateAccount("B")
+    a.AddTransactions([Transaction(None, None, 1, "Move", None) for i in range(count)])
+
+    start = time.time()
+    a.MoveTransactions(a.Transactions[:], b)
+    print "Moved %i transactions in %.3f seconds" % (count, time.time() - start)
+    start = time.time()
+    model.RemoveAccount("B")
+    print "Purged %i transactions in %.3f seconds" % (count, time.time() - start)
+
+    store.Close()
+    Publisher.unsubAll()
+
+def main():
+    benchmarkDurability()
+    benchmarkBulkEdits()
+    benchmarkLoad()
+    benchmarkSearch()
+    benchmarkMove()
+
+if __name__ == "__main__":
+    main()
@@ -49,6 +49,21 @@ class CsvExporterTest(testbase.TestCaseWithController):
     def testExpectedOutputWithUnicode(self):
         self.assertTransactionExports(u'\u0143')
 
+    def testTransfersAreDescribed(self):
+        model = self.Model
+        a, b = model.CreateAccount("A"), model.CreateAccount("B")
+        ta, tb = a.AddTransaction(5, "Loan", "2010-5-24", source=b)
+        a.AddTransaction(2, "", "2010-5-25", source=b)
+
+        lines = CsvExporter.Generate(model).splitlines()
+        self.assertEqual(lines[1:], [
+            u"A,%s,5.0,2010-05-24" % ta.Description,
+            u"A,%s,2.0,2010-05-25" % a.Transactions[1].Description,
+            u"B,%s,-5.0,2010-05-24" % tb.Description,
+            u"B,%s,-2.0,2010-05-25" % b.Transactions[1].Description,
+        ])
+        self.assertEqual(ta.Description, u"Transfer from B (Loan)")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -19,7 +19,7 @@
 #    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
 
 from wxbanker.tests import testbase
-import unittest
+import unittest, os, tempfile
 from wxbanker import currencies, currconvert
 
 class CurrConvertTest(unittest.TestCase):
@@ -39,5 +39,35 @@ class CurrConvertTest(unittest.TestCase):
         self.assertRaises(currconvert.ConversionException, lambda: self.CC.Convert(1, "FOO", "USD"))
         self.assertRaises(currconvert.ConversionException, lambda: self.CC.Convert(1, "USD", "BAR"))
 
+    def testSharedRatesMatchConverter(self):
+        for original, destination in (("EUR", "USD"), ("USD", "EUR"), ("USD", "GBP"), ("JPY", "JPY")):
+            self.assertAlmostEqual(currconvert.Convert(100, original, destination), self.CC.Convert(100, original, destination))
+        self.assertRaises(currconvert.ConversionException, currconvert.Convert, 1, "FOO", "USD")
+
+    def testConvertMany(self):
+        amounts = [1, 2, 3, 4]
+        originals = ["USD", "EUR", "USD", "JPY"]
+        converted = currconvert.ConvertMany(amounts, originals, "EUR")
+        expected = [self.CC.Convert(amount, original, "EUR") for amount, original in zip(amounts, originals)]
+        for c, e in zip(converted, expected):
+            self.assertAlmostEqual(c, e)
+        self.assertEqual(len(currconvert.ConvertMany([], [], "EUR")), 0)
+
+    def testRatesAreReloadedWhenModified(self):
+        path = tempfile.mkstemp()[1]
+        xml = '<gesmes:Envelope xmlns:gesmes="a" xmlns="b"><Cube><Cube time="2010-01-01"><Cube currency="USD" rate="%s"/></Cube></Cube></gesmes:Envelope>'
+        try:
+            open(path, "w").write(xml % 2)
+            rates = currconvert.ExchangeRates(path)
+            rates.CHECK_INTERVAL = 0
+            self.assertEqual(rates.GetFactor("EUR", "USD"), 2)
+            self.assertEqual(rates.GetFactor("USD", "EUR"), 0.5)
+
+            open(path, "w").write(xml % 4)
+            os.utime(path, (0, 0))
+            self.assertEqual(rates.GetFactor("EUR", "USD"), 4)
+        finally:
+            os.remove(path)
+
 if __name__ == "__main__":
     unittest.main()
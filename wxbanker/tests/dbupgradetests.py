@@ -64,6 +64,13 @@ class DBUpgradeTest(testbase.TestCaseHandlingConfig):
     def testUpgradeFrom05(self):
         c = self.doBaseTest("0.5")
         
+    def testUpgradeConvertsDates(self):
+        # This db has dates stored as both YYYY-MM-DD and YYYY/MM/DD, which must both become ordinals.
+        c = self.doBaseTest("0.5")
+        dates = c.Model.Store.dbconn.execute("SELECT date FROM transactions").fetchall()
+        self.assertEqual([d for (d,) in dates if not isinstance(d, int)], [])
+        self.assertEqual(min(dates)[0], datetime.date(2009, 12, 13).toordinal())
+        
     def testUpgradeFrom06Broken(self):
         # Test we can upgrade/run if LP #514183 has already occurred.
         c = self.getController("0.6-broken")
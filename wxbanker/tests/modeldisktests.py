@@ -30,7 +30,7 @@ from wxbanker.lib.pubsub import Publisher
 class ModelDiskTests(testbase.TestCaseWithControllerOnDisk):
     """
     These are tests which require an actual database on disk.
-    Thankfully using PRAGMA synchronous=off makes these still very quick.
+    Thankfully WAL journaling keeps commits cheap, so these are still very quick.
     """
     def testAutoSaveDisabledSimple(self):
         self.Controller.AutoSave = False
@@ -123,6 +123,33 @@ class ModelDiskTests(testbase.TestCaseWithControllerOnDisk):
         model1.CreateAccount("foo")
         self.assertNotEqual(model1, model2)
 
+    def testDurabilityIsStored(self):
+        self.assertEqual(self.Controller.Durability, "balanced")
+        # This is how the Settings menu changes it.
+        Publisher.sendMessage("user.durability_changed", "safe")
+        self.assertEqual(self.Model.Store.Durability, "safe")
+
+        model2 = self.Controller.LoadPath("test.db")
+        self.assertEqual(model2.Store.Durability, "safe")
+        journalMode = model2.Store.dbconn.execute("PRAGMA journal_mode;").fetchone()[0]
+        self.assertEqual(journalMode, "wal")
+        synchronous = model2.Store.dbconn.execute("PRAGMA synchronous;").fetchone()[0]
+        # FULL is 2.
+        self.assertEqual(synchronous, 2)
+
+    def testSearchIndexIsRebuilt(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(1, "Cat")
+        store = self.Model.Store
+        # Change a description while the index isn't being kept in sync, as if by a SQLite without FTS5.
+        store.dbconn.execute("DROP TRIGGER transactions_fts_update")
+        store.dbconn.execute("UPDATE transactions SET description='Dog'")
+        store.Save()
+
+        model2 = self.Controller.LoadPath("test.db")
+        self.assertEqual(model2.Store.SearchDescriptions("Dog"), set([t.ID]))
+        self.assertEqual(model2.Store.SearchDescriptions("Cat"), set())
+
     def testRenameIsStored(self):
         model1 = self.Controller.Model
         a = model1.CreateAccount("A")
@@ -318,6 +345,36 @@ class ModelDiskTests(testbase.TestCaseWithControllerOnDisk):
         # Here is the real trick. These instances should be the same or it isn't QUITE the real link.
         self.assertTrue(link is b.Transactions[0])
         
+    def testEagerLoadLinksTransfers(self):
+        a, b, atrans, btrans = self.createLinkedTransfers()
+        c = self.Model.CreateAccount("C")
+        c.AddTransaction(5)
+
+        # Load everything at once from disk, and make sure the links are the real objects.
+        model2 = self.Model.Store.GetModel(useCached=False)
+        a, b, c = model2.Accounts
+        self.assertEqual(len(model2.GetTransactions()), 3)
+
+        link = a.Transactions[0].LinkedTransaction
+        self.assertTrue(link is b.Transactions[0])
+        self.assertTrue(link.LinkedTransaction is a.Transactions[0])
+        self.assertEqual(c.Transactions[0].Amount, 5)
+        self.assertEqual(model2, self.Model)
+
+    def testEagerLoadUsesPartiallyLoadedAccounts(self):
+        self.createLinkedTransfers()
+
+        # Load one account the lazy way, then the rest eagerly.
+        model2 = self.Model.Store.GetModel(useCached=False)
+        a, b = model2.Accounts
+        btrans = b.Transactions[0]
+        self.assertEqual(a._Transactions, None)
+
+        model2.GetTransactions()
+        self.assertTrue(a.Transactions[0] is btrans.LinkedTransaction)
+        self.assertTrue(a.Transactions[0].LinkedTransaction is btrans)
+        self.assertEqual(len(a._preTransactions), 0)
+
     def testTransferDescriptionSetsCorrectly(self):
         a, b, atrans, btrans = self.createLinkedTransfers()
         
@@ -440,6 +497,31 @@ class ModelDiskTests(testbase.TestCaseWithControllerOnDisk):
         self.assertEqual(t2.Tags, set([Tag("foo")]))
         self.assertEqual(model2.Tags, set([Tag("foo")]))
         
+    def testRetaggingIsStored(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(amount=1, description="testing #foo #bar")
+        t2 = a.AddTransaction(amount=2, description="#bar")
+        t.Description = "testing #baz #bar"
+        t2.Remove()
+
+        model2 = self.Model.Store.GetModel(useCached=False)
+        self.assertEqual(model2.Accounts[0].Transactions[0].Tags, set([Tag("baz"), Tag("bar")]))
+        self.assertEqual(model2.Tags, set([Tag("baz"), Tag("bar")]))
+
+    def testTagsArePopulatedOnUpgrade(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(amount=1, description="testing #foo")
+        # Go back to before tags were stored.
+        store = self.Model.Store
+        store.dbconn.execute("DROP TABLE tags")
+        store.dbconn.execute("DROP TABLE transactions_tags_link")
+        store.dbconn.execute("UPDATE meta SET value=17 WHERE name='VERSION'")
+        store.Save()
+
+        model2 = self.Controller.LoadPath("test.db")
+        self.assertEqual(model2.Store.getTransactionTags(), {t.ID: set([Tag("foo")])})
+        self.assertEqual(model2.Accounts[0].Transactions[0].Tags, set([Tag("foo")]))
+
     def testDeletedRecurringTransactionIsStored(self):
         model1 = self.Controller.Model
         a = model1.CreateAccount("A")
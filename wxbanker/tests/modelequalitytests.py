@@ -20,6 +20,7 @@
 
 from wxbanker.tests import testbase
 from wxbanker.bankobjects.transaction import Transaction
+from wxbanker.bankobjects.tag import Tag
 import unittest
 
 class ModelEqualityTest(testbase.TestCaseWithController):
@@ -79,7 +80,7 @@ class ModelEqualityTest(testbase.TestCaseWithController):
         model2 = self.Controller.LoadPath(":memory:")
         
         self.assertEqual(model1, model2)
-        model2._Tags = {"foo": 1}
+        model2.TagIndex.ids = {Tag("foo"): set([1])}
         self.assertNotEqual(model1, model2)
         
     def testTransactionTagEquality(self):
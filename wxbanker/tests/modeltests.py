@@ -23,6 +23,9 @@ import os, datetime, unittest
 from wxbanker import controller, bankexceptions, currencies
 from wxbanker.lib.pubsub import Publisher
 from wxbanker.bankobjects.account import Account
+from wxbanker.bankobjects.transaction import Transaction
+from wxbanker.bankobjects.ormobject import ORMObject
+from wxbanker.bankobjects.recurringtransaction import RecurringTransaction
 
 from wxbanker.mint import api as mintapi
 
@@ -189,7 +192,7 @@ class ModelTests(testbase.TestCaseWithController):
         model = self.Controller.Model
 
         self.assertEqual(len(model.Accounts), 2)
-        self.assertEqual(model.GetTransactions(), [atrans, btrans])
+        self.assertEqual(model.GetTransactions(), sorted([atrans, btrans]))
         self.assertEqual(model.Balance, 0)
         self.assertEqual(len(a.Transactions), 1)
         self.assertEqual(len(b.Transactions), 1)
@@ -273,6 +276,63 @@ class ModelTests(testbase.TestCaseWithController):
         t.Amount = 2
         self.assertEqual(a.Balance, 2)
         
+    def testBalanceIsUpdatedOnlyForTheAmountDifference(self):
+        model = self.Controller.Model
+        a, b, c = model.CreateAccount("A"), model.CreateAccount("B"), model.CreateAccount("C")
+        t = a.AddTransaction(1)
+        ta, tb = a.AddTransaction(5, source=b)
+        c.AddTransaction(3)
+        # The balance is adjusted rather than summed, so it doesn't even need the transactions loaded.
+        ta.Amount = 7
+        t.Amount = 1
+        self.assertEqual((a.Balance, b.Balance, c.Balance), (8, -7, 3))
+        self.assertEqual(a._Transactions, None)
+
+        rt = c.AddRecurringTransaction(10, "recurring", today, RecurringTransaction.DAILY)
+        rt.Amount = 20
+        self.assertEqual(c.Balance, 3)
+
+    def testMixedCurrencyTotals(self):
+        model = self.Controller.Model
+        a, b, c = model.CreateAccount("A"), model.CreateAccount("B"), model.CreateAccount("C")
+        a.Currency, b.Currency, c.Currency = 1, 2, 1
+        a.AddTransaction(10, date=yesterday)
+        b.AddTransaction(20, date=today)
+        c.AddTransaction(30, date=today)
+
+        model.GlobalCurrency = 2
+        expected = a.GetBalance(2) + b.GetBalance(2) + c.GetBalance(2)
+        self.assertAlmostEqual(model.Balance, expected)
+        self.assertNotAlmostEqual(model.Balance, 60)
+        days, balances = model.GetXTotals()
+        self.assertAlmostEqual(balances[0], a.GetBalance(2))
+        self.assertAlmostEqual(balances[-1], expected)
+
+    def testAllTransactionsAreMergedAndCached(self):
+        model = self.Controller.Model
+        a, b = model.CreateAccount("A"), model.CreateAccount("B")
+        a.AddTransaction(1, date=today)
+        b.AddTransaction(2, date=yesterday)
+        t = a.AddTransaction(3, date=tomorrow)
+        a.AddTransaction(4, date=yesterday)
+
+        assertMerged = lambda: self.assertEqual(model.GetTransactions(), sorted(a.Transactions + b.Transactions))
+        assertMerged()
+        merged = model.mergedTransactions
+        # Asking again doesn't merge again, and returns a copy which can be changed safely.
+        model.GetTransactions().pop()
+        self.assertTrue(model.mergedTransactions is merged)
+        assertMerged()
+
+        t.Date = yesterday - datetime.timedelta(days=1)
+        assertMerged()
+        b.AddTransaction(5, date=today)
+        assertMerged()
+        a.RemoveTransaction(t)
+        assertMerged()
+        model.RemoveAccount("B")
+        self.assertEqual(model.GetTransactions(), a.Transactions)
+
     def testModelBalance(self):
         model = self.Controller.Model
         self.assertEqual(model.Balance, 0)
@@ -549,8 +609,285 @@ class ModelTests(testbase.TestCaseWithController):
             self.assertEqual(account.Currency, currencies.CurrencyList[0]())
             self.assertEqual(account.Balance, 0.0)
             self.assertTrue(type(account.Balance) is float)
-                
- 
-        
+
+    def testAddTransactionsInBulk(self):
+        a = self.Model.CreateAccount("A")
+        announced = []
+        def listener(message):
+            announced.append(message.data)
+        Publisher.subscribe(listener, "transactions.created")
+
+        transactions = [Transaction(None, None, i, "Bulk %i" % i, today) for i in range(1, 4)]
+        a.AddTransactions(transactions)
+
+        # A single aggregated message should be sent, and the balance updated.
+        self.assertEqual(announced, [(a, transactions)])
+        self.assertEqual(a.Balance, 6)
+        self.assertEqual([t.Parent for t in transactions], [a, a, a])
+        self.assertEqual(a.Transactions, transactions)
+
+        # The IDs should be assigned and match what was stored.
+        model2 = self.Model.Store.GetModel(useCached=False)
+        self.assertEqual(model2.Accounts[0].Transactions, transactions)
+        self.assertEqual(model2.Accounts[0].Balance, 6)
+
+    def testBulkUpdatesArePublishedTogether(self):
+        a = self.Model.CreateAccount("A")
+        t1 = a.AddTransaction(1, "One", yesterday)
+        t2 = a.AddTransaction(2, "Two", today)
+        t3 = a.AddTransaction(3, "Three", tomorrow)
+        self.assertEqual(self.Model.GetTransactions(), [t1, t2, t3])
+
+        updated, bulkUpdated = [], []
+        def onUpdated(message):
+            updated.append(message.data)
+        def onBulkUpdated(message):
+            bulkUpdated.append(message.data)
+        Publisher.subscribe(onUpdated, "ormobject.updated.Transaction")
+        Publisher.subscribe(onBulkUpdated, "ormobject.bulkupdated")
+
+        later = tomorrow + datetime.timedelta(days=1)
+        with Transaction.Bulk():
+            t1.Date = later
+            with Transaction.Bulk():
+                t2.Amount = 5
+                t1.Amount = 4
+            t2.Date = later
+            t1.Date = later
+            # Nothing is published until the outermost one exits.
+            self.assertEqual(bulkUpdated, [])
+
+        self.assertEqual(updated, [])
+        self.assertEqual(bulkUpdated, [{("Transaction", "Date"): [t1, t2], ("Transaction", "Amount"): [t2, t1]}])
+        self.assertEqual(bulkUpdated[0].keys(), [("Transaction", "Date"), ("Transaction", "Amount")])
+
+        # The accounts, model and store all handled it.
+        self.assertEqual(a.Transactions, [t3, t1, t2])
+        self.assertEqual(self.Model.GetTransactions(), [t3, t1, t2])
+        self.assertEqual(a.Balance, 12)
+        model2 = self.Model.Store.GetModel(useCached=False)
+        self.assertEqual(model2.Accounts[0].Transactions, [t3, t1, t2])
+
+        # Updates outside of a bulk edit are published as usual.
+        t3.Amount = 6
+        self.assertEqual(updated, [t3])
+
+    def testBulkOfTheBaseClassIsPublished(self):
+        a = self.Model.CreateAccount("A")
+        t1 = a.AddTransaction(1, "One", yesterday)
+        t2 = a.AddTransaction(2, "Two", today)
+
+        updated, bulkUpdated = [], []
+        def onUpdated(message):
+            updated.append(message.data)
+        def onBulkUpdated(message):
+            bulkUpdated.append(message.data)
+        Publisher.subscribe(onUpdated, "ormobject.updated.Transaction")
+        Publisher.subscribe(onBulkUpdated, "ormobject.bulkupdated")
+
+        # ORMObject has a bulkUpdates of its own, which shouldn't make this look nested.
+        with ORMObject.Bulk():
+            t1.Amount = 3
+            # A bulk of a subclass inside it publishes on its own, but only for that subclass.
+            with Transaction.Bulk():
+                t2.Amount = 4
+            a.Name = "B"
+            self.assertEqual(len(bulkUpdated), 1)
+
+        self.assertEqual(updated, [])
+        self.assertEqual(bulkUpdated, [{("Transaction", "Amount"): [t2]}, {("Transaction", "Amount"): [t1], ("Account", "Balance"): [a], ("Account", "Name"): [a]}])
+        self.assertEqual(ORMObject.bulkUpdates, None)
+        self.assertFalse("bulkUpdates" in Transaction.__dict__)
+
+        # The changes all made it to the store.
+        model2 = self.Model.Store.GetModel(useCached=False)
+        self.assertEqual(model2.Accounts[0].Name, "B")
+        self.assertEqual(model2.Accounts[0].Balance, 7)
+
+        # And afterwards updates are published one by one again.
+        t1.Amount = 5
+        self.assertEqual(updated, [t1])
+
+    def testAddTransactionsInBulkWithSources(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+
+        transactions = [Transaction(None, None, 1, "First", today), Transaction(None, None, 2, "Second", today)]
+        a.AddTransactions(transactions, [b, None])
+
+        self.assertEqual(a.Balance, 3)
+        self.assertEqual(b.Balance, -1)
+        btrans = b.Transactions[0]
+        self.assertEqual(btrans.LinkedTransaction, transactions[0])
+        self.assertEqual(transactions[0].LinkedTransaction, btrans)
+        self.assertEqual(transactions[1].LinkedTransaction, None)
+
+        model2 = self.Model.Store.GetModel(useCached=False)
+        self.assertEqual(model2, self.Model)
+
+    def createUnloadedAccount(self, count):
+        a = self.Model.CreateAccount("A")
+        # Add them in reverse date order, with some sharing a date, so the order by (date, id) is tested.
+        a.AddTransactions([Transaction(None, None, i, "T%i" % i, today - datetime.timedelta(days=i // 2)) for i in range(count)])
+        return self.Model.Store.GetModel(useCached=False).Accounts[0]
+
+    def testPagedTransactionsMatchLoaded(self):
+        a = self.createUnloadedAccount(23)
+        paged = a.GetPagedTransactions(pageSize=5, maxPages=2)
+        self.assertEqual(len(paged), 23)
+        self.assertEqual(a._Transactions, None)
+
+        expected = sorted(self.Model.Accounts[0].Transactions)
+        self.assertEqual(list(paged), expected)
+        self.assertEqual(paged[12], expected[12])
+        self.assertEqual(paged[-1], expected[-1])
+        self.assertEqual(paged[3:14:2], expected[3:14:2])
+        self.assertRaises(IndexError, lambda: paged[23])
+        self.assertEqual(paged.index(paged[17]), 17)
+        # Only the most recently used pages are kept, and the account was never loaded.
+        self.assertEqual(len(paged.pages), 2)
+        self.assertEqual(a._Transactions, None)
+
+    def testPagedTransactionsRandomAccess(self):
+        a = self.createUnloadedAccount(23)
+        expected = sorted(self.Model.Accounts[0].Transactions)
+        # Jumping straight to a later page must find its start without reading the ones before.
+        paged = a.GetPagedTransactions(pageSize=5)
+        self.assertEqual(paged[21], expected[21])
+        self.assertEqual(paged[7], expected[7])
+        self.assertEqual(paged.pages.keys(), [4, 1])
+
+    def testPagedTransactionsAreUpdated(self):
+        a = self.createUnloadedAccount(10)
+        paged = a.GetPagedTransactions(pageSize=4)
+        self.assertEqual(len(paged), 10)
+        t = a.AddTransaction(100, date=tomorrow)
+        self.assertEqual(len(paged), 11)
+        self.assertTrue(paged[-1] is t)
+        self.assertEqual(a.Store.GetBalanceThrough(t), a.Balance)
+
+        # Once the account is loaded, the same objects are used.
+        a.Transactions
+        self.assertEqual(list(paged), sorted(a.Transactions))
+
+    def testPagedTransfersKeepTheirIdentity(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+        for i in range(5):
+            a.AddTransaction(1, "T%i" % i, source=b)
+        a, b = self.Model.Store.GetModel(useCached=False).Accounts
+
+        # Fetching a page again uses the same objects, and the other halves are only remembered once.
+        paged = a.GetPagedTransactions(pageSize=5)
+        page = list(paged)
+        paged.Invalidate()
+        self.assertTrue(all(t is u for t, u in zip(page, paged)))
+        self.assertEqual(len(b._preTransactions), 5)
+
+        # Once both accounts load, the page objects and their links are their transactions.
+        link = page[0].LinkedTransaction
+        self.assertTrue(any(t is link for t in b.Transactions))
+        self.assertTrue(any(t is page[0] for t in a.Transactions))
+        link.Amount = 100
+        self.assertEqual(page[0].Amount, -100)
+        self.assertEqual(a.Balance, sum(t.Amount for t in a.Transactions))
+
+    def testTransactionsAreKeptSorted(self):
+        a = self.createUnloadedAccount(9)
+        transactions = a.Transactions
+        self.assertEqual(list(transactions), sorted(transactions))
+
+        # New transactions are inserted in place.
+        t = a.AddTransaction(1, date=today - datetime.timedelta(days=2))
+        a.AddTransactions([Transaction(None, None, 1, "", today - datetime.timedelta(days=i)) for i in (1, 9)])
+        self.assertEqual(list(transactions), sorted(transactions))
+
+        # As are those whose date changes.
+        t.Date = today + datetime.timedelta(days=5)
+        self.assertEqual(list(transactions), sorted(transactions))
+        self.assertTrue(transactions.Last() is t)
+        self.assertEqual(transactions.First().Date, today - datetime.timedelta(days=9))
+        self.assertTrue(t in transactions)
+        a.RemoveTransaction(t)
+        self.assertFalse(t in transactions)
+
+    def testBulkChangesAreMadeInPlaceOrRebuilt(self):
+        a = self.createUnloadedAccount(70)
+        transactions = a.Transactions
+        # Two transactions are few enough to remove and reposition in place, twenty are enough to rebuild.
+        for count in (2, 20):
+            moved = list(transactions)[10:10 + count // 2] + list(transactions)[40:40 + count // 2]
+            with Transaction.Bulk():
+                for i, t in enumerate(moved):
+                    t.Date = today + datetime.timedelta(days=i % 3)
+            self.assertEqual(list(transactions), sorted(transactions, key=lambda t: (t.Date, t.ID)))
+            self.assertEqual(transactions.keys, [(t.Date, t.ID) for t in transactions])
+
+            removed = list(transactions)[5:5 + count // 2] + list(transactions)[50:50 + count // 2]
+            a.RemoveTransactions(removed)
+            self.assertTrue(not any(t in transactions for t in removed))
+            self.assertEqual(transactions.keys, [(t.Date, t.ID) for t in transactions])
+            self.assertEqual(transactions.GetBalanceAt(today + datetime.timedelta(days=3)), sum(t.Amount for t in transactions))
+
+    def testTransactionsRange(self):
+        a = self.createUnloadedAccount(9)
+        transactions = a.Transactions
+        start, end = today - datetime.timedelta(days=3), today - datetime.timedelta(days=1)
+        expected = [t for t in transactions if start <= t.Date <= end]
+        self.assertEqual(len(expected), 6)
+        self.assertEqual(transactions.Range(start, end), expected)
+        self.assertEqual(transactions.Range(), list(transactions))
+        self.assertEqual(transactions.Range(end=start), [t for t in transactions if t.Date <= start])
+        self.assertEqual(transactions.Range(start=today + datetime.timedelta(days=1)), [])
+
+    def testBalancesAreIndexed(self):
+        a = self.createUnloadedAccount(9)
+        days = [today + datetime.timedelta(days=i) for i in range(-6, 3)]
+        self.assertEqual([a.GetBalanceAt(day) for day in days], [0, 0, 8, 8+7+6, 21+5+4, 30+3+2, 36, 36, 36])
+
+        def assertBalances():
+            transactions = a.Transactions
+            for day in days:
+                self.assertEqual(a.GetBalanceAt(day), sum(t.Amount for t in transactions if t.Date <= day))
+            for i in range(len(transactions)):
+                self.assertEqual(transactions.GetBalanceThrough(i), sum(t.Amount for t in transactions[:i+1]))
+            self.assertEqual(a.GetCurrentBalance(), sum(t.Amount for t in transactions if t.Date <= today))
+
+        assertBalances()
+        future = a.AddTransaction(10, "Future", today + datetime.timedelta(days=1))
+        a.AddTransaction(20, "Past", today - datetime.timedelta(days=30))
+        assertBalances()
+        a.Transactions[3].Amount = 100
+        assertBalances()
+        a.Transactions[-2].Date = today - datetime.timedelta(days=40)
+        assertBalances()
+        a.RemoveTransactions([future, a.Transactions[4]])
+        assertBalances()
+
+    def testBulkMoveAndPurge(self):
+        model = self.Model
+        a, b, c = model.CreateAccount("A"), model.CreateAccount("B"), model.CreateAccount("C")
+        a.AddTransactions([Transaction(None, None, i, "T%i" % i, None) for i in range(20)])
+        ta, tc = a.AddTransaction(5, "Transfer", source=c)
+        countRows = lambda: model.Store.dbconn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        self.assertEqual(countRows(), 22)
+
+        moving = a.Transactions[5:]
+        a.MoveTransactions(moving, b)
+        self.assertEqual(len(a.Transactions), 5)
+        self.assertEqual(len(b.Transactions), 16)
+        self.assertEqual((a.Balance, b.Balance, c.Balance), (10, sum(range(5, 20)) + 5, -5))
+        # The transfer moved with its other half still in C.
+        self.assertEqual(b.Transactions.Last().LinkedTransaction.Parent, c)
+        self.assertEqual(countRows(), 22)
+
+        # A transaction not in the account is refused before anything is removed.
+        self.assertRaises(bankexceptions.InvalidTransactionException, a.RemoveTransactions, a.Transactions[:2] + [moving[0]])
+        self.assertEqual(len(a.Transactions), 5)
+
+        model.RemoveAccount("B")
+        self.assertEqual(countRows(), 6)
+        self.assertEqual(model.Store.GetModel(useCached=False), model)
+
 if __name__ == "__main__":
     unittest.main()
@@ -250,6 +250,39 @@ class RecurringTest(testbase.TestCaseWithController):
         self.assertEqual(rt.GetUntransactedDates(), [])
         self.assertEqual(rt.GetNext(), tomorrow)
         
+    def testRecurrenceIsCached(self):
+        model, account = self.createAccount()
+        start = today - datetime.timedelta(days=4)
+        rt = account.AddRecurringTransaction(1, "test", start, RecurringTransaction.DAILY)
+        rule = rt.GetRRule()
+        self.assertTrue(rt.GetRRule() is rule)
+        self.assertLength(rt.GetUntransactedDates(), 5)
+        self.assertEqual(rt.dueMemo[1], rt.GetUntransactedDates())
+
+        # Changing the recurrence (through the ORM) or the last transacted date discards what is cached.
+        rt.RepeatEvery = 2
+        self.assertEqual(rt.ruleCache, None)
+        self.assertFalse(rt.GetRRule() is rule)
+        self.assertEqual(rt.GetUntransactedDates(), [start, start + datetime.timedelta(days=2), today])
+        rt.LastTransacted = yesterday
+        self.assertEqual(rt.dueMemo, None)
+        self.assertEqual(rt.GetUntransactedDates(), [today])
+        rt.Date = start + datetime.timedelta(days=1)
+        self.assertEqual((rt.ruleCache, rt.dueMemo), (None, None))
+        self.assertEqual(rt.GetUntransactedDates(), [])
+        rt.EndDate = yesterday
+        self.assertEqual((rt.ruleCache, rt.dueMemo), (None, None))
+        rt.Date, rt.EndDate = start, None
+
+        # A change which isn't published, such as to RepeatOn in place, is caught by the key.
+        rt.RepeatType = RecurringTransaction.WEEKLY
+        rt.RepeatEvery = 1
+        rt.RepeatOn = [0] * 7
+        rt.GetRRule()
+        rt.RepeatOn[today.weekday()] = 1
+        self.assertEqual(rt.GetUntransactedDates(), [today])
+        self.assertEqual(rt.GetNext(), today)
+
     def testRecurringTransactionLinkIsNoneOnNormalTransaction(self):
         model, account = self.createAccount()
         t = account.AddTransaction(1)
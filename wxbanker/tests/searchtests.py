@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#    https://launchpad.net/wxbanker
+#    searchtests.py: Copyright 2007-2010 Mike Rooney <mrooney@ubuntu.com>
+#
+#    This file is part of wxBanker.
+#
+#    wxBanker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    wxBanker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
+
+from wxbanker.tests import testbase
+import unittest, datetime, gc, weakref
+from wxbanker.bankobjects.transaction import Transaction
+from wxbanker.tests.testbase import today, yesterday, tomorrow
+
+class SearchTests(testbase.TestCaseWithController):
+    def setUp(self):
+        testbase.TestCaseWithController.setUp(self)
+        self.a = self.Model.CreateAccount("A")
+        self.b = self.Model.CreateAccount("B")
+        self.coffee = self.a.AddTransaction(-3.5, "Coffee #food", yesterday)
+        self.groceries = self.a.AddTransaction(-40, "Groceries #food #home", today)
+        self.salary = self.b.AddTransaction(1000, "Salary", tomorrow)
+
+    def testTextSearches(self):
+        search = self.Model.Search
+        self.assertEqual(search("coff"), [self.coffee])
+        self.assertEqual(search("FOOD"), [self.coffee, self.groceries])
+        self.assertEqual(search("^(c|s)"), [self.coffee, self.salary])
+        self.assertEqual(search("1000", matchIndex=0), [self.salary])
+        self.assertEqual(search(str(today), matchIndex=2), [self.groceries])
+        self.assertEqual(search("food", account=self.b), [])
+
+    def testTypedSearches(self):
+        search = self.Model.Search
+        self.assertEqual(search("#food"), [self.coffee, self.groceries])
+        self.assertEqual(search("#FOOD #home"), [self.groceries])
+        self.assertEqual(search("amount:-10..0"), [self.coffee])
+        self.assertEqual(search("amount:..0"), [self.coffee, self.groceries])
+        self.assertEqual(search("amount:1000"), [self.salary])
+        self.assertEqual(search("date:%s.." % today), [self.groceries, self.salary])
+        self.assertEqual(search("date:%s" % yesterday), [self.coffee])
+        self.assertEqual(search("#food groc"), [self.groceries])
+        # Terms which aren't valid as typed ones are searched as text.
+        self.assertEqual(search("amount:lots"), [])
+
+    def testSearchIsRefined(self):
+        search = self.Model.Search
+        engine = self.Model.SearchEngine
+        self.assertEqual(search("o"), [self.coffee, self.groceries])
+        self.assertTrue(engine.refines(((None, 1) + engine.parse("co"))))
+        self.assertFalse(engine.refines(((None, 1) + engine.parse("c."))))
+        self.assertFalse(engine.refines(((None, 0) + engine.parse("co"))))
+        self.assertEqual(search("co"), [self.coffee])
+        self.assertEqual(search("co #food"), [self.coffee])
+
+        # Changing a transaction discards the last results and the keys of it.
+        self.salary.Description = "Coffee beans"
+        self.assertEqual(engine.last, None)
+        self.assertEqual(search("coffee"), [self.coffee, self.salary])
+        self.salary.Date = yesterday - datetime.timedelta(days=1)
+        self.assertEqual(search("coffee"), [self.salary, self.coffee])
+        t = self.b.AddTransaction(1, "More coffee")
+        self.assertEqual(search("coffee"), [self.salary, self.coffee, t])
+
+    def testTransferDescriptionsFollowRenames(self):
+        t, other = self.a.AddTransaction(5, "Loan", source=self.b)
+        self.assertEqual(self.Model.Search("from b"), [t])
+        self.b.Name = "Savings"
+        self.assertEqual(self.Model.Search("from b"), [])
+        self.assertEqual(self.Model.Search("from savings"), [t])
+
+    def testKeysDontKeepTransactionsAlive(self):
+        engine = self.Model.SearchEngine
+        t = Transaction(None, self.a, 1, "Throwaway", today)
+        self.assertEqual(engine.getKey(t, 1), "throwaway")
+        self.assertEqual(len(engine.keys[1]), 1)
+        ref = weakref.ref(t)
+        del t
+        gc.collect()
+        self.assertEqual(ref(), None)
+        self.assertEqual(len(engine.keys[1]), 0)
+
+if __name__ == "__main__":
+    unittest.main()
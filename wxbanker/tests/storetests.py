@@ -19,6 +19,11 @@
 #    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
 
 from wxbanker.tests import testbase
+from wxbanker import currencies
+from wxbanker.lib.pubsub import Publisher
+from wxbanker.bankobjects.tag import Tag
+from wxbanker.bankobjects.transaction import Transaction
+import datetime
 
 class StoreTests(testbase.TestCaseWithController):
     def testRemovingAccountRemovesTransactions(self):
@@ -40,5 +45,363 @@ class StoreTests(testbase.TestCaseWithController):
         
         self.assertEqual(howmany("SELECT * FROM accounts"), 0)
         self.assertEqual(howmany("SELECT * FROM transactions"), 0)
-        
-        
\ No newline at end of file
+
+    def testDurabilityProfiles(self):
+        store = self.Model.Store
+        self.assertEqual(store.Durability, store.DEFAULT_DURABILITY)
+
+        for profile in ("fast", "balanced", "safe"):
+            store.SetDurability(profile)
+            self.assertEqual(store.Durability, profile)
+
+        self.assertRaisesWithMsg(store.SetDurability, ["reckless"], Exception, "Unknown durability profile 'reckless'")
+        self.assertEqual(store.Durability, "safe")
+
+    def testBulkInsertedTransactionsGetTheirRowIds(self):
+        a = self.Model.CreateAccount("A")
+        cursor = self.Model.Store.dbconn.cursor()
+        # Once the largest rowid is taken, SQLite no longer gives new rows max(id)+1 but picks unused ones.
+        cursor.execute("INSERT INTO transactions (id, accountId, amount, description) VALUES (?, ?, 0, 'Last')", (2**63-1, a.ID))
+
+        transactions = [Transaction(None, None, i, "T%i" % i, datetime.date.today()) for i in range(5)]
+        a.AddTransactions(transactions)
+
+        ids = [t.ID for t in transactions]
+        self.assertEqual(len(set(ids)), 5)
+        for t in transactions:
+            self.assertEqual(cursor.execute("SELECT description FROM transactions WHERE id=?", (t.ID,)).fetchone()[0], t.Description)
+
+    def testAmountsAreStoredAsMinorUnits(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(-12.34)
+        cursor = self.Model.Store.dbconn.cursor()
+
+        self.assertEqual(cursor.execute("SELECT amount FROM transactions").fetchone()[0], -1234)
+        self.assertEqual(cursor.execute("SELECT balance FROM accounts").fetchone()[0], -1234)
+        t.Amount = 0.07
+        self.assertEqual(cursor.execute("SELECT amount FROM transactions").fetchone()[0], 7)
+
+    def testTransactionsTotalIsExact(self):
+        a = self.Model.CreateAccount("A")
+        for i in range(10):
+            a.AddTransaction(.1)
+
+        self.assertEqual(self.Model.Store.GetTransactionsTotal(a), 1)
+
+    def testAmountsAndBalancesAreInMinorUnits(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(.333)
+        a.AddTransactions([Transaction(None, None, .333, "", datetime.date.today())])
+
+        # Amounts are rounded when set, so the balance agrees with them and with what is stored.
+        self.assertEqual(t.Amount, .33)
+        self.assertEqual(a.Balance, .66)
+        self.assertEqual(a.GetBalanceAt(datetime.date.today()), .66)
+        t.Amount = .106
+        self.assertEqual(a.Balance, .44)
+        self.assertEqual(self.Model.Store.dbconn.execute("SELECT balance FROM accounts").fetchone()[0], 44)
+
+        model2 = self.Model.Store.GetModel(useCached=False)
+        a2 = model2.Accounts[0]
+        self.assertEqual(a2.Balance, .44)
+        self.assertEqual(sum(t.Amount for t in a2.Transactions), .44)
+        self.assertEqual(a2.GetBalanceAt(datetime.date.today()), .44)
+
+    def testChangingCurrencyRescalesAmounts(self):
+        a = self.Model.CreateAccount("A")
+        a.AddTransaction(1.5)
+        cursor = self.Model.Store.dbconn.cursor()
+
+        # Moving to a currency with more fraction digits needs more precision.
+        dirhams = currencies.GetCurrencyInt(currencies.ArabEmiratesCurrency())
+        self.Model.setAccountCurrency(a, dirhams)
+        self.assertEqual(cursor.execute("SELECT amount FROM transactions").fetchone()[0], 1500)
+
+        # But moving to one with fewer shouldn't lose any.
+        yen = currencies.GetCurrencyInt(currencies.JapaneseCurrency())
+        self.Model.setAccountCurrency(a, yen)
+        self.assertEqual(cursor.execute("SELECT amount FROM transactions").fetchone()[0], 1500)
+
+        model2 = self.Model.Store.GetModel(useCached=False)
+        self.assertEqual(model2.Accounts[0].Transactions[0].Amount, 1.5)
+        self.assertEqual(model2.Accounts[0].Balance, 1.5)
+
+    def testSyncBalancesFixesStoredAndLoadedBalances(self):
+        a = self.Model.CreateAccount("A")
+        a.AddTransaction(1)
+        a.AddTransaction(2)
+        store = self.Model.Store
+        store.dbconn.execute("UPDATE accounts SET balance=0")
+        a.Balance = 5
+
+        store.syncBalances()
+        self.assertEqual(store.dbconn.execute("SELECT balance FROM accounts").fetchone()[0], 300)
+        self.assertEqual(a.Balance, 3)
+
+    def testExitOnlySyncsChangedAccounts(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+        b.AddTransaction(1)
+        store = self.Model.Store
+
+        # Sync so nothing has changed since, then break both stored balances behind its back.
+        store.syncBalances()
+        store.dbconn.execute("UPDATE accounts SET balance=42")
+        a.AddTransaction(1)
+
+        Publisher.sendMessage("exiting")
+        balances = store.dbconn.execute("SELECT name, balance FROM accounts").fetchall()
+        self.assertEqual(sorted(balances), [("A", 100), ("B", 42)])
+
+    def testTransactionsBetweenAreFilteredByDate(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+        t1 = a.AddTransaction(1, date="2010/1/1")
+        t2 = a.AddTransaction(2, date="2010/1/15")
+        t3 = b.AddTransaction(3, date="2010/1/10")
+        t4 = a.AddTransaction(4, date="2010/2/1")
+        store = self.Model.Store
+        start, end = datetime.date(2010, 1, 10), datetime.date(2010, 1, 31)
+
+        self.assertEqual(store.GetTransactionsBetween(a, start, end), [t2])
+        self.assertEqual(store.GetTransactionsBetween(None, start, end), [t3, t2])
+        self.assertEqual(store.GetTransactionsBetween(a, None, start), [t1])
+        # Updated dates must compare the same way as inserted ones.
+        t4.Date = "2010/1/20"
+        self.assertEqual(store.GetTransactionsBetween(a, start, end), [t2, t4])
+
+    def testTransactionsBetweenDontLoadAccounts(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+        a.AddTransaction(1, date="2010/1/1")
+        a.AddTransaction(2, "Transfer", date="2010/1/15", source=b)
+        b.AddTransaction(3, date="2010/1/10")
+        start, end = datetime.date(2010, 1, 10), datetime.date(2010, 1, 31)
+
+        model = self.Model.Store.GetModel(useCached=False)
+        a, b = model.Accounts
+        transactions = model.Store.GetTransactionsBetween(None, start, end)
+        self.assertEqual([t.Amount for t in transactions], [3, -2, 2])
+        self.assertEqual((a._Transactions, b._Transactions), (None, None))
+        # Both halves of the transfer are the objects used once the accounts load.
+        self.assertTrue(transactions[1].LinkedTransaction is transactions[2])
+        self.assertTrue(transactions[2] is a.Transactions[1])
+        self.assertTrue(transactions[1] is b.Transactions[1])
+        # With an account loaded, its range is bisected and merged with what the store selects for the rest.
+        self.assertTrue(all(t is u for t, u in zip(model.Store.GetTransactionsBetween(None, start, end), transactions)))
+
+    def testTransactionsBetweenUseTheIndex(self):
+        store = self.Model.Store
+        a = self.Model.CreateAccount("A")
+        clause, args = store.getDateRangeClause(None, datetime.date(2010, 1, 1), None, [a])
+        plan = store.dbconn.execute('EXPLAIN QUERY PLAN SELECT * FROM transactions%s' % clause, args).fetchall()
+        self.assertTrue("transactions_accountId_date_idx" in str(plan))
+
+    def testBalanceBeforeAndDailyTotals(self):
+        a = self.Model.CreateAccount("A")
+        a.AddTransaction(1, date="2010/1/1")
+        a.AddTransaction(2, date="2010/1/2")
+        a.AddTransaction(4, date="2010/1/2")
+        store = self.Model.Store
+
+        self.assertEqual(store.GetBalanceBefore(a, datetime.date(2010, 1, 1)), 0)
+        self.assertEqual(store.GetBalanceBefore(a, datetime.date(2010, 1, 2)), 1)
+        self.assertEqual(store.GetBalanceBefore(a, datetime.date(2010, 1, 3)), 7)
+        self.assertEqual(store.GetDailyTotals(a, datetime.date(2010, 1, 2)), [(datetime.date(2010, 1, 2), a.ID, 6)])
+        self.assertEqual(store.GetDateRange(a), (datetime.date(2010, 1, 1), datetime.date(2010, 1, 2)))
+
+    def testDateRangeQueriesUseTheIndex(self):
+        query = "EXPLAIN QUERY PLAN SELECT SUM(amount) FROM transactions WHERE accountId=? AND date<?"
+        plan = self.Model.Store.dbconn.execute(query, (1, "2010-01-01")).fetchall()
+        self.assertTrue("transactions_accountId_date_idx" in str(plan))
+
+    def testUpdatesInBatchAreCoalesced(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(1, "First")
+        store = self.Model.Store
+        before = store.GetFlushStats()
+
+        Publisher.sendMessage("batch.start")
+        for i in range(10):
+            t.Description = "Edit %i" % i
+        # Nothing has been written yet, only buffered with the last value.
+        self.assertEqual(store.dbconn.execute("SELECT description FROM transactions").fetchone()[0], "First")
+        self.assertEqual(store.GetFlushStats()["pending"], 1)
+        Publisher.sendMessage("batch.end")
+
+        self.assertEqual(store.dbconn.execute("SELECT description FROM transactions").fetchone()[0], "Edit 9")
+        stats = store.GetFlushStats()
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["updates"] - before["updates"], 10)
+        self.assertEqual(stats["coalesced"] - before["coalesced"], 9)
+        self.assertEqual(stats["rows"] - before["rows"], 1)
+
+    def testTransactionColumnsMatchTransactions(self):
+        model = self.Model
+        a, b = model.CreateAccount("A"), model.CreateAccount("B")
+        # Yen have no minor units, so amounts are stored with another scale.
+        b.Currency = currencies.CurrencyList.index(currencies.JapaneseCurrency)
+        a.AddTransaction(1.25, "Lunch", datetime.date(2010, 1, 2))
+        a.AddTransaction(-3, "Lunch", datetime.date(2010, 1, 1))
+        ta, tb = a.AddTransaction(500, "Loan", datetime.date(2010, 1, 3), source=b)
+
+        columns = model.Store.GetTransactionColumns()
+        transactions = sorted(a.Transactions + b.Transactions)
+        self.assertEqual(len(columns), 4)
+        self.assertEqual(columns.IDs.tolist(), [t.ID for t in transactions])
+        self.assertEqual(columns.Amounts.tolist(), [t.Amount for t in transactions])
+        self.assertEqual(columns.GetDates(), [t.Date for t in transactions])
+        self.assertEqual(columns.GetDescriptions(), [t._Description for t in transactions])
+        self.assertEqual(columns.Descriptions, [u"Lunch", u"Loan"])
+        self.assertEqual(columns.GetLinkAccountIDs().tolist(), [t.LinkedTransaction.Parent.ID if t.LinkedTransaction else 0 for t in transactions])
+
+        accountColumns = model.Store.GetTransactionColumns(b)
+        self.assertEqual(accountColumns.IDs.tolist(), [tb.ID])
+        self.assertEqual(columns.ForAccount(b).IDs.tolist(), [tb.ID])
+        # The other half of the transfer is only found among all the columns.
+        self.assertEqual(accountColumns.GetLinkAccountIDs().tolist(), [0])
+        self.assertEqual(accountColumns.GetLinkAccountIDs(columns).tolist(), [a.ID])
+
+    def testTagLinksAreKeptInSync(self):
+        a = self.Model.CreateAccount("A")
+        store = self.Model.Store
+        t1 = a.AddTransaction(1, "#one #two")
+        t2, t3 = Transaction(None, a, 1, "#two", None), Transaction(None, a, 1, "none", None)
+        a.AddTransactions([t2, t3])
+        self.assertEqual(store.getTransactionTags(), {t1.ID: set([Tag("one"), Tag("two")]), t2.ID: set([Tag("two")])})
+
+        Publisher.sendMessage("batch.start")
+        t1.Description = "#three"
+        t3.AddTag("two")
+        Publisher.sendMessage("batch.end")
+        a.RemoveTransaction(t2)
+        self.assertEqual(store.getTransactionTags(), {t1.ID: set([Tag("three")]), t3.ID: set([Tag("two")])})
+        self.assertEqual(store.getTransactionTags(transactionIds=[t3.ID]), {t3.ID: set([Tag("two")])})
+
+    def testBufferedUpdatesAreSeenByQueries(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(1)
+        store = self.Model.Store
+
+        Publisher.sendMessage("batch.start")
+        t.Amount = 5
+        # Any other statement writes the buffer first, so it sees the update.
+        self.assertEqual(store.GetTransactionsTotal(a), 5)
+        Publisher.sendMessage("batch.end")
+
+    def testBufferedUpdatesAreFlushedOnTimer(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(1, "First")
+        store = self.Model.Store
+        buffered = []
+        def onUpdatesBuffered(message):
+            buffered.append(message.data)
+        Publisher.subscribe(onUpdatesBuffered, "store.updates_buffered")
+
+        # The controller is asked to flush once the buffer starts filling, and not again for the same buffer.
+        Publisher.sendMessage("batch.start")
+        t.Description = "Second"
+        t.Description = "Third"
+        self.assertEqual(buffered, [store])
+        self.Controller.FlushStore(store)
+        self.assertEqual(store.dbconn.execute("SELECT description FROM transactions").fetchone()[0], "Third")
+        Publisher.sendMessage("batch.end")
+
+    def testReadsOnlyFlushUpdatesTheyDependOn(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(1, "First")
+        store = self.Model.Store
+
+        Publisher.sendMessage("batch.start")
+        t.Description = "Second"
+        # Counting transactions doesn't depend on descriptions, so the update stays buffered.
+        self.assertEqual(store.GetTransactionCount(a), 1)
+        self.assertEqual(store.GetFlushStats()["pending"], 1)
+        # Reading what was updated writes it first.
+        self.assertEqual(store.getTransactionRowsAfter(a, None, 1)[0][3], "Second")
+        self.assertEqual(store.GetFlushStats()["pending"], 0)
+        Publisher.sendMessage("batch.end")
+
+    def testDatesAreStoredAsOrdinals(self):
+        a = self.Model.CreateAccount("A")
+        t = a.AddTransaction(1, date="2010/1/5")
+        a.AddTransaction(2, date="2010/1/5")
+        store = self.Model.Store
+        query = "SELECT date FROM transactions WHERE id=?"
+        self.assertEqual(store.dbconn.execute(query, (t.ID,)).fetchone()[0], datetime.date(2010, 1, 5).toordinal())
+        t.Date = "2010-02-03"
+        self.assertEqual(store.dbconn.execute(query, (t.ID,)).fetchone()[0], datetime.date(2010, 2, 3).toordinal())
+
+        model2 = store.GetModel(useCached=False)
+        t1, t2 = sorted(model2.Accounts[0].Transactions)
+        self.assertEqual(t1.Date, datetime.date(2010, 1, 5))
+        self.assertEqual(t2.Date, datetime.date(2010, 2, 3))
+
+    def testLoadedDatesAreMemoized(self):
+        a = self.Model.CreateAccount("A")
+        a.AddTransaction(1, date="2010/1/5")
+        a.AddTransaction(2, date="2010/1/5")
+
+        model2 = self.Model.Store.GetModel(useCached=False)
+        t1, t2 = model2.Accounts[0].Transactions
+        self.assertTrue(t1.Date is t2.Date)
+
+    def testLoadedTagsAreRegisteredAtOnce(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+        a.AddTransaction(1, "Lunch #food")
+        a.AddTransaction(2, "Nothing")
+        b.AddTransaction(3, "Dinner #food #out")
+
+        tagged, loaded = [], []
+        def onTagged(message):
+            tagged.append(message.data)
+        def onLoaded(message):
+            loaded.append(message.data)
+        Publisher.subscribe(onTagged, "transaction.tagged")
+        Publisher.subscribe(onLoaded, "transactions.tagged")
+
+        model2 = self.Model.Store.GetModel(useCached=False)
+        model2.GetTransactions()
+        # Only the transactions with tags are announced, in one message, and none tag themselves.
+        self.assertEqual(tagged, [])
+        self.assertEqual([[t.Description for t in transactions] for transactions in loaded], [["Lunch #food", "Dinner #food #out"]])
+        self.assertEqual(model2.Tags, set([Tag("food"), Tag("out")]))
+        self.assertEqual(model2.TagIndex.GetTotal(Tag("food")), 4)
+
+    def testSearchIndexIsKeptInSync(self):
+        a = self.Model.CreateAccount("A")
+        t1 = a.AddTransaction(1, "Hotdog stand")
+        t2 = a.AddTransaction(1, "Cat food")
+        store = self.Model.Store
+        self.assertTrue(store.HasSearchIndex)
+        self.assertEqual(store.SearchDescriptions("dog"), set([t1.ID]))
+
+        t2.Description = "Dog food"
+        self.assertEqual(store.SearchDescriptions("DOG"), set([t1.ID, t2.ID]))
+        a.RemoveTransaction(t1)
+        self.assertEqual(store.SearchDescriptions("dog"), set([t2.ID]))
+
+        # Patterns and strings too short for the index can't be narrowed down.
+        self.assertEqual(store.SearchDescriptions("do"), None)
+        self.assertEqual(store.SearchDescriptions("d.g"), None)
+
+    def testSearchIndexMatchesRegexSearch(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+        t1 = a.AddTransaction(1, "Hotdog")
+        t2 = a.AddTransaction(1, "Cat")
+        t3 = a.AddTransaction(-1, "Rent", source=b)
+        model = self.Model
+
+        for search in ("dog", "Cat", "transfer", "Rent", "og", "^C", "nothing", "to B", "from a", "fer to", "B (Rent)"):
+            indexed = model.Search(search)
+            model.Store.HasSearchIndex = False
+            self.assertEqual(set(indexed), set(model.Search(search)))
+            model.Store.HasSearchIndex = True
+
+        # Transfers are only candidates when the search could be in the text about the other account.
+        self.assertEqual(model.Store.SearchDescriptions("dog"), set([t1.ID]))
+        self.assertEqual(model.Store.SearchDescriptions("to b"), set([t3[0].ID]))
+        query = "EXPLAIN QUERY PLAN SELECT t.id FROM transactions o JOIN transactions t ON t.linkId=o.id WHERE o.accountId=?"
+        self.assertTrue("transactions_linkId_idx" in str(model.Store.dbconn.execute(query, (1,)).fetchall()))
@@ -102,6 +102,32 @@ class SummaryTests(testbase.TestCaseWithController):
         amounts, start, delta = self.get([(today-one*2, 3), (today-one, 2), (today, 1)], 2, None, (today-one*2, today-one))
         # Make sure 'today' isn't counted as it isn't in our date range.
         self.assertEqual(amounts, [3.0, 5.0])
+
+    def testXTotalsGranularity(self):
+        a = self.Model.CreateAccount("A")
+        start = datetime.date(2010, 1, 30)
+        for days, amount in ((0, 1), (1, 2), (9, 4), (31, 8)):
+            a.AddTransaction(amount=amount, date=start + one*days)
+        daterange = (start - one, start + one*40)
+
+        days, balances = self.Model.GetXTotals(None, daterange)
+        self.assertEqual(len(days), 42)
+        self.assertEqual(days[0], (start - one).toordinal())
+        self.assertEqual(balances.tolist()[:4], [0.0, 1.0, 3.0, 3.0])
+        self.assertEqual(balances[-1], 15.0)
+
+        days, balances = self.Model.GetXTotals(None, daterange, "weekly")
+        self.assertEqual([datetime.date.fromordinal(d).day for d in days], [4, 11, 18, 25, 4, 11])
+        self.assertEqual(balances.tolist(), [3.0, 7.0, 7.0, 7.0, 15.0, 15.0])
+
+        days, balances = self.Model.GetXTotals(None, daterange, "monthly")
+        self.assertEqual([datetime.date.fromordinal(d) for d in days], [datetime.date(2010, 1, 31), datetime.date(2010, 2, 28), datetime.date(2010, 3, 11)])
+        self.assertEqual(balances.tolist(), [3.0, 7.0, 15.0])
+
+        # Sampling for the points is the same as resampling every day.
+        for numPoints in (1, 3, 7, 41, 100):
+            self.assertEqual(self.basePlot.getPoints(self.Model.GetXTotals(None, daterange, numPoints), numPoints),
+                             self.basePlot.getPoints(self.Model.GetXTotals(None, daterange), numPoints))
         
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -19,6 +19,7 @@
 #    along with wxBanker.  If not, see <http://www.gnu.org/licenses/>.
 
 from wxbanker.tests import testbase
+import datetime
 from wxbanker.bankobjects.tag import Tag, EmptyTagException
 
 class TagTests(testbase.TestCaseWithController):
@@ -133,8 +134,67 @@ class TagTests(testbase.TestCaseWithController):
         self.assertEqual(t.Tags, set([Tag("bar")]))
         self.assertEqual(t2.Tags, set())
         self.assertEqual(model.Tags, set([Tag("bar")]))
-        
-        
+
+    def testTagIndex(self):
+        model = self.Model
+        index = model.TagIndex
+        a = model.CreateAccount("A")
+        b = model.CreateAccount("B")
+        food = Tag("food")
+        t1 = a.AddTransaction(-5, "Lunch #food", datetime.date(2010, 1, 10))
+        t2 = a.AddTransaction(-20, "Groceries #food #home", datetime.date(2010, 1, 20))
+        t3 = b.AddTransaction(-7, "Dinner #food", datetime.date(2010, 3, 1))
+
+        self.assertEqual(index.GetTransactionIds(food), set([t1.ID, t2.ID, t3.ID]))
+        self.assertEqual(index.GetTransactions(food), [t1, t2, t3])
+        self.assertEqual(index.GetCount(food), 3)
+        self.assertEqual(index.GetTotal(food), -32)
+        self.assertEqual(index.GetMonthlyTotals(food), [(datetime.date(2010, 1, 1), -25), (datetime.date(2010, 3, 1), -7)])
+
+        # Changes to amounts, dates and tags are all reflected.
+        t1.Amount = -6
+        t3.Date = datetime.date(2010, 1, 5)
+        t2.RemoveTag("food")
+        self.assertEqual(index.GetTransactions(food), [t3, t1])
+        self.assertEqual(index.GetTotal(food), -13)
+        self.assertEqual(index.GetMonthlyTotals(food), [(datetime.date(2010, 1, 1), -13)])
+        self.assertEqual(index.GetTotal(Tag("home")), -20)
+
+        # As are removals, and moves to other accounts.
+        b.RemoveTransaction(t3)
+        a.MoveTransaction(t1, b)
+        self.assertEqual(index.GetTransactionIds(food), set([t1.ID]))
+        self.assertEqual(index.GetTotal(food), -6)
+        self.assertEqual(model.Search("#food"), [t1])
+        a.RemoveTransaction(t2)
+        self.assertEqual(model.Tags, set([food]))
+        self.assertEqual(index.GetCount(Tag("home")), 0)
+        self.assertEqual(index.GetMonthlyTotals(Tag("home")), [])
+
+    def testTagIndexDoesNotLoadAccounts(self):
+        a = self.Model.CreateAccount("A")
+        b = self.Model.CreateAccount("B")
+        food = Tag("food")
+        a.AddTransaction(-5, "Lunch #food", datetime.date(2010, 1, 10))
+        a.AddTransaction(-20, "Groceries #home", datetime.date(2010, 1, 20))
+        b.AddTransaction(-7.25, "Dinner #food", datetime.date(2010, 3, 1))
+
+        # Until the accounts are loaded, the store answers for the index.
+        model = self.Model.Store.GetModel(useCached=False)
+        index = model.TagIndex
+        a, b = model.Accounts
+        self.assertEqual(index.GetCount(food), 2)
+        self.assertEqual(index.GetTotal(food), -12.25)
+        self.assertEqual(index.GetMonthlyTotals(food), [(datetime.date(2010, 1, 1), -5), (datetime.date(2010, 3, 1), -7.25)])
+        transactions = index.GetTransactions(food)
+        self.assertEqual([t.Description for t in transactions], ["Lunch #food", "Dinner #food"])
+        self.assertEqual((a._Transactions, b._Transactions), (None, None))
+
+        # The transactions fetched are the ones the accounts load.
+        self.assertTrue(transactions[0] is a.Transactions[0])
+        self.assertTrue(transactions[1] is b.Transactions[0])
+        self.assertEqual(index.GetTransactions(food), transactions)
+
 
 if __name__ == "__main__":
     import unittest; unittest.main()
\ No newline at end of file
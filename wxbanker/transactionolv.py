@@ -30,15 +30,21 @@ TODO (for feature parity):
 
 import threading
 import wx, datetime
+import numpy
 from wxbanker.lib.pubsub import Publisher
 from wxbanker.ObjectListView import GroupListView, ColumnDefn, CellEditorRegistry
 from wxbanker import bankcontrols, tagtransactiondialog
 
 from wxbanker.currencies import GetCurrencyInt
+from wxbanker.bankobjects.pagedtransactionlist import PagedTransactionList
+from wxbanker.bankobjects.transactionlist import TransactionList
+from wxbanker.bankobjects.transaction import Transaction
 
 class TransactionOLV(GroupListView):
     EMPTY_MSG_NORMAL = _("No transactions entered.")
     EMPTY_MSG_SEARCH = _("No matching transactions.")
+    # Accounts with more transactions than this which aren't loaded yet are displayed a page at a time.
+    PAGED_THRESHOLD = 50000
     
     def __init__(self, parent, bankController):
         GroupListView.__init__(self, parent, style=wx.LC_REPORT|wx.SUNKEN_BORDER, name="TransactionOLV")
@@ -84,11 +90,13 @@ class TransactionOLV(GroupListView):
             (self.onSearchCancelled, "SEARCH.CANCELLED"),
             (self.onSearchMoreToggled, "SEARCH.MORETOGGLED"),
             (self.onTransactionAdded, "transaction.created"),
+            (self.onTransactionsAdded, "transactions.created"),
             (self.onTransactionsRemoved, "transactions.removed"),
             (self.onCurrencyChanged, "currency_changed"),
             (self.onShowCurrencyNickToggled, "controller.show_currency_nick_toggled"),
             (self.updateTotals, "ormobject.updated.Transaction.Amount"),
             (self.onTransactionDateUpdated, "ormobject.updated.Transaction.Date"),
+            (self.onTransactionsBulkUpdated, "ormobject.bulkupdated"),
         )
 
         for callback, topic in self.Subscriptions:
@@ -108,6 +116,71 @@ class TransactionOLV(GroupListView):
         # changed by this set account, to size correctly.
         wx.CallLater(50, self._ResizeSpaceFillingColumns)
         
+    def setPagedObjects(self, transactions):
+        """
+        Display a PagedTransactionList as the inner list of this virtual control, without copying
+        or sorting it; it is already in date order, and rows are only fetched as they are drawn.
+        """
+        self.groups = list()
+        self.modelObjects = self.innerList = transactions
+        self.objectToIndexMap = None
+        self.lastGetObjectIndex = -1
+        self.SetItemCount(len(transactions))
+        self.RefreshObjects()
+        wx.CallLater(50, self._ResizeSpaceFillingColumns)
+
+    def IsPaged(self):
+        return isinstance(self.modelObjects, PagedTransactionList)
+
+    def refreshPaged(self):
+        """Drop the pages in memory (and their cached totals), and redraw with the new count."""
+        self.modelObjects.Invalidate()
+        self.lastGetObjectIndex = -1
+        self.SetItemCount(len(self.modelObjects))
+        self.RefreshObjects()
+
+    def GetIndexOf(self, modelObject):
+        if self.IsPaged():
+            try:
+                return self.modelObjects.index(modelObject)
+            except ValueError:
+                return -1
+        return GroupListView.GetIndexOf(self, modelObject)
+
+    def _SortObjects(self, modelObjects=None, sortColumn=None, secondarySortColumn=None):
+        # A paged list is always in date order, and can't be sorted in memory.
+        if self.IsPaged():
+            return
+        # Neither can an account's list need sorting by date, so just copy it again in its (maintained) order.
+        # The same goes for all accounts, which the model keeps merged in order.
+        if modelObjects is None and sortColumn is None:
+            source = self.getSortedSource()
+            if source is None and self.CurrentAccount is None and self.isInDateOrder():
+                source = self.BankController.Model.GetTransactions()
+                if len(source) != len(self.modelObjects):
+                    source = None
+            if source is not None:
+                self.modelObjects[:] = source
+                self.objectToIndexMap = None
+                return
+        GroupListView._SortObjects(self, modelObjects, sortColumn, secondarySortColumn)
+
+    def getSortedSource(self):
+        """
+        Return the TransactionList of the current account if this shows all of it in its order (by date,
+        ascending, without a search), so rows and totals can come from it; otherwise None.
+        """
+        if not self.isInDateOrder():
+            return None
+        source = self.CurrentAccount and self.CurrentAccount._Transactions
+        if isinstance(source, TransactionList) and len(source) == len(self.modelObjects):
+            return source
+        return None
+
+    def isInDateOrder(self):
+        """Return whether every transaction shown is to be in date order, which is the order they are kept in."""
+        return not self.IsPaged() and self.sortColumnIndex == self.COL_DATE and self.sortAscending and not self.IsSearchActive()
+
     def IsSearchActive(self):
         return self.GrandParent.searchActive
     
@@ -116,10 +189,32 @@ class TransactionOLV(GroupListView):
         
     def onTransactionDateUpdated(self, message):
         transaction = message.data
+        if self.IsPaged():
+            return self.refreshPaged()
         self.RefreshObject(transaction)
         self.SortBy(self.SORT_COL)
         self.updateTotals()
 
+    def onTransactionsBulkUpdated(self, message):
+        """Refresh, re-sort and total just once for any number of transactions edited together."""
+        updates = message.data
+        transactions = []
+        for (classname, attrname), objects in updates.iteritems():
+            if classname == "Transaction":
+                transactions.extend(objects)
+        if not transactions:
+            return
+        if self.IsPaged():
+            return self.refreshPaged()
+
+        self.Freeze()
+        self.RefreshObjects(transactions)
+        if ("Transaction", "Date") in updates:
+            self.SortBy(self.SORT_COL)
+        if ("Transaction", "Date") in updates or ("Transaction", "Amount") in updates:
+            self.updateTotals()
+        self.Thaw()
+
     def getDateAndIDOf(self, transaction):
         # A date and ID two-tuple is used to allow for correct sorting
         # by date (bug #653697)
@@ -138,12 +233,28 @@ class TransactionOLV(GroupListView):
         self.Thaw()
 
     def getTotal(self, transObj):
+        source = self.getSortedSource()
+        if source is not None and transObj in source:
+            # The running balance comes straight from the balance index of the account, so is never stale.
+            return source.GetBalanceThrough(source.index(transObj))
+
         if not hasattr(transObj, "_Total"):
-            self.updateTotals()
+            if self.IsPaged():
+                # Summing every previous transaction in memory would defeat paging, so let the store do it.
+                transObj._Total = self.CurrentAccount.Store.GetBalanceThrough(transObj)
+            else:
+                self.updateTotals()
         
         return transObj._Total
     
     def updateTotals(self, message=None):
+        if self.IsPaged():
+            # Cached totals of pages in memory may be stale; fetching the pages again recomputes them.
+            return self.refreshPaged()
+        # Totals are looked up as needed instead when shown in the order of the account.
+        if self.getSortedSource() is not None:
+            return
+
         first = self.GetObjectAt(0)
         if first is None:
             return
@@ -157,12 +268,11 @@ class TransactionOLV(GroupListView):
             # balance currency = accounts currency
             balance_currency = GetCurrencyInt(self.CurrentAccount.GetCurrency())
         
-        first._Total = first.GetAmount(balance_currency)
-        
-        b = first
-        for i in range(1, len(self.GetObjects())):
-            a, b = b, self.GetObjectAt(i)
-            b._Total = a._Total + b.GetAmount(balance_currency)
+        # Convert the amounts a currency at a time, and then sum them up.
+        transactions = [self.GetObjectAt(i) for i in range(len(self.GetObjects()))]
+        amounts = self.BankController.Model.Accounts.ConvertAmounts([t.Amount for t in transactions], [t.Parent for t in transactions], balance_currency)
+        for t, total in zip(transactions, numpy.cumsum(amounts).tolist()):
+            t._Total = total
     
     def renderDateIDTuple(self, pair):
         return str(pair[0])
@@ -197,22 +307,29 @@ class TransactionOLV(GroupListView):
     def _sizeAmounts(self):
         """Set the width of the Amount and Total columns based on the approximated widest value."""
         transactions = self.GetObjects()
+        if self.IsPaged():
+            # Approximate from the pages in memory, which are the ones on screen.
+            transactions = transactions.GetCached()
+            for t in transactions:
+                self.getTotal(t)
         # If there aren't any transactions, there's nothing to do.
         if len(transactions) == 0:
             return
 
-        for i, attr in enumerate(("Amount", "_Total")):
-            # Sort by amount, then compare the highest and lowest, to take into account a negative sign.
-            sortedtrans = list(sorted(transactions, cmp=lambda a,b: cmp(getattr(a, attr), getattr(b, attr))))
-            high, low = sortedtrans[0], sortedtrans[-1]
-            # Get the (translated) displayed column name to calculate width.
-            header = _({"_Total": "Balance"}.get(attr, attr))
+        for i, (header, key) in enumerate(((_("Amount"), lambda t: t.Amount), (_("Balance"), self.getTotal))):
+            # Compare the highest and lowest, to take into account a negative sign.
+            values = [key(t) for t in transactions]
+            high, low = max(values), min(values)
             # Take the max of the two as well as the column header width, as we need to at least display that.
-            widestWidth = max([self.GetTextExtent(header)[0]] + [self.GetTextExtent(self.renderFloat(getattr(t, attr)))[0] for t in (high, low)])
+            widestWidth = max([self.GetTextExtent(header)[0]] + [self.GetTextExtent(self.renderFloat(value))[0] for value in (high, low)])
             wx.CallAfter(self.SetColumnFixedWidth, *(self.COL_AMOUNT+i, widestWidth + 10))
 
     def sizeAmounts(self):
-        threading.Thread(target=self._sizeAmounts).start()
+        if self.IsPaged():
+            # This may query the store, which can only be used from this thread, but only sizes a few pages.
+            self._sizeAmounts()
+        else:
+            threading.Thread(target=self._sizeAmounts).start()
 
     def setAccount(self, account, scrollToBottom=True):
         self.CurrentAccount = account
@@ -220,10 +337,15 @@ class TransactionOLV(GroupListView):
         if account is None:
             # None represents the "All accounts" option, so we want all transactions.
             transactions = self.BankController.Model.GetTransactions()
+        elif account._Transactions is None and account.GetTransactionCount() > self.PAGED_THRESHOLD:
+            transactions = account.GetPagedTransactions()
         else:
             transactions = account.Transactions
 
-        self.SetObjects(transactions)
+        if isinstance(transactions, PagedTransactionList):
+            self.setPagedObjects(transactions)
+        else:
+            self.SetObjects(transactions)
         # Update the width of the amount/total columns.
         self.sizeAmounts()
         # Unselect everything.
@@ -264,7 +386,7 @@ class TransactionOLV(GroupListView):
             # If the right-click was on the total column, use the total, otherwise the amount.
             if col == self.COL_TOTAL:
                 # Use the last total if multiple are selected.
-                amount = transactions[-1]._Total
+                amount = self.getTotal(transactions[-1])
             else:
                 amount = sum((t.Amount for t in transactions))
                 
@@ -364,7 +486,7 @@ class TransactionOLV(GroupListView):
         """
         if col == self.COL_TOTAL:
             # Use the last total if multiple are selected.
-            amount = transactions[-1]._Total
+            amount = self.getTotal(transactions[-1])
         else:
             amount = sum((t.Amount for t in transactions))
 
@@ -392,7 +514,9 @@ class TransactionOLV(GroupListView):
 
     def onTransactionsRemoved(self, message):
         account, transactions = message.data
-        if account is self.CurrentAccount:
+        if account is self.CurrentAccount and self.IsPaged():
+            self.refreshPaged()
+        elif account is self.CurrentAccount:
             # Remove the item from the list.
             self.RemoveObjects(transactions)
             self.updateTotals()
@@ -400,20 +524,32 @@ class TransactionOLV(GroupListView):
             
     def onTransactionAdded(self, message):
         account, transaction = message.data
-        if account is self.CurrentAccount:
+        if account is self.CurrentAccount and self.IsPaged():
+            self.refreshPaged()
+            self.ensureVisible(self.GetIndexOf(transaction))
+        elif account is self.CurrentAccount:
             self.AddObject(transaction)
             self.updateTotals()
             self.Reveal(transaction)
             self.sizeAmounts()
 
+    def onTransactionsAdded(self, message):
+        account, transactions = message.data
+        if account is self.CurrentAccount and self.IsPaged():
+            self.refreshPaged()
+        elif account is self.CurrentAccount:
+            self.AddObjects(transactions)
+            self.updateTotals()
+            self.sizeAmounts()
+
     def onTagSearch(self, tag):
         Publisher.sendMessage("SEARCH.EXTERNAL", str(tag))
         
     def onTagRemoval(self, tag, transactions):
-        for transaction in transactions:
-            transaction.RemoveTag(tag)
-        # The removal won't appear unless we refresh the affected transactions.
-        self.RefreshObjects(transactions)
+        # As one bulk edit, which refreshes the affected transactions once it is done (see onTransactionsBulkUpdated).
+        with Transaction.Bulk():
+            for transaction in transactions:
+                transaction.RemoveTag(tag)
         
     def onTagTransactions(self, transactions):
         dlg = tagtransactiondialog.TagTransactionsDialog(self, transactions)
@@ -50,8 +50,11 @@ class XmlImporter:
 				accountIndex = model.Accounts.AccountIndex(accountName)
 			
 			accountModel = model.Accounts[accountIndex]
+			transactions = []
 			for xmlTransaction in xmlAccount:
 				date = xmlTransaction.attrib['date']
 				amount = xmlTransaction.attrib['amount']
 				description = xmlTransaction.attrib['description']
-				accountModel.AddTransaction(amount=amount, date=date, description=description)			
+				transactions.append(Transaction(None, accountModel, amount, description, date))
+			# Add them all at once, which is much faster than one at a time for large files.
+			accountModel.AddTransactions(transactions)			